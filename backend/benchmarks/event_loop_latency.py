@@ -0,0 +1,116 @@
+"""
+Event-loop latency under DB load: sync Session on the loop (the old analyze_brand) vs AsyncSession.
+
+A ticker coroutine asks to wake every INTERVAL seconds and records how late it actually woke up
+while CONCURRENCY coroutines write GeoScore rows. Anything the loop spends blocked in a DB call
+shows up as lag for every other request on the worker.
+
+    python -m backend.benchmarks.event_loop_latency [--concurrency 20] [--writes 25] [--url sqlite:///...]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from .. import models
+from ..database import _async_url
+
+INTERVAL = 0.005
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+async def measure(workload):
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(INTERVAL)
+            lags.append((time.perf_counter() - start - INTERVAL) * 1000)
+
+    tick = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await workload()
+    elapsed = time.perf_counter() - started
+    done.set()
+    await tick
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "loop_lag_p50_ms": round(percentile(lags, 50), 2),
+        "loop_lag_p99_ms": round(percentile(lags, 99), 2),
+        "loop_lag_max_ms": round(max(lags, default=0.0), 2),
+        "loop_lag_mean_ms": round(statistics.fmean(lags), 2) if lags else 0.0,
+    }
+
+
+def score():
+    return models.GeoScore(total=80, visibility=82, comprehension=78, representation=81, optimization=79)
+
+
+async def run(url, concurrency, writes):
+    sync_engine = create_engine(url)
+    models.Base.metadata.create_all(bind=sync_engine)
+    SyncSession = sessionmaker(bind=sync_engine)
+    async_engine = create_async_engine(_async_url(url))
+    AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def sync_writer():
+        for _ in range(writes):
+            # What an `async def` route using SessionLocal does: every call blocks the loop
+            with SyncSession() as db:
+                db.add(score())
+                db.commit()
+                db.scalar(select(func.count()).select_from(models.GeoScore))
+            await asyncio.sleep(0)
+
+    async def async_writer():
+        for _ in range(writes):
+            async with AsyncSession() as db:
+                db.add(score())
+                await db.commit()
+                await db.scalar(select(func.count()).select_from(models.GeoScore))
+
+    results = {
+        "url": url.split("@")[-1],
+        "concurrency": concurrency,
+        "writes_per_task": writes,
+        "sync_session": await measure(lambda: asyncio.gather(*(sync_writer() for _ in range(concurrency)))),
+        "async_session": await measure(lambda: asyncio.gather(*(async_writer() for _ in range(concurrency)))),
+    }
+    await async_engine.dispose()
+    sync_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--writes", type=int, default=25)
+    parser.add_argument("--url", help="Database URL (defaults to a throwaway SQLite file)")
+    args = parser.parse_args()
+
+    if args.url:
+        url = args.url
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        url = f"sqlite:///{path}"
+
+    print(json.dumps(asyncio.run(run(url, args.concurrency, args.writes)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Load test for the analyze pipeline against the mock provider.
+
+Starts backend.benchmarks.mock_provider in-process (or uses --mock-url), points the DeepSeek and
+Doubao adapters at it, and drives the FastAPI app at each concurrency level. Every level reports
+p50/p95/p99 latency, requests/sec, errors and how many provider calls the mock received, and the
+run is written as JSON so later runs can be compared against it:
+
+    python -m backend.benchmarks.load_test --concurrency 1,8,32 --requests 200
+    python -m backend.benchmarks.load_test --compare backend/benchmarks/results/<previous>.json
+
+Modes: "stream" reads GET /api/analyze/stream (NDJSON) to the aggregate event; "job" submits
+POST /api/analyze and follows /api/analyze/{id}/events until the job finishes. By default the app
+runs in-process on a throwaway SQLite database; --target benchmarks an already running server
+(which must itself be configured to use the mock).
+"""
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import platform
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+
+RESULTS_DIR = pathlib.Path(__file__).parent / "results"
+TERMINAL = ("succeeded", "failed")
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class MockServer:
+    """Runs the mock provider on a background thread with its own event loop (on a free port if `port` is 0)."""
+
+    def __init__(self, port: int, latency: str, error_rate: float, rate_limit_rate: float, start_timeout: float = 10.0):
+        import uvicorn
+        from .mock_provider import MockSettings, create_app
+
+        port = port or free_port()
+        self.start_timeout = start_timeout
+        settings = MockSettings(latency, error_rate, rate_limit_rate)
+        config = uvicorn.Config(create_app(settings), host="127.0.0.1", port=port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.url = f"http://127.0.0.1:{port}"
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.monotonic() + self.start_timeout
+        while not self.server.started:
+            # uvicorn exits its thread when it can't bind, e.g. a standalone mock already has the port
+            if not self.thread.is_alive():
+                raise RuntimeError(f"Mock provider failed to start on {self.url} (port in use?)")
+            if time.monotonic() > deadline:
+                self.server.should_exit = True
+                raise RuntimeError(f"Mock provider did not start on {self.url} within {self.start_timeout:g}s")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+def configure_env(mock_url: str):
+    # Must happen before anything imports backend.database: the database and cache settings are read at import
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'load_test.db')}")
+    os.environ.setdefault("ANALYSIS_CACHE_BACKEND", "memory")
+    os.environ.setdefault("DEEPSEEK_API_KEY", "mock")
+    os.environ.setdefault("DOUBAO_API_KEY", "mock")
+    os.environ.setdefault("DOUBAO_ENDPOINT_ID", "ep-mock")
+    os.environ["DEEPSEEK_BASE_URL"] = f"{mock_url}/v1"
+    os.environ["DOUBAO_BASE_URL"] = f"{mock_url}/api/v3"
+
+
+async def run_stream(client: httpx.AsyncClient, brand: str):
+    async with client.stream("GET", "/api/analyze/stream", params={"brand": brand, "format": "ndjson"}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line and json.loads(line).get("type") == "aggregate":
+                return
+
+
+async def run_job(client: httpx.AsyncClient, brand: str):
+    response = await client.post("/api/analyze", json={"brand": brand})
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    async with client.stream("GET", f"/api/analyze/{job_id}/events") as events:
+        async for line in events.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            status = json.loads(line[len("data: "):])["status"]
+            if status in TERMINAL:
+                if status != "succeeded":
+                    raise RuntimeError(f"job {job_id} {status}")
+                return
+
+
+async def run_level(client, mock: httpx.AsyncClient, mode: str, concurrency: int, requests: int, repeat_brand: bool):
+    run = run_stream if mode == "stream" else run_job
+    await mock.post("/reset")
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for i in range(requests):
+        # Unique brands by default so the analysis cache doesn't turn the run into a cache benchmark
+        queue.put_nowait("LoadTest Brand" if repeat_brand else f"LoadTest {uuid.uuid4().hex[:12]} {i}")
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            brand = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                await run(client, brand)
+                latencies.append((time.perf_counter() - start) * 1000)
+            except Exception:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    counts = (await mock.get("/stats")).json()["counts"]
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(requests / elapsed, 2) if elapsed else 0.0,
+        "latency_p50_ms": round(percentile(latencies, 50), 1),
+        "latency_p95_ms": round(percentile(latencies, 95), 1),
+        "latency_p99_ms": round(percentile(latencies, 99), 1),
+        "latency_max_ms": round(max(latencies, default=0.0), 1),
+        "provider_calls": counts.get("requests", 0),
+        "provider_calls_per_request": round(counts.get("requests", 0) / requests, 2) if requests else 0.0,
+        "provider_rate_limited": counts.get("rate_limited", 0),
+        "provider_errors": counts.get("errors", 0),
+    }
+
+
+async def run(args, mock_url: str):
+    levels = []
+    async with httpx.AsyncClient(base_url=mock_url) as mock:
+        if args.target:
+            async with httpx.AsyncClient(base_url=args.target, timeout=args.timeout) as client:
+                for concurrency in args.concurrency:
+                    levels.append(await run_level(client, mock, args.mode, concurrency, args.requests, args.repeat_brand))
+            return levels, None
+
+        from ..main import app
+        from ..services.http_client import http_pool
+        from ..services.models.resilience import policy_stats
+
+        # Drive the ASGI app directly: no sockets between client and app, same lifespan as uvicorn
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=args.timeout) as client:
+                for concurrency in args.concurrency:
+                    levels.append(await run_level(client, mock, args.mode, concurrency, args.requests, args.repeat_brand))
+            app_stats = {"http_pools": http_pool.stats(), "providers": policy_stats()}
+    return levels, app_stats
+
+
+def compare(current: list, previous_path: str) -> list:
+    previous = {level["concurrency"]: level for level in json.loads(pathlib.Path(previous_path).read_text())["levels"]}
+    deltas = []
+    for level in current:
+        before = previous.get(level["concurrency"])
+        if not before:
+            continue
+        deltas.append({
+            "concurrency": level["concurrency"],
+            **{
+                f"{key}_change_pct": round((level[key] - before[key]) / before[key] * 100, 1) if before[key] else None
+                for key in ("requests_per_s", "latency_p50_ms", "latency_p95_ms", "latency_p99_ms")
+            },
+        })
+    return deltas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mode", choices=("stream", "job"), default="stream")
+    parser.add_argument("--concurrency", default="1,4,16,64", type=lambda s: [int(c) for c in s.split(",")])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--repeat-brand", action="store_true", help="Reuse one brand so repeats hit the cache")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--target", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--mock-url", help="Use an already running mock provider")
+    parser.add_argument("--mock-port", type=int, default=0, help="Port for the in-process mock (default: any free port)")
+    parser.add_argument("--latency", default="lognormal:300:0.4", help="Mock latency spec (see mock_provider)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="Result file (defaults to backend/benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="Previous result file to diff against")
+    args = parser.parse_args()
+
+    started_at = datetime.now(timezone.utc)
+    if args.mock_url:
+        configure_env(args.mock_url)
+        levels, app_stats = asyncio.run(run(args, args.mock_url))
+        mock_config = {"url": args.mock_url}
+    else:
+        with MockServer(args.mock_port, args.latency, args.error_rate, args.rate_limit_rate) as mock:
+            configure_env(mock.url)
+            levels, app_stats = asyncio.run(run(args, mock.url))
+        mock_config = {"latency": args.latency, "error_rate": args.error_rate, "rate_limit_rate": args.rate_limit_rate}
+
+    report = {
+        "started_at": started_at.isoformat(),
+        "mode": args.mode,
+        "target": args.target or "in-process",
+        "mock": mock_config,
+        "python": platform.python_version(),
+        "levels": levels,
+        "app": app_stats,
+    }
+    if args.compare:
+        report["compared_to"] = args.compare
+        report["changes"] = compare(levels, args.compare)
+
+    output = pathlib.Path(args.output) if args.output else RESULTS_DIR / f"{started_at:%Y%m%dT%H%M%SZ}-{args.mode}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, default=str))
+    print(json.dumps({"levels": levels, "changes": report.get("changes")}, indent=2))
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
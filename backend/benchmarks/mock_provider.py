@@ -0,0 +1,251 @@
+"""
+Local OpenAI-compatible stand-in for the AI providers, for load tests and offline development.
+
+Serves POST /v1/chat/completions (and /api/v3/chat/completions, Ark's path for Doubao) with a
+configurable latency distribution, error rate and 429 injection. Point the adapters at it with
+DEEPSEEK_BASE_URL / DOUBAO_BASE_URL:
+
+    python -m backend.benchmarks.mock_provider --port 9100 --latency lognormal:800:0.5 --rate-limit-rate 0.05
+    DEEPSEEK_BASE_URL=http://127.0.0.1:9100/v1 DOUBAO_BASE_URL=http://127.0.0.1:9100/api/v3 ...
+
+Latency specs (milliseconds): fixed:MS, uniform:MIN:MAX, normal:MEAN:STD, lognormal:MEDIAN:SIGMA.
+With `"stream": true` the latency is the time to the first token; further tokens follow every
+--token-ms. GET /stats returns call counts per model (and streamed/cancelled streams); POST /reset
+clears them.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import time
+from collections import Counter
+from typing import Callable
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """Turn a latency spec into a sampler returning seconds."""
+    kind, *params = spec.split(":")
+    values = [float(p) for p in params]
+    if kind == "fixed" and len(values) == 1:
+        sample = lambda: values[0]
+    elif kind == "uniform" and len(values) == 2:
+        sample = lambda: random.uniform(values[0], values[1])
+    elif kind == "normal" and len(values) == 2:
+        sample = lambda: random.gauss(values[0], values[1])
+    elif kind == "lognormal" and len(values) == 2:
+        sample = lambda: random.lognormvariate(math.log(values[0]), values[1])
+    else:
+        raise ValueError(f"Invalid latency spec {spec!r}")
+    return lambda: max(0.0, sample()) / 1000
+
+
+class MockSettings:
+    def __init__(
+        self,
+        latency: str = "fixed:50",
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+        token_ms: float = 20.0,
+    ):
+        self.latency = latency
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.token_ms = token_ms
+
+    @classmethod
+    def from_env(cls) -> "MockSettings":
+        return cls(
+            latency=os.environ.get("MOCK_LATENCY", "fixed:50"),
+            error_rate=float(os.environ.get("MOCK_ERROR_RATE", "0")),
+            rate_limit_rate=float(os.environ.get("MOCK_RATE_LIMIT_RATE", "0")),
+            retry_after=float(os.environ.get("MOCK_RETRY_AFTER", "1")),
+            token_ms=float(os.environ.get("MOCK_TOKEN_MS", "20")),
+        )
+
+
+def fake_score(prompt: str) -> int:
+    # Deterministic per prompt so repeated runs produce comparable aggregates
+    return 40 + int(hashlib.sha256(prompt.encode()).hexdigest(), 16) % 56
+
+
+# Probe lines in evaluation batch prompts: "- [v1] How likely ..."
+_PROBE_LINE = re.compile(r"^\s*- \[([\w.-]+)\] (.+)$", re.MULTILINE)
+
+
+# Brand lines in comparison prompts: "- <b1> Acme"
+_BRAND_LINE = re.compile(r"^\s*- <([\w.-]+)> (.+)$", re.MULTILINE)
+
+
+def fake_content(prompt: str, model: str) -> dict:
+    content = {"summary": f"Mock evaluation from {model}", "sentiment": "neutral"}
+    probes = _PROBE_LINE.findall(prompt)
+    brands = _BRAND_LINE.findall(prompt)
+    if brands:
+        content["brands"] = [
+            {
+                "id": brand_id,
+                "scores": {probe_id: fake_score(f"{name} {question}") for probe_id, question in probes},
+                "summary": f"Mock evaluation of {name} from {model}",
+                "sentiment": "neutral",
+            }
+            for brand_id, name in brands
+        ]
+    elif probes:
+        content["answers"] = [
+            {"id": probe_id, "score": fake_score(question), "reason": "Mock reasoning"} for probe_id, question in probes
+        ]
+        content["recommendations"] = fake_recommendations(prompt, model)
+    else:
+        content["score"] = fake_score(prompt)
+    return content
+
+
+_RECOMMENDATIONS = [
+    ("content", "high", "Add a structured FAQ", "Add an FAQ section to the homepage that answers the top buyer questions in plain sentences"),
+    ("schema", "medium", "Mark up product pages", "Add JSON-LD Product and Organization markup to every product page"),
+    ("authority", "high", "Publish on authoritative sites", "Publish expert articles on high-authority industry sites and Q&A platforms"),
+    ("content", "low", "Refresh the about page", "Update the about page with the founding story, certifications and current figures"),
+    ("authority", "medium", "Collect reviews", "Ask recent customers for detailed reviews on major review platforms"),
+]
+
+
+def fake_recommendations(prompt: str, model: str) -> list:
+    # Two per reply, reworded slightly per model so the recommendations pipeline has near-duplicates to merge
+    rng = random.Random(f"{model}|{prompt}")
+    picked = rng.sample(_RECOMMENDATIONS, 2)
+    return [
+        {"type": kind, "priority": priority, "title": title, "suggestion": f"{suggestion} ({model})", "impact": "+5% visibility"}
+        for kind, priority, title, suggestion in picked
+    ]
+
+
+_WORDS = "brand product quality customers trusted design value service market guide review features".split()
+
+
+def fake_text(prompt: str, model: str, tokens: int) -> list:
+    """Deterministic Markdown-ish reply split into tokens (words with their trailing space)."""
+    rng = random.Random(prompt)
+    words = [f"# Mock {model} draft\n\n"] + [rng.choice(_WORDS) + ("\n\n" if i % 25 == 24 else " ") for i in range(tokens - 1)]
+    return words
+
+
+def create_app(settings: MockSettings = None) -> FastAPI:
+    settings = settings or MockSettings.from_env()
+    app = FastAPI(title="Mock LLM provider")
+    counts = Counter()
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "unknown")
+        counts["requests"] += 1
+        counts[f"model:{model}"] += 1
+
+        await asyncio.sleep(settings.sample_latency())
+        roll = random.random()
+        if roll < settings.rate_limit_rate:
+            counts["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}},
+                status_code=429,
+                headers={"Retry-After": str(settings.retry_after)},
+            )
+        if roll < settings.rate_limit_rate + settings.error_rate:
+            counts["errors"] += 1
+            return JSONResponse({"error": {"message": "Injected failure", "type": "server_error"}}, status_code=500)
+
+        prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+        if body.get("stream"):
+            return StreamingResponse(stream_chunks(body, prompt, model), media_type="text/event-stream")
+        content = fake_content(prompt, model)
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = max(1, len(json.dumps(content)) // 4)
+        counts["succeeded"] += 1
+        return {
+            "id": f"mock-{counts['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": json.dumps(content)},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    async def stream_chunks(body: dict, prompt: str, model: str):
+        tokens = fake_text(prompt, model, min(body.get("max_tokens") or 200, 200))
+        counts["streams"] += 1
+        sent = 0
+        try:
+            for token in tokens:
+                chunk = {"id": f"mock-{counts['requests']}", "object": "chat.completion.chunk", "model": model,
+                         "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                sent += 1
+                await asyncio.sleep(settings.token_ms / 1000)
+            if (body.get("stream_options") or {}).get("include_usage"):
+                usage = {"prompt_tokens": max(1, len(prompt) // 4), "completion_tokens": len(tokens)}
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                yield f"data: {json.dumps({'model': model, 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+            counts["succeeded"] += 1
+        finally:
+            counts["stream_tokens"] += sent
+            if sent < len(tokens):
+                counts["streams_cancelled"] += 1
+
+    # DeepSeek-style and Ark-style base paths
+    app.add_api_route("/v1/chat/completions", chat_completions, methods=["POST"])
+    app.add_api_route("/api/v3/chat/completions", chat_completions, methods=["POST"])
+
+    @app.get("/stats")
+    def stats():
+        return {
+            "latency": settings.latency,
+            "error_rate": settings.error_rate,
+            "rate_limit_rate": settings.rate_limit_rate,
+            "counts": dict(counts),
+        }
+
+    @app.post("/reset")
+    def reset():
+        counts.clear()
+        return {"ok": True}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", default=os.environ.get("MOCK_LATENCY", "fixed:50"))
+    parser.add_argument("--error-rate", type=float, default=float(os.environ.get("MOCK_ERROR_RATE", "0")))
+    parser.add_argument("--rate-limit-rate", type=float, default=float(os.environ.get("MOCK_RATE_LIMIT_RATE", "0")))
+    parser.add_argument("--retry-after", type=float, default=float(os.environ.get("MOCK_RETRY_AFTER", "1")))
+    parser.add_argument("--token-ms", type=float, default=float(os.environ.get("MOCK_TOKEN_MS", "20")))
+    args = parser.parse_args()
+
+    import uvicorn
+
+    settings = MockSettings(args.latency, args.error_rate, args.rate_limit_rate, args.retry_after, args.token_ms)
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
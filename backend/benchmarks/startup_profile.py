@@ -0,0 +1,85 @@
+"""
+Import-time breakdown for a fresh worker: what `gunicorn backend.main:app` pays before serving.
+
+Runs `python -X importtime -c "import backend.main"` in a clean interpreter, groups the
+cumulative time by top-level package and fails (exit 1) when the total exceeds the budget.
+
+    python -m backend.benchmarks.startup_profile [--budget-ms 1200] [--top 15] [--json out.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+# Render free-tier cold starts: keep worker import well under a second and a half on a dev laptop
+DEFAULT_BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", "1200"))
+
+# Loaded only on first use; if one of these shows up, something imports it eagerly again
+LAZY_MODULES = ("alibabacloud_dysmsapi20170525", "alibabacloud_tea_openapi", "authlib")
+
+
+def profile(module: str = "backend.main"):
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ, PYTHONPATH=root + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    # Skip startup-time migrations so only imports are measured
+    env.setdefault("MIGRATE_ON_STARTUP", "false")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, cwd=root,
+    )
+    if proc.returncode != 0:
+        raise SystemExit(proc.stderr)
+
+    packages = defaultdict(float)
+    total_us = 0
+    loaded = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = [field.strip() for field in line[len("import time:"):].split("|")]
+        top_level = name.split(".")[0]
+        loaded.add(top_level)
+        packages[top_level] += int(self_us)
+        if name == module:
+            total_us = int(cumulative_us)
+
+    return {
+        "module": module,
+        "total_ms": round(total_us / 1000, 1),
+        "by_package_ms": {
+            name: round(us / 1000, 1)
+            for name, us in sorted(packages.items(), key=lambda item: item[1], reverse=True)
+        },
+        "eager_lazy_modules": sorted(m for m in LAZY_MODULES if m in loaded),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--module", default="backend.main")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", help="Also write the full report to this file")
+    args = parser.parse_args()
+
+    report = profile(args.module)
+    report["budget_ms"] = args.budget_ms
+
+    print(f"{args.module}: {report['total_ms']} ms (budget {args.budget_ms} ms)")
+    for name, ms in list(report["by_package_ms"].items())[:args.top]:
+        print(f"  {ms:8.1f} ms  {name}")
+    if report["eager_lazy_modules"]:
+        print(f"Imported eagerly but should be lazy: {', '.join(report['eager_lazy_modules'])}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if report["total_ms"] > args.budget_ms or report["eager_lazy_modules"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import base64
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from . import models
+from .services import recommendations, rollups, snapshots
+from .services.cache import normalize_brand
+
+# Region for results recorded before adapters reported their own
+CHINA_PROVIDERS = ["Doubao", "Kimi"]
+
+def insert_ignoring_conflicts(db: Session, model, **target):
+    """
+    INSERT ... ON CONFLICT DO NOTHING for the session's dialect (Postgres or SQLite). `target`
+    (index_elements, index_where) names the unique index whose conflicts are ignored.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model).on_conflict_do_nothing(**target)
+    if dialect == "sqlite":
+        return sqlite.insert(model).on_conflict_do_nothing(**target)
+    return insert(model)
+
+# --- Brands ---
+
+def get_or_create_brands(db: Session, names: Iterable[str], user_id: Optional[int] = None) -> Dict[str, int]:
+    """Map each brand name's normalized form to a brand id, creating missing brands."""
+    wanted = {normalize_brand(name): name for name in names}
+    if not wanted:
+        return {}
+
+    def existing():
+        rows = db.execute(
+            select(models.Brand.normalized_name, models.Brand.id).where(
+                models.Brand.user_id.is_(None) if user_id is None else models.Brand.user_id == user_id,
+                models.Brand.normalized_name.in_(list(wanted)),
+            )
+        )
+        return dict(rows.all())
+
+    ids = existing()
+    missing = [{"name": wanted[key], "normalized_name": key, "user_id": user_id} for key in wanted if key not in ids]
+    if missing:
+        # A concurrent writer may create some of them first; theirs are as good as ours
+        if user_id is None:
+            target = {"index_elements": ["normalized_name"], "index_where": models.Brand.user_id.is_(None)}
+        else:
+            target = {"index_elements": ["user_id", "normalized_name"]}
+        db.execute(insert_ignoring_conflicts(db, models.Brand, **target), missing)
+        ids = existing()
+    return ids
+
+def get_brand_id(db: Session, name: str, user_id: Optional[int] = None) -> int:
+    return get_or_create_brands(db, [name], user_id)[normalize_brand(name)]
+
+# --- Users ---
+
+def upsert_user(
+    db: Session, field: str, value: str, profile: dict, update_profile: bool = False, defaults: Optional[dict] = None
+) -> models.User:
+    """
+    The user whose unique `field` (openid, phone) equals `value`, created with `profile` (and
+    `defaults`, which are never updated) if missing.
+    Concurrent first logins both INSERT ... ON CONFLICT DO NOTHING and read back the same row
+    instead of racing on the unique constraint.
+    With `update_profile`, non-empty profile fields that changed since the last login are updated
+    (which invalidates the cached user on commit). Not committed.
+    """
+    query = select(models.User).where(getattr(models.User, field) == value)
+    user = db.scalars(query).first()
+    if user is None:
+        db.execute(insert_ignoring_conflicts(db, models.User), [{field: value, "role": "registered", **(defaults or {}), **profile}])
+        user = db.scalars(query).one()
+    if update_profile:
+        for key, new in profile.items():
+            if new and getattr(user, key) != new:
+                setattr(user, key, new)
+    return user
+
+# --- Analyses ---
+
+def _score_row(result: dict, brand_id: Optional[int], created_at: datetime) -> dict:
+    dimensions = result.get("dimensions", {})
+    return {
+        "brand_id": brand_id,
+        "created_at": created_at,
+        "total": result.get("total_score", 0),
+        "visibility": dimensions.get("visibility", 0),
+        "comprehension": dimensions.get("comprehension", 0),
+        "representation": dimensions.get("representation", 0),
+        "optimization": dimensions.get("optimization", 0),
+    }
+
+def _comparison_rows(result: dict, brand_id: Optional[int], created_at: datetime) -> list:
+    # Failed and timed-out providers are skipped: a 0 row would replace the provider's last good score
+    return [
+        {
+            "brand_id": brand_id,
+            "created_at": created_at,
+            "region": m.get("region") or ("china" if m["provider"] in CHINA_PROVIDERS else "global"),
+            "model_name": m["provider"],
+            "score": m.get("score", 0),
+            "is_latest": True,
+        }
+        for m in result.get("model_breakdown", [])
+        if "provider" in m and "error" not in m and not m.get("timed_out")
+    ]
+
+def retire_latest(db: Session, comparisons: List[dict]):
+    """
+    Clear the previous "latest" flag for every (brand, provider) in `comparisons`. Call it before
+    inserting those rows (flagged is_latest) so each provider keeps exactly one latest row.
+    """
+    by_brand: Dict[Optional[int], set] = {}
+    for row in comparisons:
+        by_brand.setdefault(row["brand_id"], set()).add(row["model_name"])
+    for brand_id, names in by_brand.items():
+        db.execute(
+            update(models.ModelComparison)
+            .where(
+                models.ModelComparison.brand_id.is_(None) if brand_id is None else models.ModelComparison.brand_id == brand_id,
+                models.ModelComparison.model_name.in_(names),
+                models.ModelComparison.is_latest.is_(True),
+            )
+            .values(is_latest=False)
+        )
+
+def save_analyses(db: Session, analyses: Iterable[Tuple[str, dict]], commit: bool = True) -> int:
+    """
+    Bulk-insert many (brand name, analysis) pairs with one executemany per table.
+    Returns the number of analyses written.
+    """
+    analyses = list(analyses)
+    if not analyses:
+        return 0
+    brand_ids = get_or_create_brands(db, [brand for brand, _ in analyses])
+    now = models.utcnow()
+    scores = []
+    comparisons = []
+    for brand, result in analyses:
+        brand_id = brand_ids[normalize_brand(brand)]
+        scores.append(_score_row(result, brand_id, now))
+        comparisons.extend(_comparison_rows(result, brand_id, now))
+
+    db.execute(insert(models.GeoScore), scores)
+    if comparisons:
+        retire_latest(db, comparisons)
+        db.execute(insert(models.ModelComparison), comparisons)
+    rollups.record(db, scores, comparisons)
+    recommendations.record(db, [(brand_ids[normalize_brand(brand)], result) for brand, result in analyses], now)
+    snapshots.mark_dirty(db)
+    if commit:
+        db.commit()
+    return len(analyses)
+
+# --- Keyset pagination ---
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    return datetime.fromisoformat(created_at), int(row_id)
+
+def page_by_created_at(
+    db: Session,
+    model,
+    brand_id: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """
+    Newest-first page of `model` rows for one brand, optionally within [since, until), continuing after `cursor`,
+    or None when the brand doesn't exist. Walks the (brand_id, created_at, id) index, so cost is O(limit)
+    however deep the page is.
+    """
+    conditions = [model.brand_id == models.Brand.id]
+    if since:
+        conditions.append(model.created_at >= rollups.as_utc(since))
+    if until:
+        conditions.append(model.created_at < rollups.as_utc(until))
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        conditions.append(or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id < row_id),
+        ))
+    # Outer-joined from the brand so one query also tells "no brand" (no row) from "no history" (one empty row)
+    query = (
+        select(models.Brand.id, model)
+        .outerjoin(model, and_(*conditions))
+        .where(models.Brand.id == brand_id)
+        .order_by(model.created_at.desc(), model.id.desc())
+        .limit(limit + 1)
+    )
+    found = db.execute(query).all()
+    if not found:
+        return None
+    rows = [row for _, row in found if row is not None]
+    next_cursor = encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def latest_scored_brand():
+    """Scalar subquery: the brand of the most recent GeoScore (NULL for pre-brand rows)."""
+    return (
+        select(models.GeoScore.brand_id)
+        .order_by(models.GeoScore.created_at.desc(), models.GeoScore.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+def latest_model_scores(db: Session, brand_id: Optional[int]) -> List[models.ModelComparison]:
+    """Newest comparison per provider for `brand_id`, or for the most recently scored brand when None."""
+    brand = latest_scored_brand() if brand_id is None else brand_id
+    rows = db.scalars(
+        select(models.ModelComparison)
+        .where(
+            models.ModelComparison.brand_id.is_not_distinct_from(brand),
+            models.ModelComparison.is_latest.is_(True),
+        )
+        .order_by(models.ModelComparison.id.desc())
+    ).all()
+    # Two concurrent writers can both leave a row flagged; keep the newest per provider
+    latest = {}
+    for row in rows:
+        latest.setdefault(row.model_name, row)
+    return list(latest.values())
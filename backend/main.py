@@ -1,19 +1,66 @@
-from fastapi import FastAPI, HTTPException, Depends, Request
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from starlette.middleware.sessions import SessionMiddleware
-from . import models, database
-from .services import deepseek, auth
+from . import crud, models, schemas, database, migrate
+from .services import auth
+from .services import metrics
+from .services.http_client import http_pool
+from .services.cache import analysis_cache
+from .services.snapshots import dashboard_snapshots
+from .services import analysis, batch, content, export, jobs, recommendations
+from .services.export import ExportUnavailable, TooManyExports, exporter
+from .services.jobs import job_queue
+from .services.scheduler import monitor, monitor_enabled
+from .services.sms import SMSQueueFull, sms_dispatcher
+from .services.verification import RateLimited, SendFailed, normalize_phone, verification
+from .services.sessions import ServerSessionMiddleware, session_store
+from .services.users import user_cache, user_to_dict
+from .services import rollups
+from .services.models.resilience import policy_stats
+from .services.models.registry import UnknownProvider, get_registry
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+import asyncio
+import json
+import logging
 import os
 
-# Create tables
-models.Base.metadata.create_all(bind=database.engine)
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema changes normally run once at deploy time (python -m backend.migrate), not per worker
+    if migrate.should_migrate_on_startup():
+        await asyncio.to_thread(migrate.migrate)
+    # Shared keep-alive connections to the AI providers for the lifetime of the worker
+    http_pool.open(*get_registry().pool_keys())
+    await job_queue.start()
+    await verification.start()
+    # Every worker runs the monitor; leases on tracked_brands keep each brand to one runner
+    if monitor_enabled():
+        await monitor.start()
+    yield
+    await monitor.stop()
+    await verification.stop()
+    sms_dispatcher.shutdown()
+    await job_queue.stop()
+    await http_pool.aclose()
+    await database.async_engine.dispose()
 
-# Session Middleware is required for Authlib
+app = FastAPI(lifespan=lifespan)
+
+# Sessions are required for Authlib and login. The cookie only carries a signed session id;
 # SECRET_KEY should be in .env, using a default for dev
-app.add_middleware(SessionMiddleware, secret_key=os.environ.get("SECRET_KEY", "dev_secret_key"))
+app.add_middleware(
+    ServerSessionMiddleware,
+    store=session_store,
+    secret_key=os.environ.get("SECRET_KEY", "dev_secret_key"),
+    https_only=os.environ.get("SESSION_HTTPS_ONLY", "false").lower() in ("1", "true", "yes"),
+)
 
 # Configure CORS
 app.add_middleware(
@@ -24,7 +71,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Dependency
+# Outermost, so the latency histograms include time spent in the other middleware
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument_engine(database.engine, "sync")
+metrics.instrument_engine(database.async_engine.sync_engine, "async")
+
+# Dependency for sync (threadpool) routes; async routes use database.get_async_db
 def get_db():
     db = database.SessionLocal()
     try:
@@ -37,51 +89,125 @@ def read_root():
     return {"message": "GEO Content Flow API is running (SQLAlchemy + AI + Auth)"}
 
 
+@app.get("/api/metrics")
+def get_metrics():
+    return {"http_pools": http_pool.stats(), "analysis_cache": analysis_cache.stats(), "jobs": job_queue.stats(), "providers": policy_stats(), "dashboard_cache": dashboard_snapshots.stats(), "monitor": monitor.stats(), "verification": verification.stats(), "sessions": session_store.stats(), "users": user_cache.stats(), "exports": exporter.stats()}
+
+metrics.registry.collector(
+    "http_pool_connections",
+    "Outbound provider connections by state (in_flight, peak, requests, saturated, pool_timeouts)",
+    lambda: [({"provider": p, "stat": k}, v) for p, stats in http_pool.stats().items() for k, v in stats.items()],
+)
+metrics.registry.collector(
+    "analysis_cache_stat",
+    "Analysis cache counters (hits, misses, coalesced, errors, evictions, in_flight, entries)",
+    lambda: [({"stat": k}, v) for k, v in analysis_cache.stats().items() if isinstance(v, (int, float))],
+)
+metrics.registry.collector(
+    "provider_policy_stat",
+    "Provider policy counters (calls, retries, throttled, rejected, failures)",
+    lambda: [({"provider": p, "stat": k}, v) for p, stats in policy_stats().items() for k, v in stats.items() if isinstance(v, int)],
+)
+metrics.registry.collector(
+    "provider_breaker_open",
+    "1 while the provider's circuit breaker is open or half-open",
+    lambda: [({"provider": p}, int(stats["breaker"] != "closed")) for p, stats in policy_stats().items()],
+)
+metrics.registry.collector(
+    "analysis_job_local_queue",
+    "Job ids waiting for this worker's job runners",
+    lambda: [({}, job_queue.stats()["local_queue"])],
+)
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return Response(metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/api/providers")
+def list_providers():
+    return get_registry().describe()
+
+
 @app.get("/api/auth/wechat/login")
 async def login_wechat(request: Request):
     redirect_uri = request.url_for('auth_wechat_callback')
-    return await auth.oauth.wechat.authorize_redirect(request, redirect_uri)
+    return await auth.get_oauth().wechat.authorize_redirect(request, redirect_uri)
 
 @app.get("/api/auth/wechat/callback")
-async def auth_wechat_callback(request: Request, db: Session = Depends(get_db)):
+async def auth_wechat_callback(request: Request, db: AsyncSession = Depends(database.get_async_db)):
     try:
-        token = await auth.oauth.wechat.authorize_access_token(request)
-        user_info = await auth.oauth.wechat.userinfo(token=token)
-        if user_info:
-            # Check if user exists (WeChat uses openid or unionid)
-            # For simplicity, we'll map openid to email-like format if email is missing
-            wechat_id = user_info.get('openid')
-            fake_email = f"{wechat_id}@wechat.user"
-            
-            db_user = db.query(models.User).filter(models.User.email == fake_email).first()
-            if not db_user:
-                # Create new user
-                db_user = models.User(
-                    email=fake_email,
-                    name=user_info.get('nickname', 'WeChat User'),
-                    avatar=user_info.get('headimgurl', ''),
-                    role="registered"
-                )
-                db.add(db_user)
-                db.commit()
-                db.refresh(db_user)
-            
-            # Update session
-            request.session['user'] = {
-                "id": db_user.id,
-                "email": db_user.email,
-                "name": db_user.name,
-                "avatar": db_user.avatar,
-                "role": db_user.role
-            }
-            
-        return {"user": request.session.get('user'), "token": token}
+        token = await auth.get_oauth().wechat.authorize_access_token(request)
+        user_info = await auth.get_oauth().wechat.userinfo(token=token)
+        openid = (user_info or {}).get('openid')
+        if not openid:
+            raise HTTPException(status_code=400, detail="WeChat did not return an openid")
+        profile = {"name": user_info.get('nickname') or 'WeChat User', "avatar": user_info.get('headimgurl', '')}
+        # Returning users are usually served from the cache; only new or changed profiles write
+        user = await user_cache.get_by_openid(openid)
+        if user is None or any(user[key] != value for key, value in profile.items()):
+            db_user = await db.run_sync(
+                crud.upsert_user, "openid", openid, profile, True, defaults={"email": f"{openid}@wechat.user"}
+            )
+            await db.commit()
+            user = user_to_dict(db_user)
+        _login(request, user)
+
+        return {"user": user, "token": token}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+def _login(request: Request, user: dict):
+    # The session only holds the id; the middleware issues a fresh session id when it changes
+    request.session.pop('user', None)
+    request.session['user_id'] = user["id"]
+
+class SendCodeRequest(BaseModel):
+    phone: str
+
+class VerifyCodeRequest(BaseModel):
+    phone: str
+    code: str
+
+@app.post("/api/auth/sms/send")
+async def send_verification_code(body: SendCodeRequest, request: Request):
+    # Behind Nginx, run the workers with --forwarded-allow-ips so request.client is the real client
+    try:
+        return await verification.issue(body.phone, request.client.host if request.client else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RateLimited as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
+    except SMSQueueFull:
+        raise HTTPException(status_code=503, detail="SMS service is busy, try again shortly", headers={"Retry-After": "5"})
+    except SendFailed as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+@app.post("/api/auth/sms/verify")
+async def verify_code(body: VerifyCodeRequest, request: Request, db: AsyncSession = Depends(database.get_async_db)):
+    if not await verification.verify(body.phone, body.code):
+        raise HTTPException(status_code=400, detail="Invalid or expired code")
+    phone = normalize_phone(body.phone)
+    db_user = await db.run_sync(crud.upsert_user, "phone", phone, {"name": f"用户{phone[-4:]}", "avatar": ""})
+    await db.commit()
+    user = user_to_dict(db_user)
+    _login(request, user)
+    return {"user": user}
+
+@app.post("/api/auth/logout")
+async def logout(request: Request):
+    request.session.clear()
+    return {"ok": True}
+
 @app.get("/api/auth/me")
 async def get_current_user(request: Request):
-    user = request.session.get('user')
+    user_id = request.session.get('user_id')
+    user = await user_cache.get(user_id) if user_id else None
+    if user_id and not user:
+        # Deleted since the session was created
+        request.session.clear()
     if not user:
         # For demo, return a mock user if not logged in
         return {
@@ -94,121 +220,371 @@ async def get_current_user(request: Request):
     
 
 # --- AI Analysis Route ---
-from pydantic import BaseModel
 
 class AnalyzeRequest(BaseModel):
     brand: str
+    refresh: bool = False  # skip cached analyses and provider responses
+    providers: Optional[List[str]] = None  # provider names; defaults to every enabled provider
 
-@app.post("/api/analyze")
-async def analyze_brand(request: AnalyzeRequest, db: Session = Depends(get_db)):
-    # Call Multi-Model Analysis
-    from .services import analysis
-    result = await analysis.analyze_brand_across_models(request.brand)
-    
-    if result:
-        # Save to DB
-        new_score = models.GeoScore(
-            total=result.get("total_score", 0),
-            visibility=result.get("dimensions", {}).get("visibility", 0),
-            comprehension=result.get("dimensions", {}).get("comprehension", 0),
-            representation=result.get("dimensions", {}).get("representation", 0),
-            optimization=result.get("dimensions", {}).get("optimization", 0)
-        )
-        db.add(new_score)
-        db.commit()
-        db.refresh(new_score)
-        
-        # Save Model Comparisons
-        if "model_breakdown" in result:
-            for m in result["model_breakdown"]:
-                comp = models.ModelComparison(
-                    region="china" if m["provider"] in ["Doubao", "Kimi"] else "global",
-                    model_name=m["provider"],
-                    score=m.get("score", 0)
-                )
-                db.add(comp)
-            db.commit()
-        
-        return result
-    
-    raise HTTPException(status_code=500, detail="Analysis failed")
+class BatchAnalyzeRequest(BaseModel):
+    brands: List[str]
 
-@app.get("/api/dashboard/overview")
-def get_overview(db: Session = Depends(get_db)):
+class CompareRequest(BaseModel):
+    brand: str
+    competitors: List[str]
+    refresh: bool = False
+    providers: Optional[List[str]] = None
+
+def _select_providers(names: Optional[List[str]]) -> Optional[List[str]]:
+    # Fail fast with a 400 instead of queueing a job that can only fail
     try:
-        # Try to get latest score
-        score = db.query(models.GeoScore).order_by(models.GeoScore.created_at.desc()).first()
-        if not score:
-            # Insert mock data if empty
-            mock_score = models.GeoScore(
-                total=82.4,
-                visibility=86,
-                comprehension=79,
-                representation=83,
-                optimization=77
-            )
-            db.add(mock_score)
-            db.commit()
-            db.refresh(mock_score)
-            return mock_score
-        return score
+        return [adapter.name for adapter in get_registry().select(names)] if names else None
+    except UnknownProvider as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str, ensure_ascii=False)}\n\n"
+
+@app.post("/api/analyze", status_code=202)
+async def analyze_brand(request: AnalyzeRequest):
+    # The multi-model fan-out runs on the job workers; poll or subscribe for the result
+    try:
+        job = await job_queue.submit(request.brand, refresh=request.refresh, providers=_select_providers(request.providers))
+    except jobs.QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return job
+
+@app.post("/api/analyze/batch", status_code=202)
+async def analyze_brands_batch(request: Request):
+    """
+    Queue a batch analysis from JSON ({"brands": [...]}) or a multipart CSV upload (field "file",
+    brands in the first column). Progress and per-brand outcomes are reported on the job.
+    """
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None:
+            raise HTTPException(status_code=400, detail="Missing CSV file field 'file'")
+        try:
+            brands = batch.parse_brands_csv(await upload.read())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        try:
+            payload = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be JSON or a multipart CSV upload")
+        try:
+            brands = BatchAnalyzeRequest.model_validate(payload).brands
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+
+    brands = batch.dedupe_brands(brands)
+    if not brands:
+        raise HTTPException(status_code=400, detail="No brands to analyze")
+    if len(brands) > batch.MAX_BATCH_BRANDS:
+        raise HTTPException(status_code=413, detail=f"At most {batch.MAX_BATCH_BRANDS} brands per batch")
+    try:
+        return await job_queue.submit_batch(brands)
+    except jobs.QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@app.get("/api/analyze/stream")
+async def stream_analysis(
+    brand: str,
+    format: str = "sse",
+    deadline: Optional[float] = None,
+    refresh: bool = False,
+    providers: Optional[str] = None,
+):
+    """Emit each provider's result as it completes, then the aggregate (SSE or NDJSON). `providers` is comma-separated."""
+    if format not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'sse' or 'ndjson'")
+    selected = _select_providers([p for p in providers.split(",") if p.strip()] if providers else None)
+    stream = analysis.stream_brand_across_models(brand, deadline or analysis.STREAM_DEADLINE, refresh, selected)
+
+    async def events():
+        async for event in stream:
+            if format == "sse":
+                yield sse_event(event["type"], event)
+            else:
+                yield json.dumps(event, default=str, ensure_ascii=False) + "\n"
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+@app.post("/api/compare")
+async def compare_brands(request: CompareRequest):
+    """Score the brand and its competitors side by side and rank them, several brands per provider call."""
+    providers = _select_providers(request.providers)
+    try:
+        return await analysis.compare_brands(request.brand, request.competitors, request.refresh, providers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/analyze/{job_id}")
+async def get_analysis_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/analyze/{job_id}/events")
+async def stream_analysis_job(job_id: str, request: Request):
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        current = job
+        last_status = None
+        while True:
+            if current["status"] != last_status:
+                last_status = current["status"]
+                yield sse_event("status", current)
+            if current["status"] in jobs.TERMINAL_STATUSES or await request.is_disconnected():
+                return
+            await job_queue.wait_for_change(timeout=1.0)
+            current = await job_queue.get(job_id)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# --- Streaming content generation (Generate / Optimize pages) ---
+
+class GenerateRequest(BaseModel):
+    brief: str
+    objective: str = "exposure"  # conversion, exposure, leads, ranking
+    formats: List[str] = ["article"]  # article, post, ad, video, email
+    brand: Optional[str] = None
+    provider: Optional[str] = None  # defaults to the first configured provider
+
+class OptimizeRequest(BaseModel):
+    content: str
+    brand: Optional[str] = None
+    keywords: List[str] = []
+    provider: Optional[str] = None
+
+def _stream_content(request: Request, kind: str, messages, body: BaseModel, provider: Optional[str]):
+    try:
+        adapter = content.pick_adapter(provider)
+    except UnknownProvider as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    problem = adapter.missing_config()
+    if problem:
+        raise HTTPException(status_code=503, detail=problem)
+    stream = content.ContentStream(kind, adapter, messages, body.model_dump())
+
+    async def events():
+        async for event, data in stream.events(request.is_disconnected):
+            yield sse_event(event, data)
+
+    # X-Accel-Buffering: nginx would otherwise hold tokens back until its buffer fills
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Generation-Id": stream.id},
+    )
+
+def _check_input_size(*texts: str):
+    if sum(len(t) for t in texts) > content.CONTENT_MAX_INPUT_CHARS:
+        raise HTTPException(status_code=413, detail=f"Input is limited to {content.CONTENT_MAX_INPUT_CHARS} characters")
+
+@app.post("/api/content/generate")
+async def generate_content(body: GenerateRequest, request: Request):
+    """Stream generated copy as SSE: start, delta {text}..., then done (with first_token_ms) or error."""
+    _check_input_size(body.brief)
+    try:
+        messages = content.generate_messages(body.brief, body.objective, body.formats, body.brand)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _stream_content(request, "generate", messages, body, body.provider)
+
+@app.post("/api/content/optimize")
+async def optimize_content(body: OptimizeRequest, request: Request):
+    """Stream a GEO-optimized rewrite of `content`, same events as /api/content/generate."""
+    _check_input_size(body.content)
+    return _stream_content(request, "optimize", content.optimize_messages(body.content, body.brand, body.keywords), body, body.provider)
+
+@app.get("/api/content/{generation_id}")
+async def get_content(generation_id: str):
+    """A saved generation; `output` holds the text streamed so far while status is streaming."""
+    generation = await content.get_generation(generation_id)
+    if not generation:
+        raise HTTPException(status_code=404, detail="Generation not found")
+    return generation
+
+# --- Continuous monitoring ---
+
+MONITOR_MIN_INTERVAL = int(os.environ.get("MONITOR_MIN_INTERVAL", "900"))
+
+class TrackBrandRequest(BaseModel):
+    brand: str
+    interval_hours: float = 24
+    providers: Optional[List[str]] = None
+
+@app.post("/api/monitor/brands", status_code=201)
+async def track_brand(request: TrackBrandRequest):
+    """Re-analyze the brand every `interval_hours`; tracking it again updates the cadence and providers."""
+    interval = int(request.interval_hours * 3600)
+    if interval < MONITOR_MIN_INTERVAL:
+        raise HTTPException(status_code=400, detail=f"interval_hours must be at least {MONITOR_MIN_INTERVAL / 3600:g}")
+    return await monitor.track(request.brand, interval, _select_providers(request.providers))
+
+@app.get("/api/monitor/brands")
+async def list_tracked_brands():
+    return await monitor.list_tracked()
+
+@app.delete("/api/monitor/brands/{tracked_id}", status_code=204)
+async def untrack_brand(tracked_id: int):
+    if not await monitor.untrack(tracked_id):
+        raise HTTPException(status_code=404, detail="Tracked brand not found")
+    return Response(status_code=204)
+
+def _latest_score(db: Session, brand_id: Optional[int]):
+    query = db.query(models.GeoScore)
+    if brand_id is not None:
+        query = query.filter(models.GeoScore.brand_id == brand_id)
+    return query.order_by(models.GeoScore.created_at.desc(), models.GeoScore.id.desc()).first()
+
+@app.get("/api/dashboard/overview", response_model=Optional[schemas.GeoScoreOut])
+def get_overview(request: Request, brand_id: Optional[int] = None, db: Session = Depends(get_db)):
+    """Latest score for the brand (or overall); null until an analysis has run. Demo data: python -m backend.seed"""
+    def build():
+        score = _latest_score(db, brand_id)
+        return schemas.GeoScoreOut.model_validate(score) if score else None
+
+    try:
+        return dashboard_snapshots.respond(request, ("overview", brand_id), build)
     except Exception as e:
-        print(f"Error fetching overview: {e}")
+        logger.exception("Error fetching overview")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/dashboard/models")
-def get_models(db: Session = Depends(get_db)):
+@app.get("/api/dashboard/models", response_model=List[schemas.ModelComparisonOut])
+def get_models(request: Request, brand_id: Optional[int] = None, db: Session = Depends(get_db)):
+    # No brand picked: show the providers of the most recently analyzed brand
+    def build():
+        return [schemas.ModelComparisonOut.model_validate(row) for row in crud.latest_model_scores(db, brand_id)]
+
     try:
-        models_data = db.query(models.ModelComparison).all()
-        if not models_data:
-            # Insert mock data
-            mock_data = [
-                models.ModelComparison(region="china", model_name="文心一言", score=90),
-                models.ModelComparison(region="china", model_name="智谱GLM", score=74),
-                models.ModelComparison(region="china", model_name="Kimi", score=78),
-                models.ModelComparison(region="china", model_name="豆包", score=75),
-                models.ModelComparison(region="global", model_name="ChatGPT", score=85),
-                models.ModelComparison(region="global", model_name="Claude", score=83),
-                models.ModelComparison(region="global", model_name="Gemini", score=81),
-                models.ModelComparison(region="global", model_name="Perplexity", score=79)
-            ]
-            db.add_all(mock_data)
-            db.commit()
-            for m in mock_data: db.refresh(m)
-            return mock_data
-        return models_data
-    except Exception as e:
-        print(f"Error fetching models: {e}")
+        return dashboard_snapshots.respond(request, ("models", brand_id), build)
+    except Exception:
+        logger.exception("Error fetching models")
         return []
 
-@app.get("/api/dashboard/recommendations")
-def get_recommendations(db: Session = Depends(get_db)):
+@app.get("/api/dashboard/trends")
+def get_trends(
+    brand_id: Optional[int] = None,
+    granularity: str = Query("auto", pattern="^(auto|hour|day|week)$"),
+    provider: str = "",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+):
+    """Score trends per dimension (or for one provider) read from the rollup tables only."""
+    until = rollups.as_utc(until) if until else datetime.now(timezone.utc)
+    since = rollups.as_utc(since) if since else until - timedelta(days=30)
+    if since >= until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+    if granularity == "auto":
+        granularity = rollups.pick_granularity(since, until, provider)
+        if granularity is None:
+            raise HTTPException(status_code=400, detail="Range too long; use a shorter since/until range")
+    elif rollups.point_count(since, until, granularity, provider) > rollups.MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"Range too long for {granularity} buckets; use a coarser granularity")
+
+    if brand_id is None:
+        latest = _latest_score(db, None)
+        if latest is None or latest.brand_id is None:
+            return {"brand_id": None, "granularity": granularity, "series": {}}
+        brand_id = latest.brand_id
+    return {
+        "brand_id": brand_id,
+        "granularity": granularity,
+        "provider": provider or None,
+        "series": rollups.trends(db, brand_id, granularity, since, until, provider),
+    }
+
+# --- Brand history (keyset-paginated) ---
+
+@app.get("/api/brands")
+def list_brands(limit: int = Query(50, ge=1, le=200), after_id: Optional[int] = None, db: Session = Depends(get_db)):
+    query = db.query(models.Brand)
+    if after_id is not None:
+        query = query.filter(models.Brand.id > after_id)
+    brands = query.order_by(models.Brand.id.asc()).limit(limit + 1).all()
+    next_after = brands[limit - 1].id if len(brands) > limit else None
+    return {
+        "items": [{"id": b.id, "name": b.name, "created_at": b.created_at} for b in brands[:limit]],
+        "next_after_id": next_after,
+    }
+
+def _history_page(db: Session, model, schema, brand_id: int, limit: int, cursor, since, until):
     try:
-        recs = db.query(models.Recommendation).all()
-        if not recs:
-            # Insert mock data
-            mock_recs = [
-                models.Recommendation(
-                    type="content", priority="high", title="结构化FAQ优化",
-                    suggestion="在官网首页添加FAQ结构化模块，明确品牌USP与关键词匹配",
-                    impact="+12% 理解度提升", action="立即优化"
-                ),
-                models.Recommendation(
-                    type="schema", priority="medium", title="JSON-LD结构化数据",
-                    suggestion="为产品页增加JSON-LD标注以提高LLM索引能力",
-                    impact="+8% 可见度提升", action="查看方案"
-                ),
-                models.Recommendation(
-                    type="authority", priority="high", title="高权威信源扩展",
-                    suggestion="增加知乎专栏、CSDN等高权威平台的内容发布频率",
-                    impact="+15% 提及率提升", action="制定策略"
-                )
-            ]
-            db.add_all(mock_recs)
-            db.commit()
-            for r in mock_recs: db.refresh(r)
-            return mock_recs
-        return recs
-    except Exception as e:
-        print(f"Error fetching recommendations: {e}")
+        page = crud.page_by_created_at(db, model, brand_id, limit, cursor, since, until)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if page is None:
+        raise HTTPException(status_code=404, detail="Brand not found")
+    items, next_cursor = page
+    return {"items": [schema.model_validate(item) for item in items], "next_cursor": next_cursor}
+
+@app.get("/api/brands/{brand_id}/scores", response_model=schemas.ScorePage)
+def get_score_history(
+    brand_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+):
+    return _history_page(db, models.GeoScore, schemas.GeoScoreOut, brand_id, limit, cursor, since, until)
+
+@app.get("/api/brands/{brand_id}/models", response_model=schemas.ModelComparisonPage)
+def get_model_history(
+    brand_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+):
+    return _history_page(db, models.ModelComparison, schemas.ModelComparisonOut, brand_id, limit, cursor, since, until)
+
+# --- Bulk export ---
+
+@app.get("/api/export/{dataset}")
+async def export_history(
+    dataset: str,
+    format: str = "csv",
+    brand_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """Stream all `scores` or `models` rows, oldest first, as csv, ndjson or parquet (needs pyarrow)."""
+    try:
+        body = exporter.open(dataset, format, brand_id, since, until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExportUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except TooManyExports as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    filename = f"{dataset}-brand-{brand_id}.{format}" if brand_id is not None else f"{dataset}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-cache"},
+    )
+
+@app.get("/api/dashboard/recommendations", response_model=List[schemas.RecommendationOut])
+def get_recommendations(request: Request, brand_id: Optional[int] = None, db: Session = Depends(get_db)):
+    """Top recommendations for the brand (or the most recently analyzed one), best first."""
+    def build():
+        brand = crud.latest_scored_brand() if brand_id is None else brand_id
+        return [schemas.RecommendationOut.model_validate(rec) for rec in recommendations.top_recommendations(db, brand)]
+
+    try:
+        return dashboard_snapshots.respond(request, ("recommendations", brand_id), build)
+    except Exception:
+        logger.exception("Error fetching recommendations")
         return []
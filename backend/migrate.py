@@ -0,0 +1,222 @@
+"""
+Schema migrations, run once per deploy instead of on every worker import:
+
+    python -m backend.migrate
+
+Applied versions are recorded in schema_migrations. Each migration runs in its own
+transaction and is written to be safe on databases created by older create_all() calls.
+"""
+import logging
+import os
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, delete, func, inspect, select, text, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, aliased
+
+from . import models
+from .database import engine
+from .services import recommendations, rollups
+
+logger = logging.getLogger(__name__)
+
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _meta,
+    Column("version", String, primary_key=True),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+def add_column_if_missing(conn: Connection, table: str, column: str, ddl: str):
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def create_index_if_missing(conn: Connection, table: str, index):
+    if index.name not in {i["name"] for i in inspect(conn).get_indexes(table)}:
+        index.create(conn)
+
+
+def _baseline(conn: Connection):
+    # Creates any table that does not exist yet; existing tables are left alone
+    models.Base.metadata.create_all(bind=conn)
+
+
+def _brand_scoped_history(conn: Connection):
+    # Databases created before brands existed got geo_scores/model_comparisons without these columns
+    add_column_if_missing(conn, "geo_scores", "brand_id", "INTEGER REFERENCES brands(id)")
+    add_column_if_missing(conn, "model_comparisons", "brand_id", "INTEGER REFERENCES brands(id)")
+    add_column_if_missing(conn, "model_comparisons", "is_latest", "BOOLEAN DEFAULT TRUE")
+    for table in (models.GeoScore.__table__, models.ModelComparison.__table__):
+        for index in table.indexes:
+            create_index_if_missing(conn, table.name, index)
+
+
+def _job_progress(conn: Connection):
+    for column, ddl in (
+        ("kind", "VARCHAR DEFAULT 'analyze'"),
+        ("payload", "TEXT"),
+        ("progress_total", "INTEGER DEFAULT 0"),
+        ("progress_completed", "INTEGER DEFAULT 0"),
+        ("progress_failed", "INTEGER DEFAULT 0"),
+        ("heartbeat_at", "TIMESTAMP WITH TIME ZONE"),
+    ):
+        add_column_if_missing(conn, "analysis_jobs", column, ddl)
+    for index in models.AnalysisJob.__table__.indexes:
+        create_index_if_missing(conn, "analysis_jobs", index)
+
+
+def _provider_responses(conn: Connection):
+    models.ProviderResponse.__table__.create(conn, checkfirst=True)
+
+
+def _tracked_brands(conn: Connection):
+    models.TrackedBrand.__table__.create(conn, checkfirst=True)
+    models.ProviderBudget.__table__.create(conn, checkfirst=True)
+
+
+def _content_generations(conn: Connection):
+    models.ContentGeneration.__table__.create(conn, checkfirst=True)
+
+
+def _verification_code_indexes(conn: Connection):
+    add_column_if_missing(conn, "verification_codes", "ip", "VARCHAR")
+    add_column_if_missing(conn, "verification_codes", "attempts", "INTEGER DEFAULT 0")
+    for index in models.VerificationCode.__table__.indexes:
+        create_index_if_missing(conn, "verification_codes", index)
+    # Superseded by the (phone, expires_at) index
+    if "ix_verification_codes_phone" in {i["name"] for i in inspect(conn).get_indexes("verification_codes")}:
+        conn.execute(text("DROP INDEX ix_verification_codes_phone"))
+
+
+def _server_sessions(conn: Connection):
+    models.UserSession.__table__.create(conn, checkfirst=True)
+    add_column_if_missing(conn, "users", "openid", "VARCHAR")
+    # WeChat users used to be stored as <openid>@wechat.user
+    conn.execute(text(
+        "UPDATE users SET openid = substr(email, 1, length(email) - length('@wechat.user')) "
+        "WHERE openid IS NULL AND email LIKE '%@wechat.user'"
+    ))
+    for index in models.User.__table__.indexes:
+        create_index_if_missing(conn, "users", index)
+
+
+def _recommendation_pipeline(conn: Connection):
+    models.RecommendationCandidate.__table__.create(conn, checkfirst=True)
+    for column, ddl in (
+        ("brand_id", "INTEGER REFERENCES brands(id)"),
+        ("rank", "INTEGER"),
+        ("occurrences", "INTEGER"),
+        ("providers", "INTEGER"),
+        ("score", "FLOAT"),
+    ):
+        add_column_if_missing(conn, "recommendations", column, ddl)
+    # Existing rows are the demo set: keep their order
+    conn.execute(text("UPDATE recommendations SET rank = id WHERE rank IS NULL"))
+    for index in models.Recommendation.__table__.indexes:
+        create_index_if_missing(conn, "recommendations", index)
+
+
+
+def _merge_brands(conn: Connection, merged: Dict[int, int]):
+    """Move everything recorded against each duplicate brand id onto the brand it is merged into."""
+    db = Session(bind=conn)
+    rollup = models.ScoreRollup.__table__
+    tracked = models.TrackedBrand.__table__
+    for duplicate, target in merged.items():
+        for table in (models.GeoScore.__table__, models.ModelComparison.__table__, models.RecommendationCandidate.__table__):
+            conn.execute(update(table).where(table.c.brand_id == duplicate).values(brand_id=target))
+        # Bucket aggregates are summed into the target's buckets
+        columns = [c for c in rollup.c if c.name != "id"]
+        buckets = [{**row, "brand_id": target} for row in conn.execute(select(*columns).where(rollup.c.brand_id == duplicate)).mappings()]
+        conn.execute(delete(rollup).where(rollup.c.brand_id == duplicate))
+        rollups._upsert(db, buckets)
+        if conn.execute(select(tracked.c.id).where(tracked.c.brand_id == target)).first():
+            conn.execute(delete(tracked).where(tracked.c.brand_id == duplicate))
+        else:
+            conn.execute(update(tracked).where(tracked.c.brand_id == duplicate).values(brand_id=target))
+        conn.execute(delete(models.Recommendation.__table__).where(models.Recommendation.brand_id == duplicate))
+        conn.execute(delete(models.Brand.__table__).where(models.Brand.id == duplicate))
+
+    comparisons = models.ModelComparison.__table__
+    newer = aliased(comparisons)
+    for target in set(merged.values()):
+        # Both brands had a latest row per provider; only the newest one stays latest
+        newest = (
+            select(func.max(newer.c.id))
+            .where(newer.c.brand_id == target, newer.c.model_name == comparisons.c.model_name, newer.c.is_latest)
+            .scalar_subquery()
+        )
+        conn.execute(
+            update(comparisons)
+            .where(comparisons.c.brand_id == target, comparisons.c.is_latest, comparisons.c.id < newest)
+            .values(is_latest=False)
+        )
+        recommendations.refresh(db, target)
+
+
+def _shared_brand_names(conn: Connection):
+    # The (user_id, normalized_name) constraint never fired for shared brands, so concurrent first
+    # analyses could each create one; fold them into the oldest before the new index forbids it
+    brands = models.Brand.__table__
+    rows = conn.execute(
+        select(brands.c.id, brands.c.normalized_name).where(brands.c.user_id.is_(None)).order_by(brands.c.id)
+    ).all()
+    first: Dict[str, int] = {}
+    merged: Dict[int, int] = {}
+    for brand_id, name in rows:
+        if name in first:
+            merged[brand_id] = first[name]
+        else:
+            first[name] = brand_id
+    if merged:
+        logger.info("Merging %s duplicate shared brands", len(merged))
+        _merge_brands(conn, merged)
+    for index in models.Brand.__table__.indexes:
+        create_index_if_missing(conn, "brands", index)
+
+
+MIGRATIONS: List[Tuple[str, Callable[[Connection], None]]] = [
+    ("0001_baseline", _baseline),
+    ("0002_brand_scoped_history", _brand_scoped_history),
+    ("0003_job_progress", _job_progress),
+    ("0004_provider_responses", _provider_responses),
+    ("0005_tracked_brands", _tracked_brands),
+    ("0006_content_generations", _content_generations),
+    ("0007_verification_code_indexes", _verification_code_indexes),
+    ("0008_server_sessions", _server_sessions),
+    ("0009_recommendation_pipeline", _recommendation_pipeline),
+    ("0010_shared_brand_names", _shared_brand_names),
+]
+
+
+def migrate(bind=engine) -> List[str]:
+    """Apply pending migrations in order. Returns the versions applied."""
+    _meta.create_all(bind=bind)
+    with bind.connect() as conn:
+        applied = set(conn.execute(schema_migrations.select().with_only_columns(schema_migrations.c.version)).scalars())
+
+    done = []
+    for version, apply in MIGRATIONS:
+        if version in applied:
+            continue
+        with bind.begin() as conn:
+            apply(conn)
+            conn.execute(schema_migrations.insert().values(version=version))
+        logger.info("Applied migration %s", version)
+        done.append(version)
+    return done
+
+
+def should_migrate_on_startup() -> bool:
+    # Local SQLite has no deploy step, so default to migrating there; elsewhere run `python -m backend.migrate`
+    default = "true" if engine.dialect.name == "sqlite" else "false"
+    return os.environ.get("MIGRATE_ON_STARTUP", default).lower() in ("1", "true", "yes")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    applied = migrate()
+    print(f"Applied {len(applied)} migration(s): {', '.join(applied)}" if applied else "Schema is up to date")
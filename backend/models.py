@@ -1,45 +1,120 @@
-from sqlalchemy import Column, Integer, String, Float, Numeric, DateTime
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, Float, Numeric, DateTime, Text, Boolean, ForeignKey, Index, LargeBinary, UniqueConstraint
+from sqlalchemy.sql import func, text
+from datetime import datetime, timezone
 from .database import Base
 
+def utcnow():
+    # Set client-side on keyset-paginated tables so timestamps carry microseconds and
+    # (created_at, id) cursors compare exactly on every backend, SQLite included
+    return datetime.now(timezone.utc)
+
+class Brand(Base):
+    __tablename__ = "brands"
+    __table_args__ = (
+        UniqueConstraint("user_id", "normalized_name", name="uq_brands_user_name"),
+        # NULL user_ids never conflict above, so shared brands need their own unique index
+        Index(
+            "uq_brands_shared_name", "normalized_name", unique=True,
+            postgresql_where=text("user_id IS NULL"), sqlite_where=text("user_id IS NULL"),
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String)
+    normalized_name = Column(String, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)  # owning tenant, NULL = shared
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class GeoScore(Base):
     __tablename__ = "geo_scores"
+    __table_args__ = (Index("ix_geo_scores_brand_created", "brand_id", "created_at", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
+    brand_id = Column(Integer, ForeignKey("brands.id"), nullable=True)
     total = Column(Float)
     visibility = Column(Float)
     comprehension = Column(Float)
     representation = Column(Float)
     optimization = Column(Float)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now(), index=True)
 
 class ModelComparison(Base):
     __tablename__ = "model_comparisons"
+    __table_args__ = (
+        Index("ix_model_comparisons_brand_created", "brand_id", "created_at", "id"),
+        Index("ix_model_comparisons_brand_latest", "brand_id", "is_latest"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
+    brand_id = Column(Integer, ForeignKey("brands.id"), nullable=True)
     region = Column(String)
     model_name = Column(String)
     score = Column(Float)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # True only on the newest row per (brand_id, model_name), so "latest per provider" is an index lookup
+    is_latest = Column(Boolean, default=True)
+    created_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now())
+
+class ScoreRollup(Base):
+    __tablename__ = "score_rollups"
+    # The unique key doubles as the trend query index: brand, granularity, provider, dimension, time
+    __table_args__ = (
+        UniqueConstraint("brand_id", "granularity", "provider", "dimension", "bucket_start", name="uq_score_rollups_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    brand_id = Column(Integer, ForeignKey("brands.id"), nullable=False)
+    granularity = Column(String, nullable=False)  # hour, day, week
+    provider = Column(String, nullable=False, default="")  # "" for the brand-level GeoScore dimensions
+    dimension = Column(String, nullable=False)  # total, visibility, ... or "score" for a provider
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
+    count = Column(Integer, nullable=False)
+    sum = Column(Float, nullable=False)
+    min = Column(Float, nullable=False)
+    max = Column(Float, nullable=False)
 
 class Recommendation(Base):
+    """Top recommendations per brand, rebuilt from the candidates on every analysis (services/recommendations.py)."""
     __tablename__ = "recommendations"
+    # The dashboard reads one brand's rows in rank order straight off this index
+    __table_args__ = (Index("ix_recommendations_brand_rank", "brand_id", "rank"),)
 
     id = Column(Integer, primary_key=True, index=True)
+    brand_id = Column(Integer, ForeignKey("brands.id"), nullable=True)  # NULL = demo rows from backend.seed
+    rank = Column(Integer)
     type = Column(String)
     priority = Column(String)
     title = Column(String)
     suggestion = Column(String)
     impact = Column(String)
     action = Column(String)
+    occurrences = Column(Integer)  # candidates merged into this one
+    providers = Column(Integer)  # distinct providers that suggested it
+    score = Column(Float)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+class RecommendationCandidate(Base):
+    """One recommendation as a provider gave it, with its MinHash signature for near-duplicate merging."""
+    __tablename__ = "recommendation_candidates"
+    __table_args__ = (Index("ix_recommendation_candidates_brand_created", "brand_id", "created_at"),)
+
+    id = Column(Integer, primary_key=True)
+    brand_id = Column(Integer, ForeignKey("brands.id"), nullable=False)
+    provider = Column(String)
+    type = Column(String)
+    priority = Column(String)
+    title = Column(String)
+    suggestion = Column(String)
+    impact = Column(String)
+    signature = Column(LargeBinary)
+    created_at = Column(DateTime(timezone=True), default=utcnow)
+
 class User(Base):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True)
     phone = Column(String, unique=True, index=True, nullable=True)
+    openid = Column(String, unique=True, index=True, nullable=True)  # WeChat login
     name = Column(String)
     avatar = Column(String)
     role = Column(String, default="user")
@@ -47,9 +122,113 @@ class User(Base):
 
 class VerificationCode(Base):
     __tablename__ = "verification_codes"
+    # Newest live code per phone is one index probe; both indexes also serve the send-rate checks
+    __table_args__ = (
+        Index("ix_verification_codes_phone_expires", "phone", "expires_at"),
+        Index("ix_verification_codes_ip_expires", "ip", "expires_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    phone = Column(String, index=True)
+    phone = Column(String)
     code = Column(String)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    ip = Column(String)  # requesting client, for the per-IP send limit
+    attempts = Column(Integer, default=0)  # wrong guesses; the code is expired after VERIFICATION_MAX_ATTEMPTS
+    created_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now())
+    expires_at = Column(DateTime(timezone=True))  # set to the verification time once the code is used
+
+class AnalysisCacheEntry(Base):
+    __tablename__ = "analysis_cache"
+
+    key = Column(String, primary_key=True)
+    value = Column(Text)  # JSON-encoded analysis result
     expires_at = Column(DateTime(timezone=True))
+    last_used_at = Column(DateTime(timezone=True), index=True)
+
+class ProviderResponse(Base):
+    """Raw provider responses keyed by a hash of provider, endpoint, model, prompt and parameters."""
+    __tablename__ = "provider_responses"
+
+    key = Column(String, primary_key=True)  # sha256 hex
+    provider = Column(String, index=True)
+    model = Column(String)
+    response = Column(Text)  # JSON body returned by the provider
+    size_bytes = Column(Integer)
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), default=utcnow)
+    expires_at = Column(DateTime(timezone=True), index=True)
+    last_used_at = Column(DateTime(timezone=True), index=True)
+
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+
+    id = Column(String, primary_key=True)
+    kind = Column(String, default="analyze")  # analyze, batch
+    brand = Column(String)
+    payload = Column(Text)  # JSON-encoded brand list for batch jobs, options ({"refresh": true, "providers": [...]}) for analyze jobs
+    status = Column(String, index=True)  # queued, running, succeeded, failed
+    progress_total = Column(Integer, default=0)
+    progress_completed = Column(Integer, default=0)
+    progress_failed = Column(Integer, default=0)
+    result = Column(Text)  # JSON-encoded analysis result, or per-brand outcomes for batch jobs
+    error = Column(Text)
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    started_at = Column(DateTime(timezone=True))
+    heartbeat_at = Column(DateTime(timezone=True))  # refreshed while running; stale jobs are requeued
+    finished_at = Column(DateTime(timezone=True))
+
+class TrackedBrand(Base):
+    """Brands re-analyzed on a schedule by the monitor (services/scheduler.py)."""
+    __tablename__ = "tracked_brands"
+    # Due-run scan: enabled rows ordered by next_run_at
+    __table_args__ = (Index("ix_tracked_brands_due", "enabled", "next_run_at"),)
+
+    id = Column(Integer, primary_key=True)
+    brand_id = Column(Integer, ForeignKey("brands.id"), nullable=False, unique=True)
+    interval_seconds = Column(Integer, nullable=False)
+    providers = Column(Text)  # JSON list of provider names; NULL = every enabled provider
+    enabled = Column(Boolean, nullable=False, default=True)
+    next_run_at = Column(DateTime(timezone=True), nullable=False)
+    lease_owner = Column(String)  # worker running it; set together with lease_until
+    lease_until = Column(DateTime(timezone=True))
+    last_run_at = Column(DateTime(timezone=True))
+    last_status = Column(String)  # succeeded, failed
+    last_error = Column(Text)
+    runs = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), default=utcnow)
+
+class ProviderBudget(Base):
+    """Provider calls spent by scheduled runs per hour, shared by every worker."""
+    __tablename__ = "provider_budget"
+
+    window_start = Column(DateTime(timezone=True), primary_key=True)  # start of the UTC hour
+    calls = Column(Integer, nullable=False, default=0)
+
+class ContentGeneration(Base):
+    """Streamed generate/optimize output, saved while it streams (services/content.py)."""
+    __tablename__ = "content_generations"
+
+    id = Column(String, primary_key=True)
+    kind = Column(String)  # generate, optimize
+    brand = Column(String)
+    provider = Column(String)
+    model = Column(String)
+    request = Column(Text)  # JSON-encoded request body
+    output = Column(Text)  # text streamed so far; complete once status is completed
+    status = Column(String, index=True)  # streaming, completed, cancelled, failed
+    error = Column(Text)
+    first_token_ms = Column(Integer)
+    prompt_tokens = Column(Integer)
+    completion_tokens = Column(Integer)
+    created_at = Column(DateTime(timezone=True), default=utcnow, index=True)
+    updated_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+class UserSession(Base):
+    """Server-side session data; the cookie only carries the signed session id (services/sessions.py)."""
+    __tablename__ = "sessions"
+
+    id = Column(String, primary_key=True)  # sha256 of the session id, so the table alone can't be replayed
+    data = Column(Text)  # JSON
+    expires_at = Column(DateTime(timezone=True), index=True)
+    updated_at = Column(DateTime(timezone=True), default=utcnow)
@@ -55,6 +55,42 @@ CREATE TABLE IF NOT EXISTS recommendations (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL
 );
 
+-- Brands (tenant-scoped) and brand-scoped history
+CREATE TABLE IF NOT EXISTS brands (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    name TEXT,
+    normalized_name TEXT,
+    user_id BIGINT REFERENCES users(id),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL,
+    CONSTRAINT uq_brands_user_name UNIQUE (user_id, normalized_name)
+);
+CREATE INDEX IF NOT EXISTS ix_brands_normalized_name ON brands (normalized_name);
+CREATE INDEX IF NOT EXISTS ix_brands_user_id ON brands (user_id);
+
+ALTER TABLE geo_scores ADD COLUMN IF NOT EXISTS brand_id BIGINT REFERENCES brands(id);
+CREATE INDEX IF NOT EXISTS ix_geo_scores_created_at ON geo_scores (created_at);
+CREATE INDEX IF NOT EXISTS ix_geo_scores_brand_created ON geo_scores (brand_id, created_at, id);
+
+ALTER TABLE model_comparisons ADD COLUMN IF NOT EXISTS brand_id BIGINT REFERENCES brands(id);
+ALTER TABLE model_comparisons ADD COLUMN IF NOT EXISTS is_latest BOOLEAN DEFAULT TRUE;
+CREATE INDEX IF NOT EXISTS ix_model_comparisons_brand_created ON model_comparisons (brand_id, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_model_comparisons_brand_latest ON model_comparisons (brand_id, is_latest);
+
+-- Pre-aggregated trend rollups (hour/day/week buckets per brand, provider and dimension)
+CREATE TABLE IF NOT EXISTS score_rollups (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    brand_id BIGINT NOT NULL REFERENCES brands(id),
+    granularity TEXT NOT NULL,
+    provider TEXT NOT NULL DEFAULT '',
+    dimension TEXT NOT NULL,
+    bucket_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    count INTEGER NOT NULL,
+    sum DOUBLE PRECISION NOT NULL,
+    min DOUBLE PRECISION NOT NULL,
+    max DOUBLE PRECISION NOT NULL,
+    CONSTRAINT uq_score_rollups_bucket UNIQUE (brand_id, granularity, provider, dimension, bucket_start)
+);
+
 -- Insert some initial data (Mock data from frontend)
 INSERT INTO geo_scores (total, visibility, comprehension, representation, optimization)
 VALUES (82.4, 86, 79, 83, 77);
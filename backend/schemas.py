@@ -0,0 +1,49 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, ConfigDict
+
+# Response models for read endpoints. Built from ORM rows with model_validate(row), which reads
+# the already-loaded columns once and leaves nothing for the serializer to lazy-load.
+
+class ORMModel(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+class GeoScoreOut(ORMModel):
+    id: int
+    brand_id: Optional[int] = None
+    total: Optional[float] = None
+    visibility: Optional[float] = None
+    comprehension: Optional[float] = None
+    representation: Optional[float] = None
+    optimization: Optional[float] = None
+    created_at: Optional[datetime] = None
+
+class ModelComparisonOut(ORMModel):
+    id: int
+    brand_id: Optional[int] = None
+    region: Optional[str] = None
+    model_name: Optional[str] = None
+    score: Optional[float] = None
+    created_at: Optional[datetime] = None
+
+class RecommendationOut(ORMModel):
+    id: int
+    brand_id: Optional[int] = None
+    rank: Optional[int] = None
+    type: Optional[str] = None
+    priority: Optional[str] = None
+    title: Optional[str] = None
+    suggestion: Optional[str] = None
+    impact: Optional[str] = None
+    action: Optional[str] = None
+    occurrences: Optional[int] = None
+    providers: Optional[int] = None
+    created_at: Optional[datetime] = None
+
+class ScorePage(BaseModel):
+    items: List[GeoScoreOut]
+    next_cursor: Optional[str] = None
+
+class ModelComparisonPage(BaseModel):
+    items: List[ModelComparisonOut]
+    next_cursor: Optional[str] = None
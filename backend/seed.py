@@ -0,0 +1,97 @@
+"""
+Demo data for local development and preview deployments:
+
+    python -m backend.seed [--force]
+
+Adds one sample analysis (overview score and per-model comparisons) for a demo brand plus the
+sample recommendations. Tables that already hold data are left alone unless --force is given.
+Dashboard GET endpoints never write; on an empty database they return empty results.
+"""
+import argparse
+import logging
+
+from sqlalchemy import delete, exists, select
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .database import SessionLocal
+from .services import rollups
+
+logger = logging.getLogger(__name__)
+
+DEMO_BRAND = "示例品牌"
+
+DEMO_SCORE = dict(total=82.4, visibility=86, comprehension=79, representation=83, optimization=77)
+
+DEMO_MODELS = [
+    ("china", "文心一言", 90),
+    ("china", "智谱GLM", 74),
+    ("china", "Kimi", 78),
+    ("china", "豆包", 75),
+    ("global", "ChatGPT", 85),
+    ("global", "Claude", 83),
+    ("global", "Gemini", 81),
+    ("global", "Perplexity", 79),
+]
+
+DEMO_RECOMMENDATIONS = [
+    dict(
+        type="content", priority="high", title="结构化FAQ优化",
+        suggestion="在官网首页添加FAQ结构化模块，明确品牌USP与关键词匹配",
+        impact="+12% 理解度提升", action="立即优化"
+    ),
+    dict(
+        type="schema", priority="medium", title="JSON-LD结构化数据",
+        suggestion="为产品页增加JSON-LD标注以提高LLM索引能力",
+        impact="+8% 可见度提升", action="查看方案"
+    ),
+    dict(
+        type="authority", priority="high", title="高权威信源扩展",
+        suggestion="增加知乎专栏、CSDN等高权威平台的内容发布频率",
+        impact="+15% 提及率提升", action="制定策略"
+    ),
+]
+
+
+def _has_rows(db: Session, model) -> bool:
+    return db.scalar(select(exists().select_from(model)))
+
+
+def seed(db: Session, force: bool = False) -> dict:
+    """Insert the demo rows in one transaction. Returns how many rows of each kind were added."""
+    added = {"scores": 0, "models": 0, "recommendations": 0}
+
+    if force or not _has_rows(db, models.GeoScore):
+        brand_id = crud.get_brand_id(db, DEMO_BRAND)
+        now = models.utcnow()
+        score = {"brand_id": brand_id, "created_at": now, **DEMO_SCORE}
+        comparisons = [
+            {"brand_id": brand_id, "created_at": now, "region": region, "model_name": name, "score": score_value, "is_latest": True}
+            for region, name, score_value in DEMO_MODELS
+        ]
+        crud.retire_latest(db, comparisons)
+        db.add(models.GeoScore(**score))
+        db.add_all(models.ModelComparison(**row) for row in comparisons)
+        rollups.record(db, [score], comparisons)
+        added["scores"], added["models"] = 1, len(comparisons)
+
+    if force or not _has_rows(db, models.Recommendation):
+        brand_id = crud.get_brand_id(db, DEMO_BRAND)
+        db.execute(delete(models.Recommendation).where(models.Recommendation.brand_id == brand_id))
+        db.add_all(
+            models.Recommendation(brand_id=brand_id, rank=rank, **rec) for rank, rec in enumerate(DEMO_RECOMMENDATIONS, 1)
+        )
+        added["recommendations"] = len(DEMO_RECOMMENDATIONS)
+
+    db.commit()
+    return added
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Insert demo dashboard data")
+    parser.add_argument("--force", action="store_true", help="Add the demo rows even if the tables already have data")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    with SessionLocal() as session:
+        added = seed(session, force=args.force)
+    print(", ".join(f"{count} {kind}" for kind, count in added.items()) + " added")
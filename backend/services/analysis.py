@@ -1,41 +1,182 @@
 import asyncio
+import contextlib
 import os
-from .models.deepseek import DeepSeekAdapter
-from .models.doubao import DoubaoAdapter
+import time
+from .models.registry import get_registry
+from .cache import analysis_cache, analysis_cache_key, normalize_brand
+from . import evaluation, response_cache
 
-async def analyze_brand_across_models(brand_name: str):
-    # Initialize adapters
-    adapters = [
-        DeepSeekAdapter(api_key=os.environ.get("DEEPSEEK_API_KEY")),
-        DoubaoAdapter(api_key=os.environ.get("DOUBAO_API_KEY"))
-        # Add Kimi, Zhipu here later
-    ]
+def get_adapters(providers=None):
+    """Configured adapters (shared, built once per worker), or only the named providers."""
+    return get_registry().select(providers)
 
+def has_valid_result(result):
+    # Don't pin an all-providers-failed analysis in the cache for the whole TTL
+    return bool(result) and any("error" not in m for m in result.get("model_breakdown", []))
+
+async def analyze_brand_across_models(brand_name: str, refresh: bool = False, providers=None):
+    """
+    Aggregate analysis of `brand_name` by every enabled provider, or only `providers` (names).
+    `refresh` skips both caches and re-asks every provider.
+    """
+    adapters = get_adapters(providers)
+    key = analysis_cache_key(brand_name, [adapter.provider for adapter in adapters])
+    if refresh:
+        with response_cache.bypass():
+            result = await _run_analysis(brand_name, adapters)
+        if has_valid_result(result):
+            await analysis_cache.set(key, result)
+        return result
+    return await analysis_cache.get_or_compute(
+        key, lambda: _run_analysis(brand_name, adapters), cacheable=has_valid_result
+    )
+
+async def _run_analysis(brand_name: str, adapters):
     # Run all analyses in parallel
     tasks = [adapter.analyze(brand_name) for adapter in adapters]
     results = await asyncio.gather(*tasks)
+    return aggregate_results(results, len(adapters), weights_for(adapters))
+
+def weights_for(adapters):
+    return {adapter.name: adapter.weight for adapter in adapters}
+
+STREAM_DEADLINE = float(os.environ.get("ANALYZE_STREAM_DEADLINE", "20"))
+
+async def stream_brand_across_models(
+    brand_name: str,
+    deadline: float = STREAM_DEADLINE,
+    refresh: bool = False,
+    providers=None,
+):
+    """
+    Yield each provider's result as soon as it lands, then the aggregate.
+    Providers still running at `deadline` seconds are cancelled and reported as timed out.
+    `refresh` skips the analysis and provider response caches.
+    """
+    started = time.monotonic()
+
+    def elapsed_ms():
+        return round((time.monotonic() - started) * 1000)
+
+    adapters = get_adapters(providers)
+    key = analysis_cache_key(brand_name, [adapter.provider for adapter in adapters])
+    cached = None if refresh else await analysis_cache.get(key)
+    if cached is not None:
+        for res in cached.get("model_breakdown", []):
+            yield {"type": "result", "provider": res.get("provider"), "elapsed_ms": elapsed_ms(), "result": res, "cached": True}
+        yield {"type": "aggregate", "elapsed_ms": elapsed_ms(), "result": cached, "cached": True}
+        return
+
+    async def tagged(adapter):
+        return adapter, await adapter.analyze(brand_name)
+
+    # Tasks copy the current context when created, so the bypass only needs to cover their creation
+    with response_cache.bypass() if refresh else contextlib.nullcontext():
+        tasks = [asyncio.ensure_future(tagged(adapter)) for adapter in adapters]
+    pending = set(adapters)
+    results = []
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=deadline):
+            try:
+                adapter, res = await next_done
+            except asyncio.TimeoutError:
+                break
+            pending.discard(adapter)
+            results.append(res)
+            yield {"type": "result", "provider": adapter.name, "elapsed_ms": elapsed_ms(), "result": res}
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    for adapter in adapters:
+        if adapter in pending:
+            res = {"provider": adapter.name, "error": f"Timed out after {deadline}s", "timed_out": True, "score": 0}
+            results.append(res)
+            yield {"type": "timeout", "provider": adapter.name, "elapsed_ms": elapsed_ms(), "result": res}
 
-    # Aggregate results
+    aggregate = aggregate_results(results, len(adapters), weights_for(adapters))
+    if not pending and has_valid_result(aggregate):
+        await analysis_cache.set(key, aggregate)
+    yield {"type": "aggregate", "elapsed_ms": elapsed_ms(), "result": aggregate}
+
+def aggregate_results(results, engine_count: int, weights=None):
     total_score = 0
+    total_weight = 0
     valid_count = 0
     model_details = []
 
     for res in results:
         if "error" not in res and res.get("score", 0) > 0:
-            total_score += res["score"]
+            weight = (weights or {}).get(res.get("provider"), 1.0)
+            total_score += res["score"] * weight
+            total_weight += weight
             valid_count += 1
         model_details.append(res)
 
-    avg_score = round(total_score / valid_count, 1) if valid_count > 0 else 0
+    avg_score = round(total_score / total_weight, 1) if total_weight > 0 else 0
+    combined = evaluation.combine(model_details, weights)
 
     return {
         "total_score": avg_score,
-        "dimensions": {
-            "visibility": avg_score + 2, # Mock logic for dimensions based on avg
-            "comprehension": avg_score - 2,
-            "representation": avg_score + 1,
-            "optimization": avg_score - 1
-        },
+        "dimensions": combined["dimensions"],
         "model_breakdown": model_details,
-        "summary": f"Analyzed across {len(adapters)} engines. Average score: {avg_score}"
+        # Failed providers are left out of the average rather than counted as 0
+        "providers_responded": valid_count,
+        "report": combined["report"],
+        "summary": f"Analyzed across {engine_count} engines ({valid_count} responded). Average score: {avg_score}"
+    }
+
+COMPARE_MAX_BRANDS = int(os.environ.get("COMPARE_MAX_BRANDS", "20"))
+
+async def compare_brands(brand_name: str, competitors, refresh: bool = False, providers=None):
+    """
+    Score `brand_name` and its competitors with every enabled provider (or only `providers`) and
+    rank them. Each provider is asked about several brands per call (adapter.analyze_many).
+    """
+    if not (brand_name or "").strip():
+        raise ValueError("brand is required")
+    names, seen = [], set()
+    for name in [brand_name, *competitors]:
+        name = (name or "").strip()
+        if name and normalize_brand(name) not in seen:
+            seen.add(normalize_brand(name))
+            names.append(name)
+    if len(names) < 2:
+        raise ValueError("Give at least one competitor")
+    if len(names) > COMPARE_MAX_BRANDS:
+        raise ValueError(f"At most {COMPARE_MAX_BRANDS} brands per comparison")
+
+    adapters = get_adapters(providers)
+    with response_cache.bypass() if refresh else contextlib.nullcontext():
+        per_provider = await asyncio.gather(*(adapter.analyze_many(names) for adapter in adapters))
+
+    rows = []
+    for i, name in enumerate(names):
+        aggregate = aggregate_results([p["results"][i] for p in per_provider], len(adapters), weights_for(adapters))
+        rows.append({
+            "brand": name,
+            "is_target": i == 0,
+            "total_score": aggregate["total_score"],
+            "dimensions": aggregate["dimensions"],
+            "providers_responded": aggregate["providers_responded"],
+            "scores": {res.get("provider"): res.get("score", 0) for res in aggregate["model_breakdown"]},
+            "model_breakdown": aggregate["model_breakdown"],
+        })
+    # Brands no provider could score go last rather than ranking on a 0
+    rows.sort(key=lambda row: (row["providers_responded"] == 0, -row["total_score"]))
+    for rank, row in enumerate(rows, 1):
+        row["rank"] = rank
+
+    reports = {adapter.name: p["report"] for adapter, p in zip(adapters, per_provider)}
+    calls = sum(r.get("calls", 0) for r in reports.values())
+    return {
+        "brand": names[0],
+        "target_rank": next(row["rank"] for row in rows if row["is_target"]),
+        "table": rows,
+        "report": {
+            "calls": calls,
+            # What analyzing each brand on its own would have cost
+            "calls_per_brand_mode": len(names) * evaluation.calls_per_provider() * len(adapters),
+            "providers": reports,
+        },
     }
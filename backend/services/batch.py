@@ -0,0 +1,102 @@
+import asyncio
+import csv
+import io
+import os
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from . import analysis
+from .cache import normalize_brand
+
+BATCH_CONCURRENCY = int(os.environ.get("ANALYZE_BATCH_CONCURRENCY", "8"))
+BATCH_CHUNK_SIZE = int(os.environ.get("ANALYZE_BATCH_CHUNK_SIZE", "50"))
+MAX_BATCH_BRANDS = int(os.environ.get("ANALYZE_BATCH_MAX_BRANDS", "1000"))
+
+HEADER_NAMES = {"brand", "brands", "brand_name", "name", "品牌"}
+
+
+def dedupe_brands(brands: List[str]) -> List[str]:
+    seen = set()
+    unique = []
+    for brand in brands:
+        brand = brand.strip()
+        key = normalize_brand(brand)
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(brand)
+    return unique
+
+
+def parse_brands_csv(content: bytes) -> List[str]:
+    """Brands are read from the first column; an optional header row is skipped. Raises ValueError for unreadable files."""
+    try:
+        text = content.decode("utf-8-sig")
+        rows = [row for row in csv.reader(io.StringIO(text)) if row and row[0].strip()]
+    except UnicodeDecodeError:
+        raise ValueError("CSV file must be UTF-8 encoded")
+    except csv.Error as e:
+        raise ValueError(f"Invalid CSV file: {e}")
+    if rows and rows[0][0].strip().lower() in HEADER_NAMES:
+        rows = rows[1:]
+    return [row[0] for row in rows]
+
+
+class BatchProgress:
+    def __init__(self, total: int):
+        self.total = total
+        self.completed = 0
+        self.failed = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {"total": self.total, "completed": self.completed, "failed": self.failed}
+
+
+async def run_batch(
+    brands: List[str],
+    on_chunk: Callable[[List[Tuple[str, dict]], BatchProgress, List[dict]], Awaitable[None]],
+    concurrency: int = BATCH_CONCURRENCY,
+    chunk_size: int = BATCH_CHUNK_SIZE,
+    done: Optional[List[dict]] = None,
+) -> List[dict]:
+    """
+    Analyze `brands` with at most `concurrency` brand fan-outs in flight.
+
+    Successful (brand, analysis) pairs are handed to `on_chunk` every `chunk_size` brands so the
+    caller can bulk-insert them in one transaction and record progress, together with the
+    outcomes so far. Brands with an outcome in `done` (from an interrupted run) are not analyzed
+    again. Returns one entry per brand, in input order, with either its total score or the error
+    that stopped it.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    progress = BatchProgress(len(brands))
+    previous = {normalize_brand(o["brand"]): o for o in done or [] if o and o.get("brand")}
+    outcomes: List[Optional[dict]] = [previous.get(normalize_brand(brand)) for brand in brands]
+    progress.completed = sum(1 for o in outcomes if o and o["status"] == "succeeded")
+    progress.failed = sum(1 for o in outcomes if o and o["status"] == "failed")
+    chunk: List[Tuple[str, dict]] = []
+
+    async def flush():
+        nonlocal chunk
+        # Swap before awaiting so brands finishing during the write start the next chunk; the
+        # outcomes are copied at the same moment, so they cover exactly what has been saved
+        ready, chunk = chunk, []
+        await on_chunk(ready, progress, [o for o in outcomes if o is not None])
+
+    async def analyze_one(index: int, brand: str):
+        async with semaphore:
+            try:
+                result = await analysis.analyze_brand_across_models(brand)
+                if not analysis.has_valid_result(result):
+                    raise RuntimeError("No provider returned a score")
+            except Exception as e:
+                progress.failed += 1
+                outcomes[index] = {"brand": brand, "status": "failed", "error": str(e)}
+                return
+        progress.completed += 1
+        outcomes[index] = {"brand": brand, "status": "succeeded", "total_score": result.get("total_score")}
+        chunk.append((brand, result))
+        if len(chunk) >= chunk_size:
+            await flush()
+
+    await asyncio.gather(*(analyze_one(i, brand) for i, brand in enumerate(brands) if outcomes[i] is None))
+    await flush()
+    return outcomes
@@ -0,0 +1,236 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever adapter prompts or result shape change so stale analyses are not served
+PROMPT_VERSION = "v2"
+
+
+def normalize_brand(brand_name: str) -> str:
+    # "  Nike ", "nike" and "ＮＩＫＥ" are the same brand as far as the providers are concerned
+    return " ".join(unicodedata.normalize("NFKC", brand_name).split()).casefold()
+
+
+def analysis_cache_key(brand_name: str, providers: Iterable[str], prompt_version: str = PROMPT_VERSION) -> str:
+    return "|".join([prompt_version, ",".join(sorted(providers)), normalize_brand(brand_name)])
+
+
+class MemoryCacheBackend:
+    """Bounded in-process LRU. Entries are (value, expires_at) with expires_at on the monotonic clock."""
+
+    blocking = False
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLCacheBackend:
+    """
+    Cache rows in the analysis_cache table so every gunicorn worker shares them.
+    Methods are blocking and are run off the event loop by AnalysisCache.
+    """
+
+    blocking = True
+
+    def __init__(self, session_factory=None, max_entries: int = 10000):
+        if session_factory is None:
+            from ..database import SessionLocal
+            session_factory = SessionLocal
+        self.session_factory = session_factory
+        self.max_entries = max_entries
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        from ..models import AnalysisCacheEntry
+        now = datetime.now(timezone.utc)
+        with self.session_factory() as db:
+            entry = db.get(AnalysisCacheEntry, key)
+            if entry is None:
+                return None
+            if _as_utc(entry.expires_at) <= now:
+                db.delete(entry)
+                db.commit()
+                return None
+            entry.last_used_at = now
+            db.commit()
+            return json.loads(entry.value)
+
+    def set(self, key: str, value: Any, ttl: float):
+        from ..models import AnalysisCacheEntry
+        now = datetime.now(timezone.utc)
+        with self.session_factory() as db:
+            db.merge(AnalysisCacheEntry(
+                key=key,
+                value=json.dumps(value, ensure_ascii=False),
+                expires_at=now + timedelta(seconds=ttl),
+                last_used_at=now,
+            ))
+            db.commit()
+            self._evict(db)
+
+    def _evict(self, db):
+        from ..models import AnalysisCacheEntry
+        count = db.query(AnalysisCacheEntry).count()
+        overflow = count - self.max_entries
+        if overflow <= 0:
+            return
+        stale = (
+            db.query(AnalysisCacheEntry.key)
+            .order_by(AnalysisCacheEntry.last_used_at.asc())
+            .limit(overflow)
+            .subquery()
+        )
+        db.query(AnalysisCacheEntry).filter(AnalysisCacheEntry.key.in_(stale.select())).delete(synchronize_session=False)
+        db.commit()
+        self.evictions += overflow
+
+    def delete(self, key: str):
+        from ..models import AnalysisCacheEntry
+        with self.session_factory() as db:
+            db.query(AnalysisCacheEntry).filter(AnalysisCacheEntry.key == key).delete()
+            db.commit()
+
+    def clear(self):
+        from ..models import AnalysisCacheEntry
+        with self.session_factory() as db:
+            db.query(AnalysisCacheEntry).delete()
+            db.commit()
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes even for timezone=True columns
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class AnalysisCache:
+    """
+    TTL cache in front of the multi-model fan-out with single-flight coalescing:
+    concurrent callers asking for the same key await one computation.
+    """
+
+    def __init__(self, backend=None, ttl: float = 600):
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.ttl = ttl
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def _call(self, method, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            return await self._call(self.backend.get, key)
+        except Exception as e:
+            # A broken cache must never take analysis down with it
+            self.errors += 1
+            logger.warning("Analysis cache read failed: %s", e)
+            return None
+
+    async def set(self, key: str, value: Any):
+        try:
+            await self._call(self.backend.set, key, value, self.ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Analysis cache write failed: %s", e)
+
+    async def invalidate(self, key: str):
+        await self._call(self.backend.delete, key)
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] = lambda value: value is not None,
+    ) -> Any:
+        cached = await self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._fill(key, compute, cacheable))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # Shield so one caller disconnecting does not cancel the fan-out the others are waiting on
+        return await asyncio.shield(task)
+
+    async def _fill(self, key, compute, cacheable):
+        value = await compute()
+        if cacheable(value):
+            await self.set(key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        stats = {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "in_flight": len(self._inflight),
+            "evictions": getattr(self.backend, "evictions", 0),
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+        if isinstance(self.backend, MemoryCacheBackend):
+            stats["entries"] = len(self.backend)
+        return stats
+
+
+def _build_backend():
+    max_entries = int(os.environ.get("ANALYSIS_CACHE_MAX_ENTRIES", "1024"))
+    if os.environ.get("ANALYSIS_CACHE_BACKEND", "memory").lower() == "sql":
+        return SQLCacheBackend(max_entries=max_entries)
+    return MemoryCacheBackend(max_entries=max_entries)
+
+
+analysis_cache = AnalysisCache(
+    backend=_build_backend(),
+    ttl=float(os.environ.get("ANALYSIS_CACHE_TTL", "600")),
+)
@@ -0,0 +1,277 @@
+"""
+Streaming content generation and optimization for the Generate and Optimize pages.
+
+The provider's reply (`"stream": true`) is read by a background task while the response relays it
+to the browser over SSE. A slow client never stalls the provider read: text that arrives while
+the previous event is still being written is coalesced into the next `delta` event. When the
+client disconnects the read task is cancelled, which closes the provider connection so no more
+tokens are generated (or billed). The text so far is saved to content_generations every
+CONTENT_FLUSH_INTERVAL seconds and in full when the stream ends, cancelled streams included.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import update
+
+from .. import models
+from ..database import AsyncSessionLocal
+from . import metrics
+from .models.registry import UnknownProvider, get_registry
+
+logger = logging.getLogger(__name__)
+
+STREAMING = "streaming"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+CONTENT_MAX_TOKENS = int(os.environ.get("CONTENT_MAX_TOKENS", "2048"))
+CONTENT_MAX_INPUT_CHARS = int(os.environ.get("CONTENT_MAX_INPUT_CHARS", "20000"))
+CONTENT_FLUSH_INTERVAL = float(os.environ.get("CONTENT_FLUSH_INTERVAL", "2"))
+
+CONTENT_FIRST_TOKEN = metrics.registry.histogram(
+    "content_first_token_seconds", "Time from request to the first streamed token", ("kind", "provider")
+)
+CONTENT_STREAMS = metrics.registry.counter(
+    "content_streams_total", "Generate/optimize streams by outcome (completed, cancelled, failed)", ("kind", "outcome")
+)
+
+OBJECTIVES = {
+    "conversion": "drive conversions: clear benefits, objections answered, a strong call to action",
+    "exposure": "raise the brand's visibility in AI assistant answers: name the brand early and often, with citable facts",
+    "leads": "attract potential customers: speak to their problems and invite them to get in touch",
+    "ranking": "rank higher in AI answers: answer the questions people ask directly, in a structured, quotable way",
+}
+
+FORMATS = {
+    "article": "a long-form SEO article with headings",
+    "post": "a short social media post",
+    "ad": "conversion-focused ad copy",
+    "video": "a short video script with scenes and voice-over",
+    "email": "a marketing email (EDM) with subject line",
+}
+
+SYSTEM_PROMPT = (
+    "You are a marketing copywriter specialised in Generative Engine Optimization (GEO): content that "
+    "AI assistants understand, trust and cite. Write in the same language as the user's brief. Use Markdown."
+)
+
+
+def generate_messages(brief: str, objective: str, formats: List[str], brand: Optional[str] = None) -> List[Dict[str, str]]:
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective must be one of {', '.join(OBJECTIVES)}")
+    unknown = [f for f in formats if f not in FORMATS]
+    if not formats or unknown:
+        raise ValueError(f"formats must be one or more of {', '.join(FORMATS)}")
+    pieces = "\n".join(f"- {FORMATS[f]}" for f in formats)
+    prompt = f"""
+    Goal: {OBJECTIVES[objective]}.
+    {f"Brand: {brand}" if brand else ""}
+    Brief: {brief}
+
+    Write the following, each under its own heading:
+{pieces}
+    """
+    return [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+
+
+def optimize_messages(content: str, brand: Optional[str] = None, keywords: Optional[List[str]] = None) -> List[Dict[str, str]]:
+    prompt = f"""
+    Rewrite the content below so AI assistants are more likely to understand and cite it: a clear title,
+    logical headings, short quotable statements of fact, an FAQ section, and natural use of the keywords.
+    Keep the meaning and the facts; do not invent claims.
+    {f"Brand: {brand}" if brand else ""}
+    {f"Keywords: {', '.join(keywords)}" if keywords else ""}
+
+    Content:
+    {content}
+    """
+    return [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+
+
+def pick_adapter(name: Optional[str] = None):
+    """The named provider, or the first enabled one that is configured."""
+    adapters = get_registry().select([name] if name else None)
+    if not adapters:
+        raise UnknownProvider("No providers are enabled")
+    return next((a for a in adapters if not a.missing_config()), adapters[0])
+
+
+def generation_to_dict(generation: models.ContentGeneration) -> Dict[str, Any]:
+    return {
+        "id": generation.id,
+        "kind": generation.kind,
+        "brand": generation.brand,
+        "provider": generation.provider,
+        "model": generation.model,
+        "request": json.loads(generation.request) if generation.request else None,
+        "output": generation.output or "",
+        "status": generation.status,
+        "error": generation.error,
+        "first_token_ms": generation.first_token_ms,
+        "prompt_tokens": generation.prompt_tokens,
+        "completion_tokens": generation.completion_tokens,
+        "created_at": generation.created_at,
+        "finished_at": generation.finished_at,
+    }
+
+
+async def get_generation(generation_id: str, session_factory=AsyncSessionLocal) -> Optional[Dict[str, Any]]:
+    async with session_factory() as db:
+        generation = await db.get(models.ContentGeneration, generation_id)
+        return generation_to_dict(generation) if generation else None
+
+
+class ContentStream:
+    """One streamed generation: reads the provider, relays coalesced deltas and saves the output."""
+
+    def __init__(
+        self,
+        kind: str,
+        adapter,
+        messages: List[Dict[str, str]],
+        request: Dict[str, Any],
+        session_factory=AsyncSessionLocal,
+        flush_interval: float = None,
+        max_tokens: int = None,
+    ):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.adapter = adapter
+        self.messages = messages
+        self.request = request
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval or CONTENT_FLUSH_INTERVAL
+        self.max_tokens = max_tokens or CONTENT_MAX_TOKENS
+        self.chunks: List[str] = []
+        self.usage: Dict[str, int] = {}
+        self.first_token_ms: Optional[int] = None
+        self.error: Optional[str] = None
+        self.finished = False
+        self._changed = asyncio.Event()
+        self._started = time.perf_counter()
+
+    async def events(self, is_disconnected: Callable[[], Awaitable[bool]]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """(event, data) pairs: start, then delta {text} until the reply ends, then done or error."""
+        await self._create()
+        reader = asyncio.create_task(self._read())
+        flusher = asyncio.create_task(self._flush_periodically())
+        saved = False
+        try:
+            yield "start", {"id": self.id, "provider": self.adapter.name, "model": self.adapter.model}
+            sent = 0
+            while True:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), 1.0)
+                except asyncio.TimeoutError:
+                    pass
+                self._changed.clear()
+                if sent < len(self.chunks):
+                    text = "".join(self.chunks[sent:])
+                    sent = len(self.chunks)
+                    yield "delta", {"text": text}
+                if self.finished:
+                    break
+                if await is_disconnected():
+                    return
+
+            status = FAILED if self.error else COMPLETED
+            await self._stop(reader, flusher)
+            await self._save(status)
+            saved = True
+            summary = {
+                "id": self.id,
+                "status": status,
+                "first_token_ms": self.first_token_ms,
+                "prompt_tokens": self.usage.get("prompt_tokens", 0),
+                "completion_tokens": self.usage.get("completion_tokens", 0),
+            }
+            if self.error:
+                yield "error", {**summary, "detail": self.error}
+            else:
+                yield "done", summary
+        finally:
+            if not saved:
+                # Client went away: stop the provider read and keep what was generated. Shielded,
+                # because a disconnect cancels this generator's task and would cancel the save too.
+                await asyncio.shield(self._cancel(reader, flusher))
+
+    async def _read(self):
+        try:
+            async for text in self.adapter.stream_chat(self.messages, self.usage, self.max_tokens):
+                if self.first_token_ms is None:
+                    elapsed = time.perf_counter() - self._started
+                    self.first_token_ms = round(elapsed * 1000)
+                    CONTENT_FIRST_TOKEN.observe(elapsed, kind=self.kind, provider=self.adapter.provider)
+                self.chunks.append(text)
+                self._changed.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("%s %s stream %s failed: %s", self.adapter.name, self.kind, self.id, e)
+            self.error = str(e) or type(e).__name__
+        self.finished = True
+        self._changed.set()
+
+    async def _stop(self, *tasks: asyncio.Task):
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _cancel(self, *tasks: asyncio.Task):
+        await self._stop(*tasks)
+        await self._save(CANCELLED)
+
+    # --- DB helpers ---
+
+    async def _create(self):
+        async with self.session_factory() as db:
+            db.add(models.ContentGeneration(
+                id=self.id,
+                kind=self.kind,
+                brand=self.request.get("brand"),
+                provider=self.adapter.name,
+                model=self.adapter.model,
+                request=json.dumps(self.request, ensure_ascii=False),
+                output="",
+                status=STREAMING,
+            ))
+            await db.commit()
+
+    async def _update(self, **values):
+        async with self.session_factory() as db:
+            await db.execute(
+                update(models.ContentGeneration)
+                .where(models.ContentGeneration.id == self.id)
+                .values(output="".join(self.chunks), updated_at=datetime.now(timezone.utc), **values)
+            )
+            await db.commit()
+
+    async def _flush_periodically(self):
+        flushed = 0
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if len(self.chunks) != flushed:
+                flushed = len(self.chunks)
+                try:
+                    await self._update(first_token_ms=self.first_token_ms)
+                except Exception:
+                    # The final save still has the full text
+                    logger.exception("Could not save partial output of %s", self.id)
+
+    async def _save(self, status: str):
+        CONTENT_STREAMS.inc(kind=self.kind, outcome=status)
+        await self._update(
+            status=status,
+            error=self.error,
+            first_token_ms=self.first_token_ms,
+            prompt_tokens=self.usage.get("prompt_tokens"),
+            completion_tokens=self.usage.get("completion_tokens"),
+            finished_at=datetime.now(timezone.utc),
+        )
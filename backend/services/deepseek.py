@@ -1,6 +1,10 @@
-import httpx
 import os
 import json
+import logging
+from .http_client import http_pool
+from .models.resilience import get_policy
+
+logger = logging.getLogger(__name__)
 
 DEEPSEEK_API_KEY = os.environ.get("DEEPSEEK_API_KEY")
 DEEPSEEK_BASE_URL = os.environ.get("DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1")
@@ -53,13 +57,14 @@ async def analyze_brand(brand_name: str):
         "response_format": {"type": "json_object"}
     }
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(f"{DEEPSEEK_BASE_URL}/chat/completions", json=payload, headers=headers, timeout=30.0)
-            response.raise_for_status()
-            data = response.json()
-            content = data["choices"][0]["message"]["content"]
-            return json.loads(content)
-        except Exception as e:
-            print(f"DeepSeek API Error: {e}")
-            return None
+    try:
+        client = http_pool.get("deepseek")
+        response = await get_policy("deepseek").call(
+            lambda: client.post(f"{DEEPSEEK_BASE_URL}/chat/completions", json=payload, headers=headers)
+        )
+        data = response.json()
+        content = data["choices"][0]["message"]["content"]
+        return json.loads(content)
+    except Exception as e:
+        logger.warning("DeepSeek API error: %s", e)
+        return None
@@ -0,0 +1,363 @@
+"""
+Multi-prompt brand evaluation.
+
+Each GEO dimension is scored from a suite of probe questions. A provider answers several probes
+per call (a numbered list in one JSON-mode prompt, EVAL_BATCH_SIZE probes per call) with at most
+EVAL_MAX_CONCURRENCY calls in flight per provider. Probe scores are averaged per dimension, and
+dimensions are combined with EVAL_WEIGHTS into the provider's score. Every provider result reports
+the calls, tokens, latency and (when prices are configured) cost it took.
+
+Override the probes with EVAL_PROBES_FILE, a JSON object of {"dimension": ["question {brand}", ...]}.
+
+Comparisons (evaluate_many) put up to COMPARE_BRANDS_PER_CALL brands in one prompt, every probe asked
+for each of them, so comparing N brands takes about N / COMPARE_BRANDS_PER_CALL calls per provider
+instead of N. Brands missing from a reply, or whose reply can't be parsed, are evaluated one by one.
+"""
+import asyncio
+import json
+import logging
+import os
+import pathlib
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ("visibility", "comprehension", "representation", "optimization")
+
+# Matches the weights shown on the dashboard
+DEFAULT_WEIGHTS = {"visibility": 0.30, "comprehension": 0.25, "representation": 0.25, "optimization": 0.20}
+
+DEFAULT_PROBES = {
+    "visibility": [
+        "How likely are you to mention {brand} when asked for recommendations in its category?",
+        "How much do you know about {brand} (products, history, market position)?",
+        "How prominent is {brand} compared with its main competitors?",
+    ],
+    "comprehension": [
+        "How accurately can you describe what {brand} offers and who it is for?",
+        "How well do you understand {brand}'s key differentiators?",
+        "How confident are you that your facts about {brand} are current and correct?",
+    ],
+    "representation": [
+        "How positive is the overall picture you would give of {brand}?",
+        "How trustworthy and authoritative are the sources you associate with {brand}?",
+        "How rich and specific would your description of {brand} be?",
+    ],
+    "optimization": [
+        "How much structured, citable content (FAQs, specs, reviews) do you associate with {brand}?",
+        "How consistent is the information about {brand} across the sources you know?",
+        "How easy would it be for {brand} to improve how AI assistants describe it?",
+    ],
+}
+
+EVAL_BATCH_SIZE = int(os.environ.get("EVAL_BATCH_SIZE", "12"))
+EVAL_MAX_CONCURRENCY = int(os.environ.get("EVAL_MAX_CONCURRENCY", "4"))
+# Per reply; the recommendations pipeline merges them across providers and runs
+MAX_RECOMMENDATIONS = 3
+COMPARE_BRANDS_PER_CALL = int(os.environ.get("COMPARE_BRANDS_PER_CALL", "5"))
+
+
+def _load_weights() -> Dict[str, float]:
+    raw = os.environ.get("EVAL_WEIGHTS")
+    weights = {**DEFAULT_WEIGHTS, **(json.loads(raw) if raw else {})}
+    return {d: float(weights[d]) for d in DIMENSIONS}
+
+
+def _load_probes() -> Dict[str, List[str]]:
+    path = os.environ.get("EVAL_PROBES_FILE")
+    probes = json.loads(pathlib.Path(path).read_text(encoding="utf-8")) if path else DEFAULT_PROBES
+    return {d: list(probes.get(d, [])) for d in DIMENSIONS}
+
+
+WEIGHTS = _load_weights()
+PROBES = _load_probes()
+
+
+class Probe:
+    __slots__ = ("id", "dimension", "question")
+
+    def __init__(self, id: str, dimension: str, question: str):
+        self.id = id
+        self.dimension = dimension
+        self.question = question
+
+
+def build_probes(brand_name: str, probes: Dict[str, List[str]] = None) -> List[Probe]:
+    probes = probes or PROBES
+    return [
+        Probe(f"{dimension[0]}{i + 1}", dimension, question.format(brand=brand_name))
+        for dimension in DIMENSIONS
+        for i, question in enumerate(probes[dimension])
+    ]
+
+
+def calls_per_provider(batch_size: int = None) -> int:
+    """Provider calls one evaluation makes (before retries and hedges)."""
+    batch_size = batch_size or EVAL_BATCH_SIZE
+    return -(-sum(len(questions) for questions in PROBES.values()) // batch_size)
+
+
+def batch_prompt(brand_name: str, probes: List[Probe]) -> str:
+    questions = "\n".join(f"- [{probe.id}] {probe.question}" for probe in probes)
+    return f"""
+    You are auditing how AI assistants perceive the brand '{brand_name}'. Answer from your own knowledge.
+    For each question below, give a score from 0 to 100 (higher = stronger for the brand) and one sentence of reasoning.
+
+{questions}
+
+    Return JSON: {{
+      "answers": [{{ "id": "<question id>", "score": <int>, "reason": "<text>" }}],
+      "summary": "<two-sentence overall assessment>",
+      "sentiment": "<positive/neutral/negative>",
+      "recommendations": [{{
+        "title": "<short title>", "type": "content|schema|authority", "priority": "high|medium|low",
+        "suggestion": "<one concrete action that would improve these scores>", "impact": "<expected effect>"
+      }}]
+    }}
+    Give at most {MAX_RECOMMENDATIONS} recommendations.
+    """
+
+
+def multi_brand_prompt(brand_names: List[str], probes: List[Probe]) -> str:
+    brands = "\n".join(f"- <b{i + 1}> {name}" for i, name in enumerate(brand_names))
+    questions = "\n".join(f"- [{probe.id}] {probe.question}" for probe in probes)
+    return f"""
+    You are auditing how AI assistants perceive several brands. Answer from your own knowledge and
+    judge each brand on its own merits.
+
+    Brands:
+{brands}
+
+    For every brand, score each question below from 0 to 100 (higher = stronger for the brand),
+    reading "the brand" as that brand:
+{questions}
+
+    Return JSON: {{
+      "brands": [{{
+        "id": "<brand id, e.g. b1>",
+        "scores": {{ "<question id>": <int> }},
+        "summary": "<one-sentence assessment>",
+        "sentiment": "<positive/neutral/negative>"
+      }}]
+    }}
+    """
+
+
+def _clamp(value) -> Optional[float]:
+    try:
+        return max(0.0, min(100.0, float(value)))
+    except (TypeError, ValueError):
+        return None
+
+
+def weighted_score(dimensions: Dict[str, Optional[float]], weights: Dict[str, float] = None) -> float:
+    """Weighted mean over the dimensions that have a score (missing ones don't count as 0)."""
+    weights = weights or WEIGHTS
+    scored = {d: s for d, s in dimensions.items() if s is not None}
+    total_weight = sum(weights[d] for d in scored)
+    if not total_weight:
+        return 0.0
+    return round(sum(s * weights[d] for d, s in scored.items()) / total_weight, 1)
+
+
+def _report(calls: int, failed_calls: int, probes: int, answered: int, usage: Dict[str, int], started: float, adapter) -> Dict[str, Any]:
+    report = {
+        "calls": calls,
+        "failed_calls": failed_calls,
+        "probes": probes,
+        "probes_answered": answered,
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0),
+        "latency_ms": round((time.perf_counter() - started) * 1000),
+    }
+    cost = adapter.estimate_cost(report["prompt_tokens"], report["completion_tokens"])
+    if cost is not None:
+        report["cost"] = cost
+    return report
+
+
+async def evaluate(adapter, brand_name: str, batch_size: int = None, concurrency: int = None) -> Dict[str, Any]:
+    """Run the probe suite against one provider and return its scored result with a cost/latency report."""
+    batch_size = batch_size or EVAL_BATCH_SIZE
+    probes = build_probes(brand_name)
+    batches = [probes[i:i + batch_size] for i in range(0, len(probes), batch_size)]
+    semaphore = asyncio.Semaphore(concurrency or EVAL_MAX_CONCURRENCY)
+    usage: Dict[str, int] = {}
+    served_by = set()
+    started = time.perf_counter()
+
+    async def run_batch(batch: List[Probe]):
+        async with semaphore:
+            content, provider = await adapter.ask(batch_prompt(brand_name, batch), usage)
+        served_by.add(provider)
+        return content
+
+    replies = await asyncio.gather(*(run_batch(batch) for batch in batches), return_exceptions=True)
+    errors = [r for r in replies if isinstance(r, BaseException)]
+    replies = [r for r in replies if not isinstance(r, BaseException)]
+    if not replies:
+        raise errors[0]
+
+    by_id = {probe.id: probe for probe in probes}
+    probe_scores: Dict[str, List[float]] = {d: [] for d in DIMENSIONS}
+    for reply in replies:
+        for answer in reply.get("answers") or []:
+            probe = by_id.get(str(answer.get("id")))
+            score = _clamp(answer.get("score"))
+            if probe is not None and score is not None:
+                probe_scores[probe.dimension].append(score)
+
+    dimensions = {d: round(sum(s) / len(s), 1) if s else None for d, s in probe_scores.items()}
+    answered = sum(len(s) for s in probe_scores.values())
+    if not answered:
+        raise ValueError("Provider returned no usable probe scores")
+
+    first = replies[0]
+    report = _report(len(batches), len(errors), len(probes), answered, usage, started, adapter)
+
+    result = {
+        "provider": adapter.name,
+        "region": adapter.region,
+        "score": weighted_score(dimensions),
+        "dimensions": dimensions,
+        "summary": first.get("summary", ""),
+        "sentiment": first.get("sentiment", "neutral"),
+        "recommendations": [
+            rec for reply in replies for rec in (reply.get("recommendations") or [])[:MAX_RECOMMENDATIONS] if isinstance(rec, dict)
+        ],
+        "report": report,
+    }
+    served_by.discard(adapter.name)
+    if served_by:
+        result["served_by"] = ", ".join(sorted(served_by))
+    return result
+
+
+def _parse_brands(reply: Dict[str, Any], ids: List[str], probes: List[Probe]) -> Dict[str, Dict[str, Any]]:
+    """Dimension scores per brand id from a multi-brand reply; brands without usable scores are left out."""
+    by_id = {probe.id: probe for probe in probes}
+    parsed = {}
+    entries = reply.get("brands")
+    if not isinstance(entries, list):
+        raise ValueError("Reply has no brands list")
+    for entry in entries:
+        if not isinstance(entry, dict) or str(entry.get("id")) not in ids:
+            continue
+        probe_scores: Dict[str, List[float]] = {d: [] for d in DIMENSIONS}
+        scores = entry.get("scores")
+        for probe_id, value in (scores.items() if isinstance(scores, dict) else ()):
+            probe = by_id.get(str(probe_id))
+            score = _clamp(value)
+            if probe is not None and score is not None:
+                probe_scores[probe.dimension].append(score)
+        answered = sum(len(s) for s in probe_scores.values())
+        if answered:
+            parsed[str(entry["id"])] = {
+                "dimensions": {d: round(sum(s) / len(s), 1) if s else None for d, s in probe_scores.items()},
+                "answered": answered,
+                "summary": entry.get("summary", ""),
+                "sentiment": entry.get("sentiment", "neutral"),
+            }
+    return parsed
+
+
+async def evaluate_many(adapter, brand_names: List[str], brands_per_call: int = None, concurrency: int = None) -> Dict[str, Any]:
+    """
+    Run the probe suite for several brands against one provider, several brands per call.
+    Returns {"results": [one result per brand, in order], "report": {...}} where the report covers
+    the whole comparison, per-brand fallback calls included.
+    """
+    brands_per_call = brands_per_call or COMPARE_BRANDS_PER_CALL
+    # Placeholder brand, so the questions read "the brand" and are shared by every brand in the prompt
+    probes = build_probes("the brand")
+    chunks = [brand_names[i:i + brands_per_call] for i in range(0, len(brand_names), brands_per_call)]
+    semaphore = asyncio.Semaphore(concurrency or EVAL_MAX_CONCURRENCY)
+    usage: Dict[str, int] = {}
+    results: Dict[str, Dict[str, Any]] = {}
+    fallback: List[str] = []
+    failed = answered = 0
+    started = time.perf_counter()
+
+    async def run_chunk(chunk: List[str]):
+        nonlocal failed, answered
+        ids = [f"b{i + 1}" for i in range(len(chunk))]
+        try:
+            async with semaphore:
+                reply, provider = await adapter.ask(multi_brand_prompt(chunk, probes), usage)
+            parsed = _parse_brands(reply, ids, probes)
+        except (ValueError, KeyError, TypeError) as e:
+            # json.JSONDecodeError is a ValueError: the provider answered, but not in a usable shape
+            logger.info("%s multi-brand reply unusable, evaluating %d brands one by one: %s", adapter.name, len(chunk), e)
+            failed += 1
+            fallback.extend(chunk)
+            return
+        except Exception as e:
+            # A provider failure would only repeat per brand, so it is reported instead of retried
+            failed += 1
+            for name in chunk:
+                results[name] = {"provider": adapter.name, "region": adapter.region, "error": str(e), "score": 0}
+            return
+        for brand_id, name in zip(ids, chunk):
+            if brand_id not in parsed:
+                fallback.append(name)
+                continue
+            brand = parsed[brand_id]
+            answered += brand["answered"]
+            results[name] = {
+                "provider": adapter.name,
+                "region": adapter.region,
+                "score": weighted_score(brand["dimensions"]),
+                "dimensions": brand["dimensions"],
+                "summary": brand["summary"],
+                "sentiment": brand["sentiment"],
+            }
+            if provider != adapter.name:
+                results[name]["served_by"] = provider
+
+    await asyncio.gather(*(run_chunk(chunk) for chunk in chunks))
+
+    fallback_reports = []
+    if fallback:
+        single = await asyncio.gather(*(adapter.analyze(name) for name in fallback))
+        for name, res in zip(fallback, single):
+            results[name] = res
+            if res.get("report"):
+                fallback_reports.append(res.pop("report"))
+
+    report = _report(len(chunks), failed, len(probes) * len(brand_names), answered, usage, started, adapter)
+    for extra in fallback_reports:
+        for key in ("calls", "failed_calls", "probes_answered", "prompt_tokens", "completion_tokens"):
+            report[key] += extra.get(key, 0)
+        if "cost" in extra:
+            report["cost"] = round(report.get("cost", 0) + extra["cost"], 6)
+    report["fallback_brands"] = len(fallback)
+    return {"results": [results[name] for name in brand_names], "report": report}
+
+
+def combine(results: List[Dict[str, Any]], provider_weights: Dict[str, float] = None) -> Dict[str, Any]:
+    """Provider-weighted dimension scores and a summed cost/latency report across provider results."""
+    provider_weights = provider_weights or {}
+    dimensions = {}
+    for dimension in DIMENSIONS:
+        total = weight_sum = 0.0
+        for res in results:
+            score = (res.get("dimensions") or {}).get(dimension)
+            if "error" in res or score is None:
+                continue
+            weight = provider_weights.get(res.get("provider"), 1.0)
+            total += score * weight
+            weight_sum += weight
+        dimensions[dimension] = round(total / weight_sum, 1) if weight_sum else 0
+
+    reports = [res["report"] for res in results if res.get("report")]
+    report = {
+        key: sum(r.get(key, 0) for r in reports)
+        for key in ("calls", "failed_calls", "probes", "probes_answered", "prompt_tokens", "completion_tokens")
+    }
+    # Providers run in parallel, so the slowest one bounds the analysis
+    report["latency_ms"] = max((r.get("latency_ms", 0) for r in reports), default=0)
+    costs = [r["cost"] for r in reports if "cost" in r]
+    if costs:
+        report["cost"] = round(sum(costs), 6)
+    return {"dimensions": dimensions, "report": report}
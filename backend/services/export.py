@@ -0,0 +1,298 @@
+"""
+Bulk export of score history (geo_scores, model_comparisons) as CSV, NDJSON or Parquet.
+
+Rows are read from a server-side cursor (`yield_per`) EXPORT_BATCH_SIZE at a time as plain tuples,
+never as ORM objects, and each batch is encoded and sent before the next one is fetched, so memory
+stays flat however many rows are exported. Parquet needs pyarrow (optional); each batch becomes one
+row group. An export holds a database connection until the client has read it all, so at most
+EXPORT_MAX_CONCURRENT run per worker.
+"""
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, select
+
+from .. import models
+from ..database import AsyncSessionLocal
+from . import metrics
+from .rollups import as_utc
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "10000"))
+EXPORT_MAX_CONCURRENT = int(os.environ.get("EXPORT_MAX_CONCURRENT", "4"))
+
+DATASETS = {
+    "scores": models.GeoScore,
+    "models": models.ModelComparison,
+}
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+EXPORT_ROWS = metrics.registry.counter("export_rows_total", "Rows exported", ("dataset", "format"))
+EXPORTS = metrics.registry.counter("exports_total", "Exports by outcome (completed, cancelled, failed, rejected)", ("dataset", "format", "outcome"))
+
+
+class TooManyExports(Exception):
+    pass
+
+
+class ExportUnavailable(Exception):
+    """The requested format needs an optional dependency that isn't installed."""
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _value(value):
+    return as_utc(value) if isinstance(value, datetime) else value
+
+
+class CSVEncoder:
+    def __init__(self, columns: List[str]):
+        self.columns = columns
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+
+    def header(self) -> bytes:
+        self.writer.writerow(self.columns)
+        return self._take()
+
+    def encode(self, rows: Sequence[tuple]) -> bytes:
+        self.writer.writerows([[_csv_value(v) for v in row] for row in rows])
+        return self._take()
+
+    def close(self) -> bytes:
+        return b""
+
+    def _take(self) -> bytes:
+        data = self.buffer.getvalue().encode()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+
+def _csv_value(value):
+    value = _value(value)
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class NDJSONEncoder:
+    def __init__(self, columns: List[str]):
+        self.columns = columns
+
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, rows: Sequence[tuple]) -> bytes:
+        lines = (json.dumps(dict(zip(self.columns, map(_csv_value, row))), ensure_ascii=False) for row in rows)
+        return "".join(line + "\n" for line in lines).encode()
+
+    def close(self) -> bytes:
+        return b""
+
+
+class _ChunkSink:
+    """Write-only file for ParquetWriter that hands back whatever was written since the last take()."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+class ParquetEncoder:
+    def __init__(self, columns: List[str], types: List[Any]):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.schema = pa.schema([(name, _arrow_type(pa, column_type)) for name, column_type in zip(columns, types)])
+        self.sink = _ChunkSink()
+        # PythonFile counts bytes itself, so the footer's row group offsets are right although the sink forgets them
+        self.writer = pq.ParquetWriter(pa.PythonFile(self.sink, mode="w"), self.schema, compression="snappy")
+
+    def header(self) -> bytes:
+        return self.sink.take()
+
+    def encode(self, rows: Sequence[tuple]) -> bytes:
+        columns = list(zip(*rows))
+        arrays = [
+            self.pa.array([_value(v) for v in values], type=field.type)
+            for values, field in zip(columns, self.schema)
+        ]
+        self.writer.write_batch(self.pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        return self.sink.take()
+
+    def close(self) -> bytes:
+        self.writer.close()
+        return self.sink.take()
+
+
+def _arrow_type(pa, column_type):
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us", tz="UTC")
+    return pa.string()
+
+
+def export_query(model, brand_id: Optional[int], since: Optional[datetime], until: Optional[datetime]):
+    """Oldest-first rows of `model`, as plain column tuples."""
+    table = model.__table__
+    query = select(*table.columns)
+    if brand_id is not None:
+        # Walks the (brand_id, created_at, id) index in order, so there is nothing to sort
+        query = query.where(table.c.brand_id == brand_id).order_by(table.c.created_at, table.c.id)
+    else:
+        query = query.order_by(table.c.id)
+    if since:
+        query = query.where(table.c.created_at >= as_utc(since))
+    if until:
+        query = query.where(table.c.created_at < as_utc(until))
+    return query
+
+
+class _Slot:
+    """One of the exporter's concurrency slots, given back exactly once."""
+
+    def __init__(self, exporter: "Exporter"):
+        self.exporter = exporter
+        self.held = True
+
+    def release(self):
+        if self.held:
+            self.held = False
+            self.exporter.active -= 1
+
+
+class ExportStream:
+    """
+    Byte stream of an admitted export. Its slot is taken by Exporter.open and given back when the
+    stream ends or is closed, or when it is dropped unread: a generator that never started never
+    runs its finally.
+    """
+
+    def __init__(self, slot: _Slot, body: AsyncIterator[bytes]):
+        self._slot = slot
+        self._body = body
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> bytes:
+        return await self._body.__anext__()
+
+    async def aclose(self):
+        try:
+            await self._body.aclose()
+        finally:
+            self._slot.release()
+
+    def __del__(self):
+        self._slot.release()
+
+
+class Exporter:
+    def __init__(self, session_factory=AsyncSessionLocal, batch_size: int = 10000, max_concurrent: int = 4):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.max_concurrent = max_concurrent
+        self.active = 0
+        self.rows = 0
+
+    def open(
+        self,
+        dataset: str,
+        format: str,
+        brand_id: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> ExportStream:
+        """
+        Check the request, reserve a slot and return the byte stream. Raises ValueError for an unknown dataset or
+        format, ExportUnavailable when Parquet is asked for without pyarrow, TooManyExports when full.
+        """
+        if dataset not in DATASETS:
+            raise ValueError(f"dataset must be one of {', '.join(DATASETS)}")
+        if format not in MEDIA_TYPES:
+            raise ValueError(f"format must be one of {', '.join(MEDIA_TYPES)}")
+        if format == "parquet" and not parquet_available():
+            raise ExportUnavailable("Parquet export needs pyarrow: pip install pyarrow")
+        if self.active >= self.max_concurrent:
+            EXPORTS.inc(dataset=dataset, format=format, outcome="rejected")
+            raise TooManyExports("Too many exports running; try again shortly")
+        # Taken before returning, so requests arriving before this response starts streaming see it
+        self.active += 1
+        slot = _Slot(self)
+        return ExportStream(slot, self._stream(dataset, format, export_query(DATASETS[dataset], brand_id, since, until), slot))
+
+    async def _stream(self, dataset: str, format: str, query, slot: _Slot) -> AsyncIterator[bytes]:
+        model = DATASETS[dataset]
+        columns = [c.name for c in model.__table__.columns]
+        outcome = "failed"
+        try:
+            if format == "csv":
+                encoder = CSVEncoder(columns)
+            elif format == "ndjson":
+                encoder = NDJSONEncoder(columns)
+            else:
+                encoder = ParquetEncoder(columns, [c.type for c in model.__table__.columns])
+            yield encoder.header()
+            async with self.session_factory() as db:
+                result = await db.stream(query.execution_options(yield_per=self.batch_size))
+                async for rows in result.partitions():
+                    EXPORT_ROWS.inc(len(rows), dataset=dataset, format=format)
+                    self.rows += len(rows)
+                    yield encoder.encode(rows)
+            yield encoder.close()
+            outcome = "completed"
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            raise
+        except Exception:
+            # Headers are already sent, so the client sees a truncated body
+            logger.exception("%s export of %s failed", format, dataset)
+            raise
+        finally:
+            slot.release()
+            EXPORTS.inc(dataset=dataset, format=format, outcome=outcome)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"active": self.active, "rows": self.rows, "parquet": parquet_available()}
+
+
+exporter = Exporter(batch_size=EXPORT_BATCH_SIZE, max_concurrent=EXPORT_MAX_CONCURRENT)
@@ -0,0 +1,177 @@
+import logging
+import os
+from typing import Dict
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def _env(provider: str, name: str, default):
+    """
+    Read a pool setting for a provider.
+    DEEPSEEK_HTTP_MAX_CONNECTIONS wins over HTTP_MAX_CONNECTIONS, which wins over the default.
+    """
+    value = os.environ.get(f"{provider.upper()}_HTTP_{name}", os.environ.get(f"HTTP_{name}"))
+    if value is None:
+        return default
+    if isinstance(default, bool):
+        return value.lower() in ("1", "true", "yes", "on")
+    return type(default)(value)
+
+
+class PoolSettings:
+    def __init__(self, provider: str):
+        self.max_connections = _env(provider, "MAX_CONNECTIONS", 20)
+        self.max_keepalive = _env(provider, "MAX_KEEPALIVE", 10)
+        self.keepalive_expiry = _env(provider, "KEEPALIVE_EXPIRY", 30.0)
+        self.http2 = _env(provider, "HTTP2", False)
+        self.timeout = _env(provider, "TIMEOUT", 30.0)
+        self.connect_timeout = _env(provider, "CONNECT_TIMEOUT", 5.0)
+        self.pool_timeout = _env(provider, "POOL_TIMEOUT", 5.0)
+
+
+class PoolStats:
+    def __init__(self, max_connections: int):
+        self.max_connections = max_connections
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.saturated = 0  # requests that arrived with every connection busy
+        self.pool_timeouts = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "max_connections": self.max_connections,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "requests": self.requests,
+            "saturated": self.saturated,
+            "pool_timeouts": self.pool_timeouts,
+        }
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Keeps a request counted as in flight until its body has been read or closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._closed:
+                self._closed = True
+                self._on_close()
+
+
+class _InstrumentedTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport, stats: PoolStats):
+        self._transport = transport
+        self._stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        stats = self._stats
+        stats.requests += 1
+        if stats.in_flight >= stats.max_connections:
+            stats.saturated += 1
+        stats.in_flight += 1
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+
+        def release():
+            stats.in_flight -= 1
+
+        try:
+            response = await self._transport.handle_async_request(request)
+        except httpx.PoolTimeout:
+            stats.pool_timeouts += 1
+            release()
+            raise
+        except BaseException:
+            release()
+            raise
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_TrackedStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def _h2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class HTTPClientPool:
+    """
+    One long-lived httpx.AsyncClient per AI provider, shared by every adapter call.
+    The FastAPI app opens it on startup and closes it on shutdown; clients are also
+    created lazily so scripts can use adapters without going through the app.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, PoolStats] = {}
+
+    def _create(self, provider: str) -> httpx.AsyncClient:
+        settings = PoolSettings(provider)
+        http2 = settings.http2
+        if http2 and not _h2_available():
+            logger.warning("HTTP/2 requested for %s but the 'h2' package is not installed; using HTTP/1.1", provider)
+            http2 = False
+
+        limits = httpx.Limits(
+            max_connections=settings.max_connections,
+            max_keepalive_connections=settings.max_keepalive,
+            keepalive_expiry=settings.keepalive_expiry,
+        )
+        timeout = httpx.Timeout(
+            settings.timeout,
+            connect=settings.connect_timeout,
+            pool=settings.pool_timeout,
+        )
+        stats = PoolStats(settings.max_connections)
+        transport = httpx.AsyncHTTPTransport(limits=limits, http2=http2)
+        self._stats[provider] = stats
+        return httpx.AsyncClient(
+            transport=_InstrumentedTransport(transport, stats),
+            timeout=timeout,
+        )
+
+    def get(self, provider: str) -> httpx.AsyncClient:
+        provider = provider.lower()
+        client = self._clients.get(provider)
+        if client is None or client.is_closed:
+            client = self._create(provider)
+            self._clients[provider] = client
+        return client
+
+    def open(self, *providers: str):
+        for provider in providers:
+            self.get(provider)
+
+    async def aclose(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {provider: stats.as_dict() for provider, stats in self._stats.items()}
+
+
+http_pool = HTTPClientPool()
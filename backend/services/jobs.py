@@ -0,0 +1,331 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+
+from .. import crud, models
+from ..database import AsyncSessionLocal
+from . import analysis, batch
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+TERMINAL_STATUSES = (SUCCEEDED, FAILED)
+
+
+class QueueFull(Exception):
+    pass
+
+
+def job_to_dict(job: models.AnalysisJob) -> Dict[str, Any]:
+    data = {
+        "job_id": job.id,
+        "kind": job.kind,
+        "brand": job.brand,
+        "status": job.status,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+    if job.kind == "batch":
+        data["progress"] = {
+            "total": job.progress_total,
+            "completed": job.progress_completed,
+            "failed": job.progress_failed,
+        }
+    return data
+
+
+class JobQueue:
+    """
+    Runs brand analyses in the background on a fixed pool of asyncio workers.
+
+    The analysis_jobs table is the source of truth: jobs are claimed with a conditional
+    UPDATE so several gunicorn workers can share the table, and queued or stale running
+    jobs are picked up again after a restart. The in-memory queue only wakes local
+    workers up early; idle workers also poll the table for jobs submitted elsewhere and
+    requeue jobs whose worker died. Running jobs refresh their heartbeat so they never look dead.
+    """
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        workers: int = 2,
+        max_pending: int = 100,
+        poll_interval: float = 2.0,
+        stale_after: float = 300.0,
+        max_attempts: int = 3,
+    ):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._tasks = []
+        self._changed = asyncio.Condition()
+        self.heartbeat_interval = stale_after / 3
+        self._next_sweep = 0.0
+
+    async def start(self):
+        await self._requeue_stale()
+        self._next_sweep = time.monotonic() + self.heartbeat_interval
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # --- Public API ---
+
+    async def submit(self, brand: str, refresh: bool = False, providers: Optional[List[str]] = None) -> Dict[str, Any]:
+        options = {key: value for key, value in (("refresh", refresh), ("providers", providers)) if value}
+        job = await self._create(brand, options=options or None)
+        self._queue.put_nowait(job["job_id"])
+        return job
+
+    async def submit_batch(self, brands: List[str]) -> Dict[str, Any]:
+        job = await self._create(None, "batch", brands)
+        self._queue.put_nowait(job["job_id"])
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self._load(job_id)
+
+    async def wait_for_change(self, timeout: float):
+        # Woken by local job updates; callers re-read the table afterwards,
+        # so jobs run by another worker are still seen within `timeout`.
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": len(self._tasks), "local_queue": self._queue.qsize()}
+
+    # --- Workers ---
+
+    async def _worker(self, index: int):
+        while True:
+            try:
+                job_id = await asyncio.wait_for(self._queue.get(), self.poll_interval)
+            except asyncio.TimeoutError:
+                job_id = None
+
+            try:
+                if job_id is None and time.monotonic() >= self._next_sweep:
+                    # Any idle worker may sweep; the conditional UPDATE keeps concurrent sweeps harmless
+                    self._next_sweep = time.monotonic() + self.heartbeat_interval
+                    await self._requeue_stale()
+                job = await self._claim(job_id)
+                if job is not None:
+                    await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job worker %s crashed while claiming a job", index)
+
+    async def _run(self, job: Dict[str, Any]):
+        await self._notify()
+        heartbeat = asyncio.create_task(self._heartbeat(job["job_id"]))
+        try:
+            await self._execute(job)
+        finally:
+            heartbeat.cancel()
+        await self._notify()
+
+    async def _execute(self, job: Dict[str, Any]):
+        try:
+            if job["kind"] == "batch":
+                await self._run_batch(job)
+            else:
+                options = await self._load_payload(job["job_id"]) or {}
+                result = await analysis.analyze_brand_across_models(
+                    job["brand"], refresh=options.get("refresh", False), providers=options.get("providers")
+                )
+                if not analysis.has_valid_result(result):
+                    # Don't save an all-providers-failed analysis as a score of 0
+                    errors = [f"{m.get('provider')}: {m['error']}" for m in (result or {}).get("model_breakdown", []) if "error" in m]
+                    raise RuntimeError("; ".join(errors) or "No provider returned a result")
+                await self._complete(job["job_id"], job["brand"], result)
+        except asyncio.CancelledError:
+            # Shutting down: leave the job running so a sweep requeues it once its heartbeat is stale
+            raise
+        except Exception as e:
+            logger.exception("Analysis job %s failed", job["job_id"])
+            await self._fail(job["job_id"], str(e))
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(
+                        update(models.AnalysisJob)
+                        .where(models.AnalysisJob.id == job_id, models.AnalysisJob.status == RUNNING)
+                        .values(heartbeat_at=datetime.now(timezone.utc))
+                    )
+                    await db.commit()
+            except Exception:
+                logger.exception("Couldn't refresh the heartbeat of analysis job %s", job_id)
+
+    async def _run_batch(self, job: Dict[str, Any]):
+        job_id = job["job_id"]
+        brands = await self._load_payload(job_id) or []
+        # A job requeued after a restart carries the outcomes saved with its last chunk
+        done = job["result"] if isinstance(job.get("result"), list) else None
+
+        async def on_chunk(results, progress, outcomes):
+            await self._save_chunk(job_id, results, progress.as_dict(), outcomes)
+            await self._notify()
+
+        outcomes = await batch.run_batch(brands, on_chunk, done=done)
+        await self._finish_batch(job_id, outcomes)
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    # --- DB helpers (AsyncSession, so job bookkeeping never blocks the event loop) ---
+
+    async def _create(
+        self,
+        brand: Optional[str],
+        kind: str = "analyze",
+        brands: Optional[List[str]] = None,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        async with self.session_factory() as db:
+            pending = await db.scalar(
+                select(func.count()).select_from(models.AnalysisJob)
+                .where(models.AnalysisJob.status.in_([QUEUED, RUNNING]))
+            )
+            if pending >= self.max_pending:
+                raise QueueFull(f"{pending} analysis jobs are already pending")
+            job = models.AnalysisJob(id=uuid.uuid4().hex, kind=kind, brand=brand, status=QUEUED, attempts=0)
+            if brands is not None:
+                job.payload = json.dumps(brands, ensure_ascii=False)
+                job.progress_total = len(brands)
+                job.progress_completed = 0
+                job.progress_failed = 0
+            elif options:
+                job.payload = json.dumps(options)
+            db.add(job)
+            await db.commit()
+            await db.refresh(job)
+            return job_to_dict(job)
+
+    async def _load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        async with self.session_factory() as db:
+            job = await db.get(models.AnalysisJob, job_id)
+            return job_to_dict(job) if job else None
+
+    async def _claim(self, job_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        async with self.session_factory() as db:
+            if job_id is None:
+                job_id = await db.scalar(
+                    select(models.AnalysisJob.id)
+                    .where(models.AnalysisJob.status == QUEUED)
+                    .order_by(models.AnalysisJob.created_at.asc())
+                    .limit(1)
+                )
+                if job_id is None:
+                    return None
+
+            now = datetime.now(timezone.utc)
+            claimed = await db.execute(
+                update(models.AnalysisJob)
+                .where(models.AnalysisJob.id == job_id, models.AnalysisJob.status == QUEUED)
+                .values(status=RUNNING, started_at=now, heartbeat_at=now, attempts=models.AnalysisJob.attempts + 1)
+            )
+            await db.commit()
+            if not claimed.rowcount:
+                # Another worker got there first
+                return None
+            return job_to_dict(await db.get(models.AnalysisJob, job_id))
+
+    async def _complete(self, job_id: str, brand: str, result: dict):
+        async with self.session_factory() as db:
+            await db.run_sync(crud.save_analyses, [(brand, result)], False)
+            job = await db.get(models.AnalysisJob, job_id)
+            job.status = SUCCEEDED
+            job.result = json.dumps(result, ensure_ascii=False)
+            job.finished_at = datetime.now(timezone.utc)
+            await db.commit()
+
+    async def _load_payload(self, job_id: str) -> Any:
+        async with self.session_factory() as db:
+            job = await db.get(models.AnalysisJob, job_id)
+            return json.loads(job.payload) if job.payload else None
+
+    async def _save_chunk(self, job_id: str, results: List[Tuple[str, dict]], progress: Dict[str, int], outcomes: List[dict]):
+        # Analyses, the progress and the outcomes that cover them commit together, so a restart resumes exactly
+        async with self.session_factory() as db:
+            await db.run_sync(crud.save_analyses, results, False)
+            job = await db.get(models.AnalysisJob, job_id)
+            job.result = json.dumps(outcomes, ensure_ascii=False)
+            job.progress_completed = progress["completed"]
+            job.progress_failed = progress["failed"]
+            job.heartbeat_at = datetime.now(timezone.utc)
+            await db.commit()
+
+    async def _finish_batch(self, job_id: str, outcomes: List[dict]):
+        async with self.session_factory() as db:
+            job = await db.get(models.AnalysisJob, job_id)
+            job.status = SUCCEEDED
+            job.result = json.dumps(outcomes, ensure_ascii=False)
+            job.finished_at = datetime.now(timezone.utc)
+            await db.commit()
+
+    async def _fail(self, job_id: str, error: str):
+        async with self.session_factory() as db:
+            job = await db.get(models.AnalysisJob, job_id)
+            job.status = FAILED
+            job.error = error
+            job.finished_at = datetime.now(timezone.utc)
+            await db.commit()
+
+    async def _requeue_stale(self):
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.stale_after)
+        stale = (models.AnalysisJob.status == RUNNING, models.AnalysisJob.heartbeat_at < cutoff)
+        async with self.session_factory() as db:
+            requeued = await db.execute(
+                update(models.AnalysisJob)
+                .where(*stale, models.AnalysisJob.attempts < self.max_attempts)
+                .values(status=QUEUED)
+            )
+            abandoned = await db.execute(
+                update(models.AnalysisJob)
+                .where(*stale)
+                .values(
+                    status=FAILED,
+                    error="Worker stopped too many times while running this job",
+                    finished_at=datetime.now(timezone.utc),
+                )
+            )
+            await db.commit()
+        if requeued.rowcount or abandoned.rowcount:
+            logger.info("Requeued %s stale analysis jobs, abandoned %s", requeued.rowcount, abandoned.rowcount)
+
+
+job_queue = JobQueue(
+    workers=int(os.environ.get("ANALYSIS_JOB_WORKERS", "2")),
+    max_pending=int(os.environ.get("ANALYSIS_JOB_MAX_PENDING", "100")),
+    stale_after=float(os.environ.get("ANALYSIS_JOB_STALE_AFTER", "300")),
+)
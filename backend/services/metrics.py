@@ -0,0 +1,288 @@
+"""
+In-process metrics in the Prometheus text exposition format, served at GET /metrics.
+
+Counters and histograms are updated from the request middleware, the provider adapters and
+SQLAlchemy engine events; point-in-time values (pool usage, cache hit counts, breaker state) are
+read from the existing stats() methods at scrape time through collectors.
+
+Metrics are per process: under gunicorn every worker keeps its own, so scrape each worker (or
+run one worker per container) rather than a load-balanced address.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SLOW_QUERY_SECONDS = float(os.environ.get("DB_SLOW_QUERY_MS", "500")) / 1000
+
+Labels = Tuple[str, ...]
+Sample = Tuple[Dict[str, str], float]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # Updated from the event loop and from threadpool routes (DB events), so guard writes
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Labels:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: Labels, **extra) -> Dict[str, str]:
+        return {**dict(zip(self.labelnames, key)), **extra}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, self._labels(key), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # label key -> [count per bucket..., sum, count]
+        self._values: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                yield f"{self.name}_bucket", self._labels(key, le=_format_value(bound)), cumulative
+            yield f"{self.name}_bucket", self._labels(key, le="+Inf"), state[-1]
+            yield f"{self.name}_sum", self._labels(key), state[-2]
+            yield f"{self.name}_count", self._labels(key), state[-1]
+
+
+class _Collected(_Metric):
+    """A gauge whose samples come from a callback at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, collect: Callable[[], Iterable[Sample]]):
+        super().__init__(name, help)
+        self.collect = collect
+
+    def samples(self):
+        for labels, value in self.collect():
+            yield self.name, labels, value
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def collector(self, name: str, help: str, collect: Callable[[], Iterable[Sample]]):
+        self._register(_Collected(name, help, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                # One broken collector shouldn't take the whole scrape down
+                logger.exception("Failed to render metric %s", metric.name)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte", ("method", "route", "status")
+)
+HTTP_REQUESTS_IN_PROGRESS = registry.gauge("http_requests_in_progress", "Requests currently being served", ("method",))
+
+PROVIDER_CALL_SECONDS = registry.histogram(
+    "provider_call_duration_seconds", "Provider API call latency, including retries and throttling", ("provider",)
+)
+PROVIDER_CALLS = registry.counter(
+    "provider_calls_total", "Provider API calls by outcome (ok, error, timeout, rejected, cancelled)", ("provider", "outcome")
+)
+PROVIDER_TOKENS = registry.counter(
+    "provider_tokens_total", "Tokens reported in provider usage fields", ("provider", "type")
+)
+
+DB_QUERY_SECONDS = registry.histogram(
+    "db_query_duration_seconds", "SQL statement execution time", ("engine", "operation", "table"), buckets=DB_BUCKETS
+)
+DB_QUERY_ERRORS = registry.counter("db_query_errors_total", "SQL statements that raised", ("engine", "operation", "table"))
+
+
+def record_provider_call(provider: str, seconds: float, outcome: str, usage: Optional[dict] = None):
+    PROVIDER_CALL_SECONDS.observe(seconds, provider=provider)
+    PROVIDER_CALLS.inc(provider=provider, outcome=outcome)
+    for field in ("prompt_tokens", "completion_tokens"):
+        tokens = (usage or {}).get(field)
+        if tokens:
+            PROVIDER_TOKENS.inc(tokens, provider=provider, type=field[:-len("_tokens")])
+
+
+# --- HTTP middleware ---
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (BaseHTTPMiddleware would buffer streaming responses).
+    Labels requests with the matched route template, so /api/analyze/{job_id} is one series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        start = time.perf_counter()
+        status = 500
+        HTTP_REQUESTS_IN_PROGRESS.inc(method=method)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.dec(method=method)
+            # The router stores the matched route in the shared scope; unmatched paths share one label
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=method,
+                route=getattr(route, "path", "unmatched"),
+                status=status,
+            )
+
+
+# --- SQLAlchemy ---
+
+_OPERATION = re.compile(r"^\s*(\w+)")
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+\"?(\w+)", re.IGNORECASE)
+
+
+def _statement_labels(statement: str) -> Tuple[str, str]:
+    operation = _OPERATION.match(statement)
+    table = _TABLE.search(statement)
+    return (operation.group(1).upper() if operation else "OTHER"), (table.group(1) if table else "")
+
+
+def instrument_engine(engine: Engine, name: str):
+    """Time every statement run on `engine` (pass async_engine.sync_engine for the async engine)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_query_start"].pop()
+        operation, table = _statement_labels(statement)
+        DB_QUERY_SECONDS.observe(elapsed, engine=name, operation=operation, table=table)
+        if elapsed >= SLOW_QUERY_SECONDS:
+            logger.warning("Slow query (%.0f ms): %s", elapsed * 1000, statement[:500])
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        starts = context.connection.info.get("metrics_query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+        operation, table = _statement_labels(context.statement or "")
+        DB_QUERY_ERRORS.inc(engine=name, operation=operation, table=table)
@@ -1,9 +1,110 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import AsyncIterator, Dict, Any, List, Optional
+import json
+import asyncio
+import time
+import httpx
+from .. import metrics
+from ..http_client import http_pool
+from ..response_cache import response_cache, response_cache_key
+from .resilience import CircuitOpenError, ProviderPolicy, get_policy
 
 class BaseAIAdapter(ABC):
-    def __init__(self, api_key: str):
+    # Key used for the shared HTTP pool and per-provider settings (e.g. DEEPSEEK_HTTP_MAX_CONNECTIONS)
+    provider = "base"
+    # Display name reported in results, e.g. "DeepSeek"
+    name = "Base"
+
+    def __init__(self, api_key: str, client: Optional[httpx.AsyncClient] = None):
         self.api_key = api_key
+        self._client = client
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Adapters never own their client: fall back to the app-wide pool when none was passed in
+        return self._client or http_pool.get(self.provider)
+
+    @property
+    def policy(self) -> ProviderPolicy:
+        # Shared by every instance of the provider so limits hold across concurrent requests
+        return get_policy(self.provider)
+
+    async def post_json(self, url: str, payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+        """
+        POST to the provider under its rate limit, concurrency cap, retry and circuit breaker policy.
+        Raises on failure so callers can report the error instead of a fake score.
+        Identical requests are answered from the shared provider response cache.
+        """
+        key = response_cache_key(self.provider, url, payload)
+        cached = await response_cache.get(key, self.provider)
+        if cached is not None:
+            return cached
+
+        start = time.perf_counter()
+        outcome = "error"
+        data = None
+        try:
+            response = await self.policy.call(lambda: self.client.post(url, json=payload, headers=headers))
+            data = response.json()
+            outcome = "ok"
+        except httpx.TimeoutException:
+            outcome = "timeout"
+            raise
+        except CircuitOpenError:
+            outcome = "rejected"
+            raise
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            usage = data.get("usage") if isinstance(data, dict) else None
+            metrics.record_provider_call(self.provider, time.perf_counter() - start, outcome, usage)
+        await response_cache.set(key, self.provider, payload.get("model"), data)
+        return data
+
+    async def post_stream(self, url: str, payload: Dict[str, Any], headers: Dict[str, str]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        POST a `"stream": true` request and yield each server-sent `data:` chunk, parsed.
+        Opening the stream goes through the provider policy (an error status is retried like
+        post_json); once tokens flow, failures are raised to the caller. Closing the generator
+        closes the connection, so the provider stops generating. Never cached.
+        """
+        async def open_stream():
+            response = await self.client.send(self.client.build_request("POST", url, json=payload, headers=headers), stream=True)
+            if response.is_error:
+                # Read the error body so the connection goes back to the pool before a retry
+                await response.aread()
+            return response
+
+        start = time.perf_counter()
+        outcome = "error"
+        usage = None
+        response = None
+        try:
+            response = await self.policy.call(open_stream)
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                usage = chunk.get("usage") or usage
+                yield chunk
+            outcome = "ok"
+        except httpx.TimeoutException:
+            outcome = "timeout"
+            raise
+        except CircuitOpenError:
+            outcome = "rejected"
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            raise
+        finally:
+            if response is not None:
+                await response.aclose()
+            metrics.record_provider_call(self.provider, time.perf_counter() - start, outcome, usage)
 
     @abstractmethod
     async def analyze(self, brand_name: str) -> Dict[str, Any]:
@@ -15,3 +116,17 @@ class BaseAIAdapter(ABC):
         - sentiment: str
         """
         pass
+
+    async def analyze_many(self, brand_names: List[str]) -> Dict[str, Any]:
+        """
+        Analyze several brands. Returns {"results": [one analyze() result per brand, in order],
+        "report": {...}} with the calls and tokens of the whole comparison.
+        This default makes one analysis per brand; adapters that can should share calls between brands.
+        """
+        results = list(await asyncio.gather(*(self.analyze(name) for name in brand_names)))
+        report: Dict[str, Any] = {}
+        for res in results:
+            for key, value in (res.pop("report", None) or {}).items():
+                # Brands run in parallel, so the slowest one bounds the latency
+                report[key] = max(report.get(key, 0), value) if key == "latency_ms" else report.get(key, 0) + value
+        return {"results": results, "report": report}
@@ -1,26 +1,20 @@
-import httpx
-import json
-from .base import BaseAIAdapter
+from .openai_compatible import OpenAICompatibleAdapter
 
-class DoubaoAdapter(BaseAIAdapter):
-    def __init__(self, api_key: str, endpoint_id: str = None):
-        super().__init__(api_key)
-        self.endpoint_id = endpoint_id # Doubao needs an endpoint ID
+class DoubaoAdapter(OpenAICompatibleAdapter):
+    """
+    Doubao through Volcengine Ark's OpenAI-compatible API. Ark addresses a deployed model
+    by its inference endpoint ID (ep-...), which is passed as the model name.
+    """
+    provider = "doubao"
+    name = "Doubao"
+    region = "china"
+    default_base_url = "https://ark.cn-beijing.volces.com/api/v3"
 
-    async def analyze(self, brand_name: str):
-        if not self.api_key:
-            return {"error": "Doubao API Key missing", "score": 0}
+    def __init__(self, api_key: str, endpoint_id: str = None, base_url: str = None, client=None):
+        super().__init__(api_key, base_url=base_url, model=endpoint_id, client=client)
+        self.endpoint_id = endpoint_id # Doubao needs an endpoint ID
 
-        # Mocking Doubao API call structure (Volcengine is complex, usually needs SDK)
-        # For this demo, we'll use a generic HTTP structure compatible with OpenAI-like endpoints 
-        # if using the 'Ark' compatible API, otherwise we'd need the 'volcengine' SDK.
-        # Assuming Ark (OpenAI compatible) for simplicity in this 'universal' adapter approach.
-        
-        # Real implementation would use: from volcenginesdkarkruntime import Ark
-        
-        return {
-            "provider": "Doubao",
-            "score": 75, # Mock score for now as we don't have real Doubao credentials
-            "summary": "Doubao analysis simulation.",
-            "sentiment": "neutral"
-        }
+    def missing_config(self):
+        if self.api_key and not self.endpoint_id:
+            return "Doubao endpoint ID missing"
+        return super().missing_config()
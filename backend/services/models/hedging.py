@@ -0,0 +1,69 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from .. import metrics
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_HEDGES = metrics.registry.counter(
+    "provider_hedges_total", "Hedged provider requests by which side answered (primary, backup, none)", ("provider", "winner")
+)
+
+
+class LatencyTracker:
+    """Rolling window of recent successful call latencies, in seconds."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """None until there are enough samples to trust the estimate."""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def hedged(
+    provider: str,
+    primary: Callable[[], Awaitable[Any]],
+    backup: Callable[[], Awaitable[Any]],
+    delay: float,
+) -> Tuple[Any, str]:
+    """
+    Run `primary`; if it hasn't finished after `delay` seconds, also start `backup`.
+    Returns (result, "primary" | "backup") from whichever succeeds first and cancels the other.
+    A failure on one side waits for the other; if both fail the primary's error is raised.
+    """
+    first = asyncio.ensure_future(primary())
+    try:
+        done, _ = await asyncio.wait({first}, timeout=delay)
+    except asyncio.CancelledError:
+        first.cancel()
+        raise
+    if done and not first.exception():
+        return first.result(), "primary"
+
+    # Primary is slow (or already failed): race the backup against it
+    second = asyncio.ensure_future(backup())
+    sides = {first: "primary", second: "backup"}
+    pending = set(sides)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    PROVIDER_HEDGES.inc(provider=provider, winner=sides[task])
+                    return task.result(), sides[task]
+                logger.info("%s hedge %s failed: %s", provider, sides[task], task.exception())
+    finally:
+        for task in sides:
+            task.cancel()
+    PROVIDER_HEDGES.inc(provider=provider, winner="none")
+    raise first.exception()
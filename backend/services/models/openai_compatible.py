@@ -0,0 +1,137 @@
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from .base import BaseAIAdapter
+from .hedging import LatencyTracker, hedged
+from .. import evaluation
+
+logger = logging.getLogger(__name__)
+
+class OpenAICompatibleAdapter(BaseAIAdapter):
+    """
+    Shared implementation for providers exposing an OpenAI-style /chat/completions endpoint
+    (DeepSeek, Volcengine Ark for Doubao, Kimi, Zhipu...). Point `base_url` at the mock
+    provider in backend/benchmarks to run without spending real quota.
+    """
+    default_base_url = ""
+    default_model = ""
+    # Send response_format=json_object; turn off for models that reject it
+    json_mode = True
+    region = "global"
+    # Share of this provider in the aggregate score
+    weight = 1.0
+    # Seconds to wait before hedging while there are too few samples for a p95
+    hedge_after = float(os.environ.get("PROVIDER_HEDGE_AFTER", "5"))
+    hedge_percentile = float(os.environ.get("PROVIDER_HEDGE_PERCENTILE", "95"))
+    # Price per 1000 prompt / completion tokens, for the cost report (None = unknown)
+    cost_per_1k_input: Optional[float] = None
+    cost_per_1k_output: Optional[float] = None
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, model: Optional[str] = None, client=None):
+        super().__init__(api_key, client=client)
+        self.base_url = (base_url or self.default_base_url).rstrip("/")
+        self.model = model or self.default_model
+        # Equivalent provider raced against this one when it is slower than usual (see registry)
+        self.backup: Optional["OpenAICompatibleAdapter"] = None
+        self.latency = LatencyTracker()
+
+    def missing_config(self) -> Optional[str]:
+        if not self.api_key:
+            return f"{self.name} API Key missing"
+        return None
+
+    def estimate_cost(self, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+        if self.cost_per_1k_input is None and self.cost_per_1k_output is None:
+            return None
+        return round(
+            prompt_tokens / 1000 * (self.cost_per_1k_input or 0) + completion_tokens / 1000 * (self.cost_per_1k_output or 0), 6
+        )
+
+    async def chat_json(self, prompt: str, usage: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        """Send one user prompt and return the model's reply parsed as JSON. Token counts are added to `usage`."""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+        if self.json_mode:
+            payload["response_format"] = {"type": "json_object"}
+
+        # Timeouts come from the pooled client (<PROVIDER>_HTTP_TIMEOUT), retries from the provider policy
+        start = time.perf_counter()
+        data = await self.post_json(f"{self.base_url}/chat/completions", payload, headers)
+        if usage is not None:
+            for field in ("prompt_tokens", "completion_tokens"):
+                usage[field] = usage.get(field, 0) + ((data.get("usage") or {}).get(field) or 0)
+        content = json.loads(data["choices"][0]["message"]["content"])
+        self.latency.record(time.perf_counter() - start)
+        return content
+
+    async def stream_chat(
+        self, messages: List[Dict[str, str]], usage: Optional[Dict[str, int]] = None, max_tokens: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """Yield the reply's text as the provider streams it. Token counts (sent with the last chunk) are added to `usage`."""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+        if max_tokens:
+            payload["max_tokens"] = max_tokens
+        async for chunk in self.post_stream(f"{self.base_url}/chat/completions", payload, headers):
+            if usage is not None and chunk.get("usage"):
+                for field in ("prompt_tokens", "completion_tokens"):
+                    usage[field] = usage.get(field, 0) + (chunk["usage"].get(field) or 0)
+            for choice in chunk.get("choices") or []:
+                text = (choice.get("delta") or {}).get("content")
+                if text:
+                    yield text
+
+    def hedge_delay(self) -> float:
+        return self.latency.percentile(self.hedge_percentile) or self.hedge_after
+
+    async def ask(self, prompt: str, usage: Optional[Dict[str, int]] = None) -> Tuple[Dict[str, Any], str]:
+        """
+        chat_json, raced against the backup provider once this one runs past its p95 latency.
+        Returns the parsed reply and the name of the provider that produced it.
+        """
+        if self.backup is None or self.backup.missing_config():
+            return await self.chat_json(prompt, usage), self.name
+        content, winner = await hedged(
+            self.provider,
+            lambda: self.chat_json(prompt, usage),
+            lambda: self.backup.chat_json(prompt, usage),
+            self.hedge_delay(),
+        )
+        return content, self.name if winner == "primary" else self.backup.name
+
+    async def analyze(self, brand_name: str):
+        problem = self.missing_config()
+        if problem:
+            return {"provider": self.name, "region": self.region, "error": problem, "score": 0}
+
+        try:
+            return await evaluation.evaluate(self, brand_name)
+        except Exception as e:
+            logger.warning("%s analysis of %r failed: %s", self.name, brand_name, e)
+            return {"provider": self.name, "region": self.region, "error": str(e), "score": 0}
+
+    async def analyze_many(self, brand_names: List[str]):
+        """Several brands per prompt (see evaluation.evaluate_many), falling back to analyze() per brand."""
+        problem = self.missing_config()
+        if problem:
+            return {
+                "results": [{"provider": self.name, "region": self.region, "error": problem, "score": 0} for _ in brand_names],
+                "report": {},
+            }
+        return await evaluation.evaluate_many(self, brand_names)
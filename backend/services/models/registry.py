@@ -0,0 +1,187 @@
+"""
+Provider registry: which AI providers a worker talks to, built once from configuration.
+
+Providers are declared as a JSON list in AI_PROVIDERS (or a file named by AI_PROVIDERS_FILE):
+
+    [
+      {"name": "DeepSeek", "type": "deepseek", "region": "global", "api_key_env": "DEEPSEEK_API_KEY"},
+      {"name": "Doubao", "type": "doubao", "region": "china", "model": "ep-...", "weight": 1.5,
+       "api_key_env": "DOUBAO_API_KEY", "hedge_with": "Doubao Backup"},
+      {"name": "Doubao Backup", "provider": "doubao_backup", "base_url": "https://...", "model": "...",
+       "api_key_env": "DOUBAO_BACKUP_API_KEY", "enabled": false}
+    ]
+
+Fields: name (display name, reported in results), type (deepseek, doubao or openai for any other
+OpenAI-compatible API), provider (key for the HTTP pool and rate-limit settings; defaults to the
+lower-cased name), region (china/global), base_url, model, api_key or api_key_env, weight (share
+in the aggregate score), enabled (false = only used as a hedge backup), hedge_with (name of the
+provider to race once this one is slower than its p95 latency), hedge_after (seconds to wait before
+hedging until enough latencies have been seen), cost_per_1k_input / cost_per_1k_output (token
+prices for the per-analysis cost report).
+
+Without AI_PROVIDERS the registry falls back to DeepSeek and Doubao configured from the
+DEEPSEEK_* / DOUBAO_* variables.
+"""
+import json
+import os
+import pathlib
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from .deepseek import DeepSeekAdapter
+from .doubao import DoubaoAdapter
+from .openai_compatible import OpenAICompatibleAdapter
+
+ADAPTER_TYPES = {
+    "deepseek": DeepSeekAdapter,
+    "doubao": DoubaoAdapter,
+    "openai": OpenAICompatibleAdapter,
+}
+
+
+class UnknownProvider(ValueError):
+    pass
+
+
+def default_specs() -> List[Dict[str, Any]]:
+    return [
+        {
+            "name": "DeepSeek",
+            "type": "deepseek",
+            "region": "global",
+            "api_key": os.environ.get("DEEPSEEK_API_KEY"),
+            "base_url": os.environ.get("DEEPSEEK_BASE_URL"),
+        },
+        {
+            "name": "Doubao",
+            "type": "doubao",
+            "region": "china",
+            "api_key": os.environ.get("DOUBAO_API_KEY"),
+            "model": os.environ.get("DOUBAO_ENDPOINT_ID"),
+            "base_url": os.environ.get("DOUBAO_BASE_URL"),
+        },
+        # Add Kimi, Zhipu through AI_PROVIDERS (type "openai")
+    ]
+
+
+def load_specs() -> List[Dict[str, Any]]:
+    raw = os.environ.get("AI_PROVIDERS")
+    path = os.environ.get("AI_PROVIDERS_FILE")
+    if path:
+        raw = pathlib.Path(path).read_text(encoding="utf-8")
+    if not raw:
+        return default_specs()
+    specs = json.loads(raw)
+    if not isinstance(specs, list):
+        raise ValueError("AI_PROVIDERS must be a JSON list of provider objects")
+    return specs
+
+
+def build_adapter(spec: Dict[str, Any]) -> OpenAICompatibleAdapter:
+    kind = spec.get("type", "openai")
+    cls = ADAPTER_TYPES.get(kind)
+    if cls is None:
+        raise ValueError(f"Unknown provider type {kind!r} for {spec.get('name')!r}")
+    api_key = spec.get("api_key") or (os.environ.get(spec["api_key_env"]) if spec.get("api_key_env") else None)
+    if cls is DoubaoAdapter:
+        adapter = cls(api_key, endpoint_id=spec.get("model"), base_url=spec.get("base_url"))
+    else:
+        adapter = cls(api_key, base_url=spec.get("base_url"), model=spec.get("model"))
+    # Per-instance overrides, so one adapter class can back several configured providers
+    if spec.get("name"):
+        adapter.name = spec["name"]
+    # Always per entry: two entries of one type must not share a pool, breaker, metrics or cache key
+    adapter.provider = re.sub(r"\W+", "_", (spec.get("provider") or adapter.name).strip()).lower()
+    adapter.region = spec.get("region", adapter.region)
+    adapter.weight = float(spec.get("weight", 1.0))
+    if "hedge_after" in spec:
+        adapter.hedge_after = float(spec["hedge_after"])
+    for field in ("cost_per_1k_input", "cost_per_1k_output"):
+        if spec.get(field) is not None:
+            setattr(adapter, field, float(spec[field]))
+    return adapter
+
+
+class ProviderRegistry:
+    def __init__(self, specs: Iterable[Dict[str, Any]]):
+        self.adapters: Dict[str, OpenAICompatibleAdapter] = {}
+        self.enabled: List[str] = []
+        specs = list(specs)
+        for spec in specs:
+            adapter = build_adapter(spec)
+            key = adapter.name.lower()
+            if key in self.adapters:
+                raise ValueError(f"Provider {adapter.name!r} is declared twice")
+            clash = next((a for a in self.adapters.values() if a.provider == adapter.provider), None)
+            if clash is not None:
+                raise ValueError(f"Providers {clash.name!r} and {adapter.name!r} both use provider key {adapter.provider!r}")
+            self.adapters[key] = adapter
+            if spec.get("enabled", True):
+                self.enabled.append(key)
+        for spec in specs:
+            if spec.get("hedge_with"):
+                backup = self.adapters.get(spec["hedge_with"].lower())
+                if backup is None:
+                    raise ValueError(f"{spec['name']!r} hedges with unknown provider {spec['hedge_with']!r}")
+                self.adapters[spec["name"].lower()].backup = backup
+
+    def select(self, names: Optional[Iterable[str]] = None) -> List[OpenAICompatibleAdapter]:
+        """The enabled providers, or the named ones (by display name or provider key) in the given order."""
+        if not names:
+            return [self.adapters[key] for key in self.enabled]
+        selected = []
+        for name in names:
+            adapter = self.find(name)
+            if adapter is None:
+                raise UnknownProvider(f"Unknown provider {name!r}; available: {', '.join(self.names())}")
+            if adapter not in selected:
+                selected.append(adapter)
+        return selected
+
+    def find(self, name: str) -> Optional[OpenAICompatibleAdapter]:
+        key = name.strip().lower()
+        if key in self.adapters:
+            return self.adapters[key]
+        return next((a for a in self.adapters.values() if a.provider == key), None)
+
+    def names(self) -> List[str]:
+        return [self.adapters[key].name for key in self.enabled]
+
+    def pool_keys(self) -> List[str]:
+        return sorted({adapter.provider for adapter in self.adapters.values()})
+
+    def weights(self) -> Dict[str, float]:
+        return {adapter.name: adapter.weight for adapter in self.adapters.values()}
+
+    def describe(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "name": adapter.name,
+                "provider": adapter.provider,
+                "region": adapter.region,
+                "model": adapter.model,
+                "weight": adapter.weight,
+                "enabled": key in self.enabled,
+                "configured": adapter.missing_config() is None,
+                "hedge_with": adapter.backup.name if adapter.backup else None,
+                "p95_ms": round(adapter.latency.percentile(95) * 1000) if adapter.latency.percentile(95) else None,
+            }
+            for key, adapter in self.adapters.items()
+        ]
+
+
+_registry: Optional[ProviderRegistry] = None
+
+
+def get_registry() -> ProviderRegistry:
+    # Built on first use rather than at import, so scripts can set the environment first
+    global _registry
+    if _registry is None:
+        _registry = ProviderRegistry(load_specs())
+    return _registry
+
+
+def reload_registry() -> ProviderRegistry:
+    global _registry
+    _registry = None
+    return get_registry()
@@ -0,0 +1,226 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose breaker is open."""
+
+
+def _env(provider: str, name: str, default):
+    value = os.environ.get(f"{provider.upper()}_{name}", os.environ.get(f"PROVIDER_{name}"))
+    return default if value is None else type(default)(value)
+
+
+class TokenBucket:
+    """`rate` requests per second with bursts of up to `capacity`. A rate of 0 disables limiting."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> float:
+        """Take one token, sleeping until one is available. Returns the time spent waiting."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failed calls and rejects calls for `cooldown` seconds.
+    After the cooldown one trial call is let through: success closes the breaker, failure reopens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def before_call(self):
+        state = self.state
+        if state == self.OPEN or (state == self.HALF_OPEN and self._trial_in_flight):
+            remaining = self.cooldown - (time.monotonic() - self.opened_at)
+            raise CircuitOpenError(f"circuit open, retry in {max(remaining, 0):.0f}s")
+        if state == self.HALF_OPEN:
+            self._trial_in_flight = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def release_trial(self):
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+def _is_caller_error(error: Exception) -> bool:
+    """4xx other than 429: the request or credentials are wrong, so it says nothing about provider health."""
+    return isinstance(error, httpx.HTTPStatusError) and 400 <= error.response.status_code < 500 and error.response.status_code != 429
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class ProviderPolicy:
+    """
+    Quota guard shared by every adapter instance of one provider: token-bucket rate limit,
+    concurrency cap, retries with jittered exponential backoff (honouring Retry-After) and
+    a circuit breaker. Configured from env, e.g. DEEPSEEK_RATE_LIMIT=2 or PROVIDER_MAX_RETRIES=5.
+    """
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.bucket = TokenBucket(_env(provider, "RATE_LIMIT", 0.0), _env(provider, "RATE_BURST", 5.0))
+        self.max_concurrency = _env(provider, "MAX_CONCURRENCY", 8)
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.max_retries = _env(provider, "MAX_RETRIES", 3)
+        self.backoff_base = _env(provider, "BACKOFF_BASE", 0.5)
+        self.backoff_max = _env(provider, "BACKOFF_MAX", 10.0)
+        self.max_retry_after = _env(provider, "MAX_RETRY_AFTER", 60.0)
+        self.breaker = CircuitBreaker(_env(provider, "BREAKER_THRESHOLD", 5), _env(provider, "BREAKER_COOLDOWN", 30.0))
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.failures = 0
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps a fleet of workers from retrying in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def call(self, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        """Run `send` under the policy and return a successful response, or raise."""
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self.rejected += 1
+            raise
+
+        attempt = 0
+        while True:
+            if await self.bucket.acquire() > 0:
+                self.throttled += 1
+            try:
+                async with self.semaphore:
+                    self.calls += 1
+                    response = await send()
+                response.raise_for_status()
+                self.breaker.record_success()
+                return response
+            except (httpx.HTTPStatusError, httpx.TransportError) as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    self.failures += 1
+                    if _is_caller_error(e):
+                        # The provider answered: a bad request or key is ours to fix, not an outage
+                        self.breaker.release_trial()
+                    else:
+                        self.breaker.record_failure()
+                    raise
+                attempt += 1
+                self.retries += 1
+                logger.info("%s call failed (%s), retry %s in %.1fs", self.provider, e, attempt, delay)
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                # Cancelled by a deadline or hedge, not the provider's fault
+                self.breaker.release_trial()
+                raise
+            except Exception:
+                self.failures += 1
+                self.breaker.record_failure()
+                raise
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        if attempt >= self.max_retries:
+            return None
+        if isinstance(error, httpx.HTTPStatusError):
+            if error.response.status_code not in RETRYABLE_STATUS:
+                return None
+            retry_after = retry_after_seconds(error.response)
+            if retry_after is not None:
+                # Don't hold a job slot for minutes on a quota reset; fail and let the breaker decide
+                return None if retry_after > self.max_retry_after else retry_after + random.uniform(0, self.backoff_base)
+        return self._backoff(attempt)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "breaker": self.breaker.state,
+            "calls": self.calls,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+            "failures": self.failures,
+            "max_concurrency": self.max_concurrency,
+        }
+
+
+_policies: Dict[str, ProviderPolicy] = {}
+
+
+def get_policy(provider: str) -> ProviderPolicy:
+    provider = provider.lower()
+    policy = _policies.get(provider)
+    if policy is None:
+        policy = _policies[provider] = ProviderPolicy(provider)
+    return policy
+
+
+def policy_stats() -> Dict[str, Dict[str, object]]:
+    return {provider: policy.stats() for provider, policy in _policies.items()}
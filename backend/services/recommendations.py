@@ -0,0 +1,377 @@
+"""
+Recommendations pipeline: from the suggestions in analysis replies to the dashboard's top list.
+
+Every provider result may carry `recommendations`. Each one is stored as a candidate together with
+a MinHash signature of its normalized text (character shingles, one-permutation hashing, computed
+once on insert). After each analysis commits, a worker thread merges the brand's candidates from
+the last RECOMMENDATION_WINDOW_DAYS into clusters of near-duplicates (LSH banding on the stored
+signatures, then an estimated Jaccard check against RECOMMENDATION_SIMILARITY), so the same advice
+from different providers and runs counts once. Clusters are ranked by priority times how often they were suggested, and the top
+RECOMMENDATION_TOP_N are written to the recommendations table, which the dashboard reads by
+(brand_id, rank). A provider's exact repeat of a stored candidate (such as a cached reply served
+again) is not stored twice, so it doesn't inflate the count.
+
+Rebuild every brand's list from its candidates with:  python -m backend.services.recommendations
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import operator
+import os
+import random
+import re
+import struct
+import threading
+import time
+import unicodedata
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import delete, event, insert, select
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import SessionLocal
+from . import snapshots
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATION_TOP_N = int(os.environ.get("RECOMMENDATION_TOP_N", "10"))
+RECOMMENDATION_WINDOW_DAYS = float(os.environ.get("RECOMMENDATION_WINDOW_DAYS", "30"))
+RECOMMENDATION_MAX_CANDIDATES = int(os.environ.get("RECOMMENDATION_MAX_CANDIDATES", "5000"))
+RECOMMENDATION_SIMILARITY = float(os.environ.get("RECOMMENDATION_SIMILARITY", "0.5"))
+
+TYPES = ("content", "schema", "authority")
+PRIORITY_WEIGHTS = {"high": 3, "medium": 2, "low": 1}
+
+# 64 hash values per signature, banded 3 at a time: pairs at 0.5 similarity share a band 94% of the time
+NUM_HASHES = 64
+_ROWS = 3
+BANDS = NUM_HASHES // _ROWS
+_EMPTY = 1 << 64
+_SIGNATURE = struct.Struct(f"<{NUM_HASHES}I")
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+_CJK = re.compile(r"[぀-ヿ㐀-鿿]")
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return _SPACES.sub(" ", _PUNCTUATION.sub(" ", text)).strip()
+
+
+def shingles(text: str) -> set:
+    # Chinese words are one to three characters, so shorter shingles still tell texts apart
+    size = 2 if _CJK.search(text) else 3
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def signature(text: str) -> bytes:
+    """
+    One-permutation MinHash: each shingle is hashed once into one of NUM_HASHES bins, keeping the
+    smallest value per bin. Empty bins borrow from the next filled bin, offset by the distance, so
+    two signatures agree on a bin with probability equal to the texts' shingle Jaccard similarity.
+    """
+    mins = [_EMPTY] * NUM_HASHES
+    for shingle in shingles(normalize_text(text)):
+        h = int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "little")
+        slot, value = h % NUM_HASHES, h // NUM_HASHES
+        if value < mins[slot]:
+            mins[slot] = value
+    if all(value == _EMPTY for value in mins):
+        return _SIGNATURE.pack(*([0] * NUM_HASHES))
+    values = []
+    for i in range(NUM_HASHES):
+        distance = 0
+        while mins[(i + distance) % NUM_HASHES] == _EMPTY:
+            distance += 1
+        values.append((mins[(i + distance) % NUM_HASHES] + distance * 0x9E3779B97F4A7C15) & 0xFFFFFFFF)
+    return _SIGNATURE.pack(*values)
+
+
+def similarity(a: bytes, b: bytes) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(map(operator.eq, _SIGNATURE.unpack(a), _SIGNATURE.unpack(b))) / NUM_HASHES
+
+
+def cluster(signatures: Sequence[bytes], threshold: float = None) -> List[List[int]]:
+    """Group indexes of near-duplicate signatures. Cost is linear in the number of signatures."""
+    threshold = RECOMMENDATION_SIMILARITY if threshold is None else threshold
+    # Identical signatures (the same advice repeated across runs) merge without any comparison
+    unique: Dict[bytes, List[int]] = {}
+    for i, sig in enumerate(signatures):
+        unique.setdefault(sig, []).append(i)
+    keys = list(unique)
+    parent = list(range(len(keys)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    width = _ROWS * _SIGNATURE.size // NUM_HASHES
+    for band in range(BANDS):
+        parts = [key[band * width:(band + 1) * width] for key in keys]
+        last = dict(zip(parts, range(len(parts))))
+        if len(last) == len(parts):
+            continue
+        for i, j in enumerate(map(last.__getitem__, parts)):
+            # Sharing a band is only a hint: check the whole signature against the band's last member
+            if j != i and parent[i] != parent[j]:
+                a, b = find(j), find(i)
+                if a != b and similarity(keys[j], keys[i]) >= threshold:
+                    parent[b] = a
+
+    groups: Dict[int, List[int]] = {}
+    for i, key in enumerate(keys):
+        groups.setdefault(find(i), []).extend(unique[key])
+    return list(groups.values())
+
+
+# --- Extraction ---
+
+def _clean(value: Any, limit: int) -> str:
+    return value.strip()[:limit] if isinstance(value, str) else ""
+
+
+def extract(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Candidate rows from an aggregate analysis (every provider's `recommendations`)."""
+    candidates = []
+    for res in result.get("model_breakdown", []):
+        if "error" in res:
+            continue
+        for rec in res.get("recommendations") or []:
+            if not isinstance(rec, dict):
+                continue
+            title, suggestion = _clean(rec.get("title"), 200), _clean(rec.get("suggestion"), 1000)
+            if not title and not suggestion:
+                continue
+            candidates.append({
+                "provider": res.get("provider"),
+                "type": rec.get("type") if rec.get("type") in TYPES else "content",
+                "priority": rec.get("priority") if rec.get("priority") in PRIORITY_WEIGHTS else "medium",
+                "title": title or suggestion[:80],
+                "suggestion": suggestion,
+                "impact": _clean(rec.get("impact"), 200) or None,
+                "signature": signature(f"{title} {suggestion}"),
+            })
+    return candidates
+
+
+# --- Ranking and materialization ---
+
+def rank(candidates: List[Dict[str, Any]], top_n: int = None, threshold: float = None) -> List[Dict[str, Any]]:
+    """Merge near-duplicate candidates and return the top_n, best first, as recommendation rows."""
+    top_n = top_n or RECOMMENDATION_TOP_N
+    ranked = []
+    for members in cluster([c["signature"] for c in candidates], threshold):
+        group = [candidates[i] for i in members]
+        # The most common priority wins; ties go to the higher one
+        priorities = Counter(c["priority"] for c in group)
+        priority = max(priorities, key=lambda p: (priorities[p], PRIORITY_WEIGHTS[p]))
+        newest = max((c for c in group if c["priority"] == priority), key=lambda c: (c["created_at"], c["id"]))
+        ranked.append({
+            "type": newest["type"],
+            "priority": priority,
+            "title": newest["title"],
+            "suggestion": newest["suggestion"],
+            "impact": newest["impact"],
+            "occurrences": len(group),
+            "providers": len({c["provider"] for c in group}),
+            "score": float(PRIORITY_WEIGHTS[priority] * len(group)),
+            "_newest": (newest["created_at"], newest["id"]),
+        })
+    # Agreement between providers, then recency, break ties
+    ranked.sort(key=lambda r: (r["score"], r["providers"], r["_newest"]), reverse=True)
+    rows = ranked[:top_n]
+    for position, row in enumerate(rows, 1):
+        del row["_newest"]
+        row["rank"] = position
+    return rows
+
+
+def refresh(db: Session, brand_id: int, now: Optional[datetime] = None, top_n: int = None) -> int:
+    """Rebuild one brand's top recommendations from its recent candidates. Returns the rows written."""
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=RECOMMENDATION_WINDOW_DAYS)
+    table = models.RecommendationCandidate
+    db.execute(delete(table).where(table.brand_id == brand_id, table.created_at < cutoff))
+    candidates = [
+        dict(row._mapping)
+        for row in db.execute(
+            select(
+                table.id, table.provider, table.type, table.priority, table.title,
+                table.suggestion, table.impact, table.signature, table.created_at,
+            )
+            .where(table.brand_id == brand_id)
+            .order_by(table.created_at.desc(), table.id.desc())
+            .limit(RECOMMENDATION_MAX_CANDIDATES)
+        )
+    ]
+    rows = rank(candidates, top_n)
+    db.execute(delete(models.Recommendation).where(models.Recommendation.brand_id == brand_id))
+    if rows:
+        db.execute(insert(models.Recommendation), [{**row, "brand_id": brand_id, "created_at": now} for row in rows])
+    return len(rows)
+
+
+def _unseen(db: Session, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Drop candidates the brand already has from the same provider with the same text. An analysis or
+    provider reply served from cache repeats the earlier one, and mustn't count as another suggestion.
+    """
+    table = models.RecommendationCandidate
+    seen = set(db.execute(
+        select(table.brand_id, table.provider, table.signature).where(
+            table.brand_id.in_({row["brand_id"] for row in rows}),
+            table.signature.in_({row["signature"] for row in rows}),
+        )
+    ).all())
+    unseen = []
+    for row in rows:
+        key = (row["brand_id"], row["provider"], row["signature"])
+        if key not in seen:
+            seen.add(key)
+            unseen.append(row)
+    return unseen
+
+
+def record(db: Session, analyses: Iterable[Tuple[int, Dict[str, Any]]], now: Optional[datetime] = None):
+    """
+    Store the new recommendations of (brand_id, analysis) pairs. Doesn't commit; those brands' lists
+    are rebuilt in the background once `db` commits.
+    """
+    now = now or datetime.now(timezone.utc)
+    rows = []
+    for brand_id, result in analyses:
+        rows.extend({**candidate, "brand_id": brand_id, "created_at": now} for candidate in extract(result))
+    rows = _unseen(db, rows) if rows else rows
+    if not rows:
+        return
+    db.execute(insert(models.RecommendationCandidate), rows)
+    db.info.setdefault("recommendations_dirty", set()).update(row["brand_id"] for row in rows)
+
+
+class RefreshQueue:
+    """
+    Rebuilds brands' lists off the event loop: ranking thousands of candidates takes ~100 ms of pure
+    Python. Brands saved again while they wait are rebuilt once. Outside an event loop (scripts,
+    threadpool endpoints) the rebuild runs right away in the calling thread.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self.pending: Set[int] = set()
+        self.lock = threading.Lock()
+        self.task: Optional[asyncio.Task] = None
+
+    def add(self, brand_ids: Iterable[int]):
+        with self.lock:
+            self.pending.update(brand_ids)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.drain()
+            return
+        if self.task is None or self.task.done():
+            self.task = loop.create_task(self._run())
+
+    async def _run(self):
+        # Checked on the loop, where add() runs, so brands added while the thread finishes aren't missed
+        while self.pending:
+            await asyncio.to_thread(self.drain)
+
+    def drain(self):
+        while True:
+            with self.lock:
+                if not self.pending:
+                    return
+                brand_id = self.pending.pop()
+            try:
+                with self.session_factory() as db:
+                    refresh(db, brand_id)
+                    snapshots.mark_dirty(db)
+                    db.commit()
+            except Exception:
+                logger.exception("Couldn't rebuild recommendations for brand %s", brand_id)
+
+
+refresh_queue = RefreshQueue()
+
+
+@event.listens_for(Session, "after_commit")
+def _refresh_after_commit(session: Session):
+    brand_ids = session.info.pop("recommendations_dirty", None)
+    if brand_ids:
+        refresh_queue.add(brand_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_after_rollback(session: Session):
+    session.info.pop("recommendations_dirty", None)
+
+
+def top_recommendations(db: Session, brand_id, limit: int = None) -> List[models.Recommendation]:
+    """One indexed read of a brand's materialized list; `brand_id` may be a scalar subquery."""
+    return db.scalars(
+        select(models.Recommendation)
+        .where(models.Recommendation.brand_id == brand_id)
+        .order_by(models.Recommendation.rank)
+        .limit(limit or RECOMMENDATION_TOP_N)
+    ).all()
+
+
+def rebuild(db: Session) -> int:
+    """Refresh every brand that has candidates. Returns the number of brands."""
+    brand_ids = db.scalars(select(models.RecommendationCandidate.brand_id).distinct()).all()
+    for brand_id in brand_ids:
+        refresh(db, brand_id)
+        db.commit()
+    return len(brand_ids)
+
+
+def benchmark(count: int, seed: int = 0) -> Dict[str, Any]:
+    """Cluster `count` synthetic candidates (paraphrases of a few dozen pieces of advice) and time it."""
+    rng = random.Random(seed)
+    words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9))) for _ in range(2000)]
+    bases = [" ".join(rng.choice(words) for _ in range(14)) for _ in range(max(1, count // 50))]
+    now = datetime.now(timezone.utc)
+    candidates = []
+    started = time.perf_counter()
+    for i in range(count):
+        text = rng.choice(bases).split()
+        text[rng.randrange(len(text))] = rng.choice(words)
+        candidates.append({
+            "id": i, "provider": rng.choice(["DeepSeek", "Doubao", "Kimi"]), "type": "content",
+            "priority": rng.choice(list(PRIORITY_WEIGHTS)), "title": " ".join(text[:4]), "suggestion": " ".join(text),
+            "impact": None, "signature": signature(" ".join(text)), "created_at": now,
+        })
+    signed = time.perf_counter()
+    rows = rank(candidates)
+    ranked = time.perf_counter()
+    return {
+        "candidates": count,
+        "distinct_texts": len(bases),
+        "clusters": len(cluster([c["signature"] for c in candidates])),
+        "signature_ms": round((signed - started) * 1000, 1),
+        "rank_ms": round((ranked - signed) * 1000, 1),
+        "top": [(row["title"], row["occurrences"]) for row in rows[:3]],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the materialized recommendations from stored candidates")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="Time clustering N synthetic candidates instead")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.benchmark:
+        print(benchmark(args.benchmark))
+    else:
+        with SessionLocal() as session:
+            print(f"Rebuilt recommendations for {rebuild(session)} brand(s)")
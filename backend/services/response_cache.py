@@ -0,0 +1,153 @@
+"""
+Content-addressed cache of raw provider responses, shared by every worker through the
+provider_responses table.
+
+Keys hash the provider, endpoint, model, prompt and every other request parameter, so an
+identical request is answered from the table after restarts and across gunicorn workers, and any
+change to the prompt or parameters misses. Total size is bounded by PROVIDER_CACHE_MAX_BYTES,
+evicting least recently used rows. Wrap a call in `bypass()` to skip reads and store a fresh
+response (forced refresh).
+"""
+import contextlib
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy import delete, func, select, update
+
+from .. import models
+from ..database import AsyncSessionLocal
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_CACHE_LOOKUPS = metrics.registry.counter(
+    "provider_cache_lookups_total", "Provider response cache lookups (hit, miss, bypass)", ("provider", "result")
+)
+
+_bypass = contextvars.ContextVar("provider_cache_bypass", default=False)
+
+
+@contextlib.contextmanager
+def bypass():
+    """Provider calls made inside this block (and tasks it starts) skip cached responses."""
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def response_cache_key(provider: str, url: str, payload: Dict[str, Any]) -> str:
+    canonical = json.dumps({"provider": provider, "url": url, "payload": payload}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ProviderResponseCache:
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        ttl: float = 86400,
+        max_bytes: int = 256 * 1024 * 1024,
+        evict_interval: float = 60.0,
+    ):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evict_interval = evict_interval
+        self.evictions = 0
+        self._last_evict = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    async def get(self, key: str, provider: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        if _bypass.get():
+            PROVIDER_CACHE_LOOKUPS.inc(provider=provider, result="bypass")
+            return None
+        now = datetime.now(timezone.utc)
+        try:
+            async with self.session_factory() as db:
+                response = await db.scalar(
+                    select(models.ProviderResponse.response).where(
+                        models.ProviderResponse.key == key,
+                        models.ProviderResponse.expires_at > now,
+                    )
+                )
+                if response is not None:
+                    await db.execute(
+                        update(models.ProviderResponse)
+                        .where(models.ProviderResponse.key == key)
+                        .values(last_used_at=now, hits=models.ProviderResponse.hits + 1)
+                    )
+                    await db.commit()
+        except Exception:
+            # The cache is an optimization; a DB hiccup falls through to the provider
+            logger.warning("Provider cache read failed", exc_info=True)
+            return None
+        PROVIDER_CACHE_LOOKUPS.inc(provider=provider, result="miss" if response is None else "hit")
+        return json.loads(response) if response is not None else None
+
+    async def set(self, key: str, provider: str, model: Optional[str], response: Dict[str, Any]):
+        if not self.enabled:
+            return
+        body = json.dumps(response, ensure_ascii=False)
+        now = datetime.now(timezone.utc)
+        try:
+            async with self.session_factory() as db:
+                await db.merge(models.ProviderResponse(
+                    key=key,
+                    provider=provider,
+                    model=model,
+                    response=body,
+                    size_bytes=len(body.encode()),
+                    hits=0,
+                    created_at=now,
+                    expires_at=now + timedelta(seconds=self.ttl),
+                    last_used_at=now,
+                ))
+                await db.commit()
+                if time.monotonic() - self._last_evict >= self.evict_interval:
+                    self._last_evict = time.monotonic()
+                    await self._evict(db, now)
+        except Exception:
+            logger.warning("Provider cache write failed", exc_info=True)
+
+    async def _evict(self, db, now: datetime, batch_size: int = 500):
+        table = models.ProviderResponse
+        await db.execute(delete(table).where(table.expires_at <= now))
+        overflow = (await db.scalar(select(func.coalesce(func.sum(table.size_bytes), 0)))) - self.max_bytes
+        while overflow > 0:
+            oldest = (await db.execute(
+                select(table.key, table.size_bytes).order_by(table.last_used_at.asc()).limit(batch_size)
+            )).all()
+            if not oldest:
+                break
+            keys = []
+            for key, size in oldest:
+                keys.append(key)
+                overflow -= size or 0
+                if overflow <= 0:
+                    break
+            await db.execute(delete(table).where(table.key.in_(keys)))
+            self.evictions += len(keys)
+        await db.commit()
+
+    async def clear(self):
+        async with self.session_factory() as db:
+            await db.execute(delete(models.ProviderResponse))
+            await db.commit()
+
+
+response_cache = ProviderResponseCache(
+    ttl=float(os.environ.get("PROVIDER_CACHE_TTL", "86400")),
+    max_bytes=int(os.environ.get("PROVIDER_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+)
@@ -0,0 +1,228 @@
+"""
+Pre-aggregated score rollups for trend charts.
+
+Every analysis write folds its scores into hour/day/week buckets per brand, provider and
+dimension (count, sum, min, max) with an atomic upsert, so trend queries read a few hundred
+rollup rows instead of scanning raw history.
+
+Rebuild from raw history with:  python -m backend.services.rollups
+"""
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .. import models
+
+GRANULARITIES = ("hour", "day", "week")
+SCORE_DIMENSIONS = ("total", "visibility", "comprehension", "representation", "optimization")
+OVERALL = ""  # provider value for the brand-level GeoScore dimensions
+MAX_POINTS = 450  # rollup rows per trend query, across all of its series: daily buckets up to 90 days
+
+_KEY = ("brand_id", "granularity", "provider", "dimension", "bucket_start")
+
+_STEP = {"hour": timedelta(hours=1), "day": timedelta(days=1), "week": timedelta(weeks=1)}
+
+Key = Tuple[int, str, str, str, datetime]
+
+
+def as_utc(ts: datetime) -> datetime:
+    return ts.astimezone(timezone.utc) if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    ts = as_utc(ts)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return day
+    return day - timedelta(days=day.weekday())  # weeks start on Monday
+
+
+def bucket_count(since: datetime, until: datetime, granularity: str) -> int:
+    return math.ceil((until - bucket_start(since, granularity)) / _STEP[granularity])
+
+
+def point_count(since: datetime, until: datetime, granularity: str, provider: str = OVERALL) -> int:
+    """Rollup rows a trend query reads: one series per score dimension, or one for a provider."""
+    series = len(SCORE_DIMENSIONS) if provider == OVERALL else 1
+    return bucket_count(since, until, granularity) * series
+
+
+def pick_granularity(since: datetime, until: datetime, provider: str = OVERALL) -> Optional[str]:
+    """Finest granularity that keeps the query under MAX_POINTS rows; None if even weeks don't."""
+    for granularity in GRANULARITIES:
+        if point_count(since, until, granularity, provider) <= MAX_POINTS:
+            return granularity
+    return None
+
+
+class _Accumulator:
+    def __init__(self):
+        self.deltas: Dict[Key, List[float]] = {}
+
+    def add(self, brand_id: Optional[int], provider: str, dimension: str, value, ts: datetime):
+        if brand_id is None or value is None:
+            return
+        for granularity in GRANULARITIES:
+            key = (brand_id, granularity, provider, dimension, bucket_start(ts, granularity))
+            delta = self.deltas.get(key)
+            if delta is None:
+                self.deltas[key] = [1, value, value, value]
+            else:
+                delta[0] += 1
+                delta[1] += value
+                delta[2] = min(delta[2], value)
+                delta[3] = max(delta[3], value)
+
+    def add_score(self, row: dict):
+        for dimension in SCORE_DIMENSIONS:
+            self.add(row["brand_id"], OVERALL, dimension, row.get(dimension), row["created_at"])
+
+    def add_comparison(self, row: dict):
+        self.add(row["brand_id"], row["model_name"], "score", row.get("score"), row["created_at"])
+
+    def rows(self) -> List[dict]:
+        return [
+            {
+                "brand_id": brand_id,
+                "granularity": granularity,
+                "provider": provider,
+                "dimension": dimension,
+                "bucket_start": start,
+                "count": count,
+                "sum": total,
+                "min": low,
+                "max": high,
+            }
+            for (brand_id, granularity, provider, dimension, start), (count, total, low, high) in self.deltas.items()
+        ]
+
+
+def _upsert(db: Session, rows: List[dict]):
+    if not rows:
+        return
+    table = models.ScoreRollup.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(table)
+        least, greatest = func.least, func.greatest
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(table)
+        least, greatest = func.min, func.max  # multi-argument min/max are scalar in SQLite
+    else:
+        _update_or_insert(db, rows)
+        return
+
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(_KEY),
+        set_={
+            "count": table.c.count + stmt.excluded.count,
+            "sum": table.c.sum + stmt.excluded.sum,
+            "min": least(table.c.min, stmt.excluded.min),
+            "max": greatest(table.c.max, stmt.excluded.max),
+        },
+    )
+    db.execute(stmt, rows)
+
+
+def _update_or_insert(db: Session, rows: List[dict]):
+    # Other backends: lock the bucket if it exists and fold the delta in, else insert it. Two
+    # workers creating the same bucket at once can still hit the unique key and fail the write
+    table = models.ScoreRollup.__table__
+    for row in rows:
+        existing = db.execute(
+            select(table.c.id, table.c.min, table.c.max)
+            .where(*(table.c[column] == row[column] for column in _KEY))
+            .with_for_update()
+        ).first()
+        if existing is None:
+            db.execute(insert(table), [row])
+            continue
+        db.execute(
+            update(table)
+            .where(table.c.id == existing.id)
+            .values(
+                count=table.c.count + row["count"],
+                sum=table.c.sum + row["sum"],
+                min=min(existing.min, row["min"]),
+                max=max(existing.max, row["max"]),
+            )
+        )
+
+
+def record(db: Session, score_rows: Iterable[dict], comparison_rows: Iterable[dict]):
+    """Fold freshly written analysis rows into the rollups, in the caller's transaction."""
+    acc = _Accumulator()
+    for row in score_rows:
+        acc.add_score(row)
+    for row in comparison_rows:
+        acc.add_comparison(row)
+    _upsert(db, acc.rows())
+
+
+def backfill(db: Session, batch_size: int = 5000) -> int:
+    """Rebuild every rollup from raw history. Returns the number of rollup rows written."""
+    db.execute(delete(models.ScoreRollup))
+    acc = _Accumulator()
+    score_columns = [models.GeoScore.brand_id, models.GeoScore.created_at] + [
+        getattr(models.GeoScore, d) for d in SCORE_DIMENSIONS
+    ]
+    for row in db.execute(select(*score_columns).execution_options(yield_per=batch_size)).mappings():
+        acc.add_score(row)
+    comparison_columns = [
+        models.ModelComparison.brand_id,
+        models.ModelComparison.created_at,
+        models.ModelComparison.model_name,
+        models.ModelComparison.score,
+    ]
+    for row in db.execute(select(*comparison_columns).execution_options(yield_per=batch_size)).mappings():
+        acc.add_comparison(row)
+
+    rows = acc.rows()
+    for start in range(0, len(rows), batch_size):
+        _upsert(db, rows[start:start + batch_size])
+    db.commit()
+    return len(rows)
+
+
+def trends(
+    db: Session,
+    brand_id: int,
+    granularity: str,
+    since: datetime,
+    until: datetime,
+    provider: str = OVERALL,
+) -> Dict[str, List[dict]]:
+    rows = db.scalars(
+        select(models.ScoreRollup)
+        .where(
+            models.ScoreRollup.brand_id == brand_id,
+            models.ScoreRollup.granularity == granularity,
+            models.ScoreRollup.provider == provider,
+            models.ScoreRollup.bucket_start >= bucket_start(since, granularity),
+            models.ScoreRollup.bucket_start < until,
+        )
+        .order_by(models.ScoreRollup.dimension, models.ScoreRollup.bucket_start)
+    ).all()
+    series: Dict[str, List[dict]] = {}
+    for row in rows:
+        series.setdefault(row.dimension, []).append({
+            "bucket": row.bucket_start,
+            "avg": round(row.sum / row.count, 2),
+            "min": row.min,
+            "max": row.max,
+            "count": row.count,
+        })
+    return series
+
+
+if __name__ == "__main__":
+    from ..database import SessionLocal
+
+    with SessionLocal() as session:
+        print(f"Rebuilt {backfill(session)} rollup rows")
@@ -0,0 +1,373 @@
+"""
+Continuous brand monitoring: re-analyzes tracked brands on a per-brand cadence.
+
+Every worker runs a MonitorScheduler. Each tick it claims due tracked_brands rows with a
+conditional UPDATE lease (lease_owner/lease_until), so a brand is analyzed by one worker or
+instance at a time; a worker that dies mid-run leaves a lease that expires after MONITOR_LEASE
+seconds. Runs go through analysis.analyze_brand_across_models and crud.save_analyses, the same
+path as POST /api/analyze.
+
+Runs are spread out so scheduled work doesn't burst the providers: ticks and next run times are
+jittered, each worker starts at most MONITOR_MAX_CONCURRENT runs per tick, and scheduled runs
+share a budget of MONITOR_HOURLY_BUDGET provider calls per hour across all workers (the
+provider_budget table). Runs over budget are deferred into the next hour.
+
+The clock is injectable. Simulate a day of monitoring against the mock provider with:
+
+    python -m backend.services.scheduler --track Acme --track Globex --interval 4 --simulate 24
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+
+from .. import crud, models
+from ..database import AsyncSessionLocal
+from . import analysis, evaluation, metrics
+
+logger = logging.getLogger(__name__)
+
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+MONITOR_RUNS = metrics.registry.counter(
+    "monitor_runs_total", "Scheduled brand analyses by outcome (succeeded, failed, deferred, lost_lease)", ("outcome",)
+)
+
+
+class SystemClock:
+    def now(self) -> datetime:
+        return datetime.now(timezone.utc)
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+
+class FakeClock:
+    """Manually advanced clock for tests and simulations; sleep() advances it instead of waiting."""
+
+    def __init__(self, start: Optional[datetime] = None):
+        self.current = start or datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+    def now(self) -> datetime:
+        return self.current
+
+    def advance(self, seconds: float):
+        self.current += timedelta(seconds=seconds)
+
+    async def sleep(self, seconds: float):
+        self.advance(seconds)
+        await asyncio.sleep(0)
+
+
+def tracked_to_dict(tracked: models.TrackedBrand, brand_name: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "id": tracked.id,
+        "brand_id": tracked.brand_id,
+        "brand": brand_name,
+        "interval_seconds": tracked.interval_seconds,
+        "providers": json.loads(tracked.providers) if tracked.providers else None,
+        "enabled": tracked.enabled,
+        "next_run_at": tracked.next_run_at,
+        "last_run_at": tracked.last_run_at,
+        "last_status": tracked.last_status,
+        "last_error": tracked.last_error,
+        "runs": tracked.runs,
+    }
+
+
+def _reserve_budget(db: Session, window_start: datetime, calls: int, limit: int) -> bool:
+    db.execute(crud.insert_ignoring_conflicts(db, models.ProviderBudget), [{"window_start": window_start, "calls": 0}])
+    reserved = db.execute(
+        update(models.ProviderBudget)
+        .where(models.ProviderBudget.window_start == window_start, models.ProviderBudget.calls + calls <= limit)
+        .values(calls=models.ProviderBudget.calls + calls)
+    )
+    return bool(reserved.rowcount)
+
+
+class MonitorScheduler:
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        clock=None,
+        tick_interval: float = 60.0,
+        max_concurrent: int = 2,
+        lease_seconds: float = 900.0,
+        hourly_budget: int = 0,
+        jitter: float = 0.1,
+        retry_after: float = 900.0,
+        rng: Optional[random.Random] = None,
+    ):
+        self.session_factory = session_factory
+        self.clock = clock or SystemClock()
+        self.tick_interval = tick_interval
+        self.max_concurrent = max_concurrent
+        self.lease_seconds = lease_seconds
+        self.hourly_budget = hourly_budget  # provider calls per hour across all workers; 0 = unlimited
+        self.jitter = jitter
+        self.retry_after = retry_after
+        self.rng = rng or random.Random()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"ticks": 0, "succeeded": 0, "failed": 0, "deferred": 0, "lost_lease": 0}
+
+    async def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"running": self._task is not None, "hourly_budget": self.hourly_budget, **self._stats}
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Monitor tick failed")
+            # Jittered, so workers started together don't poll in lockstep
+            await self.clock.sleep(self.tick_interval * self.rng.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def _jittered(self, seconds: float) -> timedelta:
+        return timedelta(seconds=seconds * self.rng.uniform(1 - self.jitter, 1 + self.jitter))
+
+    # --- Public API ---
+
+    async def track(self, brand: str, interval_seconds: int, providers: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Start monitoring `brand` (or update its cadence). The first run is spread over the first jitter share of the interval."""
+        now = self.clock.now()
+        async with self.session_factory() as db:
+            brand_id = await db.run_sync(crud.get_brand_id, brand)
+            tracked = await db.scalar(select(models.TrackedBrand).where(models.TrackedBrand.brand_id == brand_id))
+            if tracked is None:
+                tracked = models.TrackedBrand(brand_id=brand_id, runs=0)
+                db.add(tracked)
+            tracked.interval_seconds = interval_seconds
+            tracked.providers = json.dumps(providers) if providers else None
+            tracked.enabled = True
+            tracked.next_run_at = now + timedelta(seconds=self.rng.uniform(0, interval_seconds * self.jitter))
+            await db.commit()
+            await db.refresh(tracked)
+            return tracked_to_dict(tracked, brand)
+
+    async def untrack(self, tracked_id: int) -> bool:
+        async with self.session_factory() as db:
+            tracked = await db.get(models.TrackedBrand, tracked_id)
+            if tracked is None:
+                return False
+            await db.delete(tracked)
+            await db.commit()
+            return True
+
+    async def list_tracked(self) -> List[Dict[str, Any]]:
+        async with self.session_factory() as db:
+            rows = await db.execute(
+                select(models.TrackedBrand, models.Brand.name)
+                .join(models.Brand, models.Brand.id == models.TrackedBrand.brand_id)
+                .order_by(models.TrackedBrand.id)
+            )
+            return [tracked_to_dict(tracked, name) for tracked, name in rows.all()]
+
+    async def tick(self) -> Dict[str, int]:
+        """Claim and run the brands that are due now. Returns counts by outcome for this tick."""
+        self._stats["ticks"] += 1
+        claimed = await self._claim_due(self.clock.now())
+        outcomes = await asyncio.gather(*(self._run(tracked) for tracked in claimed))
+        summary = {"claimed": len(claimed)}
+        for outcome in outcomes:
+            summary[outcome] = summary.get(outcome, 0) + 1
+            self._stats[outcome] += 1
+            MONITOR_RUNS.inc(outcome=outcome)
+        return summary
+
+    # --- Runs ---
+
+    async def _run(self, tracked: Dict[str, Any]) -> str:
+        try:
+            cost = len(analysis.get_adapters(tracked["providers"])) * evaluation.calls_per_provider()
+            if not await self._reserve(cost):
+                return await self._defer(tracked)
+            # Monitoring wants fresh answers, not whatever an earlier request cached
+            result = await analysis.analyze_brand_across_models(tracked["brand"], refresh=True, providers=tracked["providers"])
+            if not analysis.has_valid_result(result):
+                raise RuntimeError("Analysis failed")
+        except asyncio.CancelledError:
+            # Shutting down: the lease expires and another worker picks the brand up
+            raise
+        except Exception as e:
+            logger.exception("Scheduled analysis of %s failed", tracked["brand"])
+            return await self._finish(tracked, None, str(e))
+        return await self._finish(tracked, result, None)
+
+    # --- DB helpers ---
+
+    def _claimable(self, now: datetime):
+        return (
+            models.TrackedBrand.enabled.is_(True),
+            models.TrackedBrand.next_run_at <= now,
+            or_(models.TrackedBrand.lease_until.is_(None), models.TrackedBrand.lease_until < now),
+        )
+
+    async def _claim_due(self, now: datetime) -> List[Dict[str, Any]]:
+        async with self.session_factory() as db:
+            due = (await db.execute(
+                select(models.TrackedBrand.id, models.TrackedBrand.providers, models.Brand.name)
+                .join(models.Brand, models.Brand.id == models.TrackedBrand.brand_id)
+                .where(*self._claimable(now))
+                .order_by(models.TrackedBrand.next_run_at)
+                .limit(self.max_concurrent)
+            )).all()
+
+            claimed = []
+            for tracked_id, providers, name in due:
+                result = await db.execute(
+                    update(models.TrackedBrand)
+                    .where(models.TrackedBrand.id == tracked_id, *self._claimable(now))
+                    .values(lease_owner=self.owner, lease_until=now + timedelta(seconds=self.lease_seconds))
+                )
+                # Zero rows: another worker got there first
+                if result.rowcount:
+                    claimed.append({"id": tracked_id, "brand": name, "providers": json.loads(providers) if providers else None})
+            await db.commit()
+        return claimed
+
+    async def _reserve(self, calls: int) -> bool:
+        if not self.hourly_budget:
+            return True
+        window = self.clock.now().replace(minute=0, second=0, microsecond=0)
+        async with self.session_factory() as db:
+            reserved = await db.run_sync(_reserve_budget, window, calls, self.hourly_budget)
+            await db.commit()
+        return reserved
+
+    async def _release(self, db, tracked_id: int, **values) -> bool:
+        # Only the lease holder may reschedule; if the lease expired and moved on, leave the row alone
+        result = await db.execute(
+            update(models.TrackedBrand)
+            .where(models.TrackedBrand.id == tracked_id, models.TrackedBrand.lease_owner == self.owner)
+            .values(lease_owner=None, lease_until=None, **values)
+        )
+        return bool(result.rowcount)
+
+    async def _defer(self, tracked: Dict[str, Any]) -> str:
+        # Out of budget: retry early in the next hour, spread over its first few minutes
+        now = self.clock.now()
+        next_window = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        async with self.session_factory() as db:
+            await self._release(
+                db, tracked["id"], next_run_at=next_window + timedelta(seconds=self.rng.uniform(0, 3600 * self.jitter))
+            )
+            await db.commit()
+        logger.info("Deferred scheduled analysis of %s: hourly provider budget spent", tracked["brand"])
+        return "deferred"
+
+    async def _finish(self, tracked: Dict[str, Any], result: Optional[dict], error: Optional[str]) -> str:
+        now = self.clock.now()
+        async with self.session_factory() as db:
+            interval = await db.scalar(
+                select(models.TrackedBrand.interval_seconds).where(models.TrackedBrand.id == tracked["id"])
+            )
+            delay = interval if error is None else min(interval or self.retry_after, self.retry_after)
+            released = interval is not None and await self._release(
+                db,
+                tracked["id"],
+                next_run_at=now + self._jittered(delay),
+                last_run_at=now,
+                last_status=FAILED if error else SUCCEEDED,
+                last_error=error,
+                runs=models.TrackedBrand.runs + 1,
+            )
+            if not released:
+                await db.rollback()
+                logger.warning("Lost the lease on %s (expired or untracked) before saving its analysis", tracked["brand"])
+                return "lost_lease"
+            if result is not None:
+                # Saved in the same transaction that releases the lease
+                await db.run_sync(crud.save_analyses, [(tracked["brand"], result)], False)
+            await db.commit()
+        return FAILED if error else SUCCEEDED
+
+
+monitor = MonitorScheduler(
+    tick_interval=float(os.environ.get("MONITOR_TICK", "60")),
+    max_concurrent=int(os.environ.get("MONITOR_MAX_CONCURRENT", "2")),
+    lease_seconds=float(os.environ.get("MONITOR_LEASE", "900")),
+    hourly_budget=int(os.environ.get("MONITOR_HOURLY_BUDGET", "0")),
+    jitter=float(os.environ.get("MONITOR_JITTER", "0.1")),
+    retry_after=float(os.environ.get("MONITOR_RETRY_AFTER", "900")),
+)
+
+
+def monitor_enabled() -> bool:
+    return os.environ.get("MONITOR_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+async def simulate(scheduler: MonitorScheduler, clock: FakeClock, hours: float, step: float) -> List[Dict[str, Any]]:
+    """Tick every `step` seconds of fake time for `hours`; returns the non-empty tick summaries."""
+    ticks = []
+    end = clock.now() + timedelta(hours=hours)
+    while clock.now() < end:
+        summary = await scheduler.tick()
+        if summary["claimed"]:
+            ticks.append({"at": clock.now().isoformat(), **summary})
+        clock.advance(step)
+    return ticks
+
+
+async def _main(args):
+    from ..migrate import migrate, should_migrate_on_startup
+    from .http_client import http_pool
+    from .models.registry import get_registry
+
+    if should_migrate_on_startup():
+        await asyncio.to_thread(migrate)
+    http_pool.open(*get_registry().pool_keys())
+    clock = FakeClock() if args.simulate else SystemClock()
+    scheduler = MonitorScheduler(
+        clock=clock,
+        max_concurrent=monitor.max_concurrent,
+        lease_seconds=monitor.lease_seconds,
+        hourly_budget=args.budget if args.budget is not None else monitor.hourly_budget,
+        jitter=monitor.jitter,
+        retry_after=monitor.retry_after,
+        rng=random.Random(args.seed),
+    )
+    try:
+        for brand in args.track or []:
+            await scheduler.track(brand, int(args.interval * 3600))
+        if args.simulate:
+            for tick in await simulate(scheduler, clock, args.simulate, args.step * 60):
+                print(json.dumps(tick))
+        else:
+            print(json.dumps(await scheduler.tick()))
+        print(json.dumps(scheduler.stats()))
+    finally:
+        await http_pool.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the brand monitor once, or simulate it on a fake clock")
+    parser.add_argument("--track", action="append", help="Track this brand before running (repeatable)")
+    parser.add_argument("--interval", type=float, default=24, help="Cadence in hours for --track (default 24)")
+    parser.add_argument("--simulate", type=float, metavar="HOURS", help="Run on a fake clock for this many hours")
+    parser.add_argument("--step", type=float, default=5, help="Fake minutes between ticks when simulating (default 5)")
+    parser.add_argument("--budget", type=int, help="Provider calls per hour (default MONITOR_HOURLY_BUDGET)")
+    parser.add_argument("--seed", type=int, help="Seed the jitter for reproducible runs")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,239 @@
+"""
+Server-side sessions: the cookie carries only a signed, random session id.
+
+Session data lives in a backend (SESSION_BACKEND: "sql", the sessions table shared by every
+worker, or "memory" for a single local process) behind a per-worker LRU front cache, so most
+requests never reach the database. Sessions are written only when their data changes and last
+SESSION_MAX_AGE seconds from the last write. A worker may serve a session from its front cache for
+up to SESSION_CACHE_TTL seconds after another worker changed or deleted it.
+
+ServerSessionMiddleware is a drop-in for Starlette's SessionMiddleware: `request.session` is a
+plain dict, so Authlib's OAuth state works unchanged.
+"""
+import hashlib
+import json
+import logging
+import os
+import secrets
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from itsdangerous import BadSignature, TimestampSigner
+from sqlalchemy import delete
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+
+from .. import models
+from ..database import AsyncSessionLocal
+from .cache import MemoryCacheBackend
+from .rollups import as_utc
+
+logger = logging.getLogger(__name__)
+
+# Rotated on login so a session id planted before authentication can't be reused after it
+ROTATE_ON_CHANGE = ("user_id",)
+
+
+def _digest(session_id: str) -> str:
+    return hashlib.sha256(session_id.encode()).hexdigest()
+
+
+class MemorySessionBackend:
+    def __init__(self):
+        self._sessions: Dict[str, tuple] = {}
+
+    async def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._sessions.get(session_id)
+        if entry is None or entry[1] <= datetime.now(timezone.utc):
+            return None
+        return json.loads(entry[0])
+
+    async def save(self, session_id: str, data: Dict[str, Any], expires_at: datetime):
+        self._sessions[session_id] = (json.dumps(data), expires_at)
+
+    async def delete(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    async def delete_expired(self) -> int:
+        now = datetime.now(timezone.utc)
+        expired = [key for key, (_, expires_at) in self._sessions.items() if expires_at <= now]
+        for key in expired:
+            del self._sessions[key]
+        return len(expired)
+
+
+class SQLSessionBackend:
+    """Rows in the sessions table, keyed by a hash of the session id."""
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self.session_factory = session_factory
+
+    async def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        async with self.session_factory() as db:
+            row = await db.get(models.UserSession, _digest(session_id))
+            if row is None or as_utc(row.expires_at) <= datetime.now(timezone.utc):
+                return None
+            return json.loads(row.data)
+
+    async def save(self, session_id: str, data: Dict[str, Any], expires_at: datetime):
+        async with self.session_factory() as db:
+            await db.merge(models.UserSession(
+                id=_digest(session_id),
+                data=json.dumps(data, ensure_ascii=False),
+                expires_at=expires_at,
+                updated_at=datetime.now(timezone.utc),
+            ))
+            await db.commit()
+
+    async def delete(self, session_id: str):
+        async with self.session_factory() as db:
+            await db.execute(delete(models.UserSession).where(models.UserSession.id == _digest(session_id)))
+            await db.commit()
+
+    async def delete_expired(self) -> int:
+        async with self.session_factory() as db:
+            result = await db.execute(delete(models.UserSession).where(models.UserSession.expires_at <= datetime.now(timezone.utc)))
+            await db.commit()
+            return result.rowcount
+
+
+class SessionStore:
+    """A session backend behind a bounded in-process LRU."""
+
+    def __init__(self, backend=None, max_age: float = 14 * 24 * 3600, cache_size: int = 10000, cache_ttl: float = 60, sweep_interval: float = 3600):
+        self.backend = backend if backend is not None else MemorySessionBackend()
+        self.max_age = max_age
+        self.cache = MemoryCacheBackend(cache_size)
+        self.cache_ttl = cache_ttl
+        self.sweep_interval = sweep_interval
+        self._last_sweep = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        # Cached as JSON so a request mutating nested values can't change the cached copy
+        cached = self.cache.get(session_id)
+        if cached is not None:
+            self.hits += 1
+            return json.loads(cached)
+        self.misses += 1
+        try:
+            data = await self.backend.load(session_id)
+        except Exception as e:
+            # Treat an unreachable store like a missing session rather than failing the request
+            self.errors += 1
+            logger.warning("Session load failed: %s", e)
+            return None
+        if data is not None:
+            self.cache.set(session_id, json.dumps(data), self.cache_ttl)
+        return data
+
+    async def save(self, session_id: str, data: Dict[str, Any]):
+        await self.backend.save(session_id, data, datetime.now(timezone.utc) + timedelta(seconds=self.max_age))
+        self.cache.set(session_id, json.dumps(data), self.cache_ttl)
+        await self._maybe_sweep()
+
+    async def delete(self, session_id: str):
+        self.cache.delete(session_id)
+        await self.backend.delete(session_id)
+
+    async def _maybe_sweep(self):
+        # Piggybacks on writes, at most once per interval per worker
+        if time.monotonic() - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = time.monotonic()
+        try:
+            deleted = await self.backend.delete_expired()
+            if deleted:
+                logger.info("Deleted %s expired sessions", deleted)
+        except Exception:
+            logger.exception("Expired session sweep failed")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__,
+            "cached": len(self.cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
+
+
+class ServerSessionMiddleware:
+    def __init__(
+        self,
+        app,
+        store: SessionStore,
+        secret_key: str,
+        session_cookie: str = "session",
+        same_site: str = "lax",
+        https_only: bool = False,
+    ):
+        self.app = app
+        self.store = store
+        self.signer = TimestampSigner(secret_key)
+        self.session_cookie = session_cookie
+        self.security_flags = f"httponly; samesite={same_site}" + ("; secure" if https_only else "")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        session_id = None
+        data: Dict[str, Any] = {}
+        cookie = HTTPConnection(scope).cookies.get(self.session_cookie)
+        if cookie:
+            try:
+                session_id = self.signer.unsign(cookie, max_age=self.store.max_age).decode()
+            except BadSignature:
+                pass
+            if session_id is not None:
+                data = await self.store.load(session_id) or {}
+                if not data:
+                    session_id = None
+        loaded = json.dumps(data, sort_keys=True)
+        scope["session"] = data
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                await self._commit(scope["session"], session_id, json.loads(loaded), MutableHeaders(scope=message))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _commit(self, session: Dict[str, Any], session_id: Optional[str], loaded: Dict[str, Any], headers: MutableHeaders):
+        # Written only when the data changed, so read-only requests never touch the store
+        if session == loaded:
+            return
+        if not session:
+            if session_id:
+                await self.store.delete(session_id)
+            headers.append("Set-Cookie", f"{self.session_cookie}=null; path=/; expires=Thu, 01 Jan 1970 00:00:00 GMT; {self.security_flags}")
+            return
+        if session_id and any(session.get(key) != loaded.get(key) for key in ROTATE_ON_CHANGE):
+            await self.store.delete(session_id)
+            session_id = None
+        session_id = session_id or secrets.token_urlsafe(32)
+        await self.store.save(session_id, session)
+        value = self.signer.sign(session_id).decode()
+        headers.append(
+            "Set-Cookie",
+            f"{self.session_cookie}={value}; path=/; Max-Age={int(self.store.max_age)}; {self.security_flags}",
+        )
+
+
+def _build_backend():
+    if os.environ.get("SESSION_BACKEND", "sql").lower() == "memory":
+        return MemorySessionBackend()
+    return SQLSessionBackend()
+
+
+session_store = SessionStore(
+    backend=_build_backend(),
+    max_age=float(os.environ.get("SESSION_MAX_AGE", str(14 * 24 * 3600))),
+    cache_size=int(os.environ.get("SESSION_CACHE_SIZE", "10000")),
+    cache_ttl=float(os.environ.get("SESSION_CACHE_TTL", "60")),
+)
@@ -1,8 +1,14 @@
+import asyncio
+import logging
 import os
-import random
-from alibabacloud_dysmsapi20170525.client import Client as Dysmsapi20170525Client
-from alibabacloud_tea_openapi import models as open_api_models
-from alibabacloud_dysmsapi20170525 import models as dysmsapi_20170525_models
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class SMSQueueFull(Exception):
+    pass
 
 class AliyunSMS:
     def __init__(self):
@@ -10,11 +16,20 @@ class AliyunSMS:
         self.access_key_secret = os.environ.get("ALIYUN_ACCESS_KEY_SECRET")
         self.sign_name = os.environ.get("ALIYUN_SMS_SIGN_NAME")
         self.template_code = os.environ.get("ALIYUN_SMS_TEMPLATE_CODE")
-        self.client = self.create_client()
+        self._client = None
+
+    @property
+    def client(self):
+        # The Alibaba Cloud SDK is slow to import; only pay for it when a code is actually sent
+        if self._client is None:
+            self._client = self.create_client()
+        return self._client
 
-    def create_client(self) -> Dysmsapi20170525Client:
+    def create_client(self):
         if not self.access_key_id or not self.access_key_secret:
             return None
+        from alibabacloud_dysmsapi20170525.client import Client as Dysmsapi20170525Client
+        from alibabacloud_tea_openapi import models as open_api_models
         config = open_api_models.Config(
             access_key_id=self.access_key_id,
             access_key_secret=self.access_key_secret
@@ -24,14 +39,16 @@ class AliyunSMS:
 
     def send_code(self, phone_number: str, code: str) -> bool:
         """
-        Send verification code via SMS.
+        Send verification code via SMS. Blocking (the SDK is synchronous): from async code
+        go through SMSDispatcher.send instead.
         Returns True if successful, False otherwise.
         """
         # MOCK MODE: If no credentials, just log the code
         if not self.client:
-            print(f"[MOCK SMS] To: {phone_number}, Code: {code}")
+            logger.info("[MOCK SMS] To: %s, Code: %s", phone_number, code)
             return True
 
+        from alibabacloud_dysmsapi20170525 import models as dysmsapi_20170525_models
         send_sms_request = dysmsapi_20170525_models.SendSmsRequest(
             sign_name=self.sign_name,
             template_code=self.template_code,
@@ -43,14 +60,61 @@ class AliyunSMS:
             response = self.client.send_sms(send_sms_request)
             if response.body.code == 'OK':
                 return True
-            print(f"[SMS ERROR] {response.body.message}")
+            logger.warning("SMS to %s rejected: %s", phone_number, response.body.message)
             return False
-        except Exception as e:
-            print(f"[SMS EXCEPTION] {str(e)}")
+        except Exception:
+            logger.exception("SMS to %s failed", phone_number)
             return False
 
     @staticmethod
     def generate_code(length=6) -> str:
-        return ''.join([str(random.randint(0, 9)) for _ in range(length)])
+        return ''.join(str(secrets.randbelow(10)) for _ in range(length))
+
+class SMSDispatcher:
+    """
+    Runs the blocking SDK call on a small thread pool so it never stalls the event loop.
+    At most `max_pending` sends are queued or running per worker; beyond that send() fails
+    fast with SMSQueueFull instead of letting a login burst pile up requests.
+    """
+
+    def __init__(self, workers: int = 4, max_pending: int = 100):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def send(self, phone_number: str, code: str) -> bool:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise SMSQueueFull(f"{self.pending} SMS sends are already pending")
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sms")
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, get_sms_service().send_code, phone_number, code
+            )
+        finally:
+            self.pending -= 1
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "pending": self.pending, "max_pending": self.max_pending, "rejected": self.rejected}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+_sms_service = None
+
+def get_sms_service() -> AliyunSMS:
+    global _sms_service
+    if _sms_service is None:
+        _sms_service = AliyunSMS()
+    return _sms_service
 
-sms_service = AliyunSMS()
+sms_dispatcher = SMSDispatcher(
+    workers=int(os.environ.get("SMS_WORKERS", "4")),
+    max_pending=int(os.environ.get("SMS_MAX_PENDING", "100")),
+)
@@ -0,0 +1,123 @@
+"""
+Serialized snapshots of dashboard responses, served with ETags.
+
+Dashboard data only changes when an analysis is saved. Writers call `mark_dirty(db)` and the
+snapshots are dropped once that session commits, so steady-state page loads are answered from
+memory (or with a 304) without touching the database. Writes made by other gunicorn workers are
+picked up after DASHBOARD_CACHE_TTL seconds.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class Snapshot:
+    __slots__ = ("body", "etag", "expires_at")
+
+    def __init__(self, body: bytes, etag: str, expires_at: float):
+        self.body = body
+        self.etag = etag
+        self.expires_at = expires_at
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+class SnapshotCache:
+    def __init__(self, ttl: float = 30.0, max_age: int = 15, max_entries: int = 512):
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Snapshot]" = OrderedDict()
+        # Dashboard routes are sync and run on the threadpool
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key: Hashable) -> Optional[Snapshot]:
+        with self._lock:
+            snapshot = self._entries.get(key)
+            if snapshot is None:
+                return None
+            if snapshot.expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return snapshot
+
+    def build(self, key: Hashable, compute: Callable[[], Any]) -> Snapshot:
+        generation = self._generation
+        body = json.dumps(jsonable_encoder(compute()), ensure_ascii=False, separators=(",", ":")).encode()
+        snapshot = Snapshot(body, '"' + hashlib.sha1(body).hexdigest() + '"', time.monotonic() + self.ttl)
+        with self._lock:
+            # A write committed while we were reading may not be in `body`; serve it once, don't keep it
+            if generation == self._generation:
+                self._entries[key] = snapshot
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def respond(self, request: Request, key: Hashable, compute: Callable[[], Any]) -> Response:
+        """Serve `key` from its snapshot (computing it on a miss), with 304 for a matching If-None-Match."""
+        snapshot = self.get(key)
+        if snapshot is None:
+            self.misses += 1
+            snapshot = self.build(key, compute)
+        else:
+            self.hits += 1
+        headers = {
+            "ETag": snapshot.etag,
+            "Cache-Control": f"public, max-age={self.max_age}, stale-while-revalidate={self.max_age * 4}",
+        }
+        if _etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(snapshot.body, media_type="application/json", headers=headers)
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "not_modified": self.not_modified}
+
+
+dashboard_snapshots = SnapshotCache(
+    ttl=float(os.environ.get("DASHBOARD_CACHE_TTL", "30")),
+    max_age=int(os.environ.get("DASHBOARD_CACHE_MAX_AGE", "15")),
+)
+
+
+def mark_dirty(db: Session):
+    """Drop dashboard snapshots once `db` commits (a rollback keeps them)."""
+    db.info["dashboard_dirty"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session):
+    if session.info.pop("dashboard_dirty", False):
+        dashboard_snapshots.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_after_rollback(session: Session):
+    session.info.pop("dashboard_dirty", None)
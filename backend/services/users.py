@@ -0,0 +1,98 @@
+"""
+Cached User lookups for session-authenticated requests.
+
+Users are cached per worker by id (and WeChat openid -> id) for USER_CACHE_TTL seconds. Any
+ORM change to a User drops its entries in the committing worker once the transaction commits;
+other workers see the change within the TTL.
+"""
+import os
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+from .. import models
+from ..database import AsyncSessionLocal
+from .cache import MemoryCacheBackend
+
+
+def user_to_dict(user: models.User) -> Dict[str, Any]:
+    return {
+        "id": user.id,
+        "email": user.email,
+        "phone": user.phone,
+        "name": user.name,
+        "avatar": user.avatar,
+        "role": user.role,
+    }
+
+
+class UserCache:
+    def __init__(self, session_factory=AsyncSessionLocal, max_entries: int = 10000, ttl: float = 300):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self._by_id = MemoryCacheBackend(max_entries)
+        self._openids = MemoryCacheBackend(max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        user = self._by_id.get(user_id)
+        if user is not None:
+            self.hits += 1
+            return user
+        self.misses += 1
+        async with self.session_factory() as db:
+            row = await db.get(models.User, user_id)
+            return self._fill(row) if row else None
+
+    async def get_by_openid(self, openid: str) -> Optional[Dict[str, Any]]:
+        user_id = self._openids.get(openid)
+        if user_id is not None:
+            return await self.get(user_id)
+        self.misses += 1
+        async with self.session_factory() as db:
+            row = await db.scalar(select(models.User).where(models.User.openid == openid))
+            return self._fill(row) if row else None
+
+    def _fill(self, row: models.User) -> Dict[str, Any]:
+        user = user_to_dict(row)
+        self._by_id.set(row.id, user, self.ttl)
+        if row.openid:
+            self._openids.set(row.openid, row.id, self.ttl)
+        return user
+
+    def invalidate(self, user_id: int, openid: Optional[str] = None):
+        self._by_id.delete(user_id)
+        if openid:
+            self._openids.delete(openid)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._by_id), "hits": self.hits, "misses": self.misses}
+
+
+user_cache = UserCache(
+    max_entries=int(os.environ.get("USER_CACHE_MAX_ENTRIES", "10000")),
+    ttl=float(os.environ.get("USER_CACHE_TTL", "300")),
+)
+
+
+# Collected at flush, applied after commit: dropping entries before the commit lands would let a
+# concurrent request cache the old row again.
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _user_changed(mapper, connection, target: models.User):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("users_changed", set()).add((target.id, target.openid))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session):
+    for user_id, openid in session.info.pop("users_changed", ()):
+        user_cache.invalidate(user_id, openid)
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_after_rollback(session: Session):
+    session.info.pop("users_changed", None)
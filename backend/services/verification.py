@@ -0,0 +1,297 @@
+"""
+SMS verification codes: issuing, checking and cleaning up.
+
+Sends are rate limited per phone number and per client IP by sliding windows
+(VERIFICATION_PHONE_LIMITS / VERIFICATION_IP_LIMITS, e.g. "1/60,5/3600" = one per minute and five
+per hour). The in-memory limiter rejects bursts without touching the database; requests it lets
+through are checked against the codes recently stored for that phone/IP, so limits also hold
+across gunicorn workers and restarts. Checking a code reads only the newest live code for the
+phone; it is expired after a successful check or VERIFICATION_MAX_ATTEMPTS wrong guesses.
+
+A sweeper deletes codes in batches once they are older than the longest limit window (they are
+needed until then for the database-side rate check), so the table stays bounded during campaigns.
+"""
+import asyncio
+import hmac
+import logging
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, update
+
+from .. import models
+from ..database import AsyncSessionLocal
+from . import metrics
+from .sms import AliyunSMS, sms_dispatcher
+
+logger = logging.getLogger(__name__)
+
+PHONE_PATTERN = re.compile(r"^\+?\d{6,15}$")
+
+VERIFICATION_SENDS = metrics.registry.counter(
+    "verification_sends_total", "Verification code requests by outcome (sent, limited, failed)", ("outcome",)
+)
+
+
+class RateLimited(Exception):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SendFailed(Exception):
+    pass
+
+
+def parse_limits(spec: str) -> List[Tuple[int, float]]:
+    """"1/60,5/3600" -> [(1, 60.0), (5, 3600.0)]: at most N sends per window of S seconds."""
+    limits = []
+    for part in spec.split(","):
+        if part.strip():
+            count, window = part.split("/")
+            limits.append((int(count), float(window)))
+    return limits
+
+
+def normalize_phone(phone: str) -> str:
+    phone = re.sub(r"[\s-]", "", phone or "")
+    if not PHONE_PATTERN.match(phone):
+        raise ValueError("Invalid phone number")
+    return phone
+
+
+class SlidingWindowLimiter:
+    """
+    Per-key send timestamps checked against several (count, window) limits. Only accepted hits are
+    recorded. Keys are kept in LRU order and capped at `max_keys`, so a flood of distinct phone
+    numbers or IPs can't grow memory without bound.
+    """
+
+    def __init__(self, limits: List[Tuple[int, float]], max_keys: int = 100_000):
+        self.limits = limits
+        self.window = max((window for _, window in limits), default=0)
+        self.max_keys = max_keys
+        self._hits: "OrderedDict[str, deque]" = OrderedDict()
+
+    def retry_after(self, key: str, now: float) -> Optional[float]:
+        """Seconds until `key` may send again, or None if it may send now."""
+        hits = self._hits.get(key)
+        if not hits:
+            return None
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+        waits = []
+        for count, window in self.limits:
+            recent = [t for t in hits if t > now - window]
+            if len(recent) >= count:
+                waits.append(recent[-count] + window - now)
+        return max(waits) if waits else None
+
+    def hit(self, key: str, now: float):
+        hits = self._hits.pop(key, None) or deque()
+        hits.append(now)
+        self._hits[key] = hits
+        while len(self._hits) > self.max_keys:
+            self._hits.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._hits)
+
+
+class VerificationService:
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        ttl: float = 300.0,
+        code_length: int = 6,
+        max_attempts: int = 5,
+        phone_limits: List[Tuple[int, float]] = ((1, 60.0), (5, 3600.0)),
+        ip_limits: List[Tuple[int, float]] = ((10, 60.0), (50, 3600.0)),
+        sweep_interval: float = 60.0,
+        sweep_batch: int = 1000,
+        sender=sms_dispatcher,
+    ):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.code_length = code_length
+        self.max_attempts = max_attempts
+        self.phone_limiter = SlidingWindowLimiter(list(phone_limits))
+        self.ip_limiter = SlidingWindowLimiter(list(ip_limits))
+        self.sweep_interval = sweep_interval
+        self.sweep_batch = sweep_batch
+        self.sender = sender
+        # Codes must outlive their expiry for as long as the database-side rate check looks back
+        self.retention = max(self.phone_limiter.window, self.ip_limiter.window, ttl)
+        self._sweeper: Optional[asyncio.Task] = None
+        self.swept = 0
+
+    async def start(self):
+        self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "tracked_phones": len(self.phone_limiter),
+            "tracked_ips": len(self.ip_limiter),
+            "swept": self.swept,
+            "sms": self.sender.stats(),
+        }
+
+    # --- Public API ---
+
+    async def issue(self, phone: str, ip: Optional[str]) -> Dict[str, object]:
+        """
+        Create a code for `phone` and send it. Raises ValueError for a malformed number,
+        RateLimited when a limit is hit, SMSQueueFull or SendFailed when it can't be sent.
+        """
+        phone = normalize_phone(phone)
+        ip = ip or "unknown"
+        clock = time.monotonic()
+        for limiter, key, what in ((self.phone_limiter, phone, "phone number"), (self.ip_limiter, ip, "IP address")):
+            wait = limiter.retry_after(key, clock)
+            if wait is not None:
+                VERIFICATION_SENDS.inc(outcome="limited")
+                raise RateLimited(f"Too many codes requested for this {what}", wait)
+
+        now = datetime.now(timezone.utc)
+        code = AliyunSMS.generate_code(self.code_length)
+        async with self.session_factory() as db:
+            await self._check_stored_limits(db, phone, ip, now)
+            row = models.VerificationCode(
+                phone=phone, code=code, ip=ip, attempts=0, created_at=now, expires_at=now + timedelta(seconds=self.ttl)
+            )
+            db.add(row)
+            await db.commit()
+        self.phone_limiter.hit(phone, clock)
+        self.ip_limiter.hit(ip, clock)
+
+        try:
+            sent = await self.sender.send(phone, code)
+        except Exception:
+            await self._discard(row.id)
+            VERIFICATION_SENDS.inc(outcome="failed")
+            raise
+        if not sent:
+            await self._discard(row.id)
+            VERIFICATION_SENDS.inc(outcome="failed")
+            raise SendFailed("Could not send the verification code")
+        VERIFICATION_SENDS.inc(outcome="sent")
+        return {"expires_in": int(self.ttl), "resend_after": int(min((w for _, w in self.phone_limiter.limits), default=0))}
+
+    async def verify(self, phone: str, code: str) -> bool:
+        """True if `code` matches the phone's newest live code, which is then used up. Wrong guesses count towards max_attempts."""
+        try:
+            phone = normalize_phone(phone)
+        except ValueError:
+            return False
+        now = datetime.now(timezone.utc)
+        async with self.session_factory() as db:
+            row = await db.scalar(
+                select(models.VerificationCode)
+                .where(models.VerificationCode.phone == phone, models.VerificationCode.expires_at > now)
+                .order_by(models.VerificationCode.expires_at.desc())
+                .limit(1)
+            )
+            if row is None:
+                return False
+            if hmac.compare_digest(row.code or "", code or ""):
+                # Conditional, so two concurrent checks of the same code can't both succeed
+                used = await db.execute(
+                    update(models.VerificationCode)
+                    .where(models.VerificationCode.id == row.id, models.VerificationCode.expires_at > now)
+                    .values(expires_at=now)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+                return bool(used.rowcount)
+            attempts = (row.attempts or 0) + 1
+            values = {"attempts": attempts}
+            if attempts >= self.max_attempts:
+                values["expires_at"] = now
+            await db.execute(update(models.VerificationCode).where(models.VerificationCode.id == row.id).values(**values))
+            await db.commit()
+            return False
+
+    async def sweep(self, now: Optional[datetime] = None) -> int:
+        """Delete codes past the retention window, `sweep_batch` rows per transaction. Returns the rows deleted."""
+        cutoff = (now or datetime.now(timezone.utc)) - timedelta(seconds=self.retention)
+        total = 0
+        while True:
+            async with self.session_factory() as db:
+                # Oldest ids expire first, so the primary key scan stops early
+                batch = (
+                    select(models.VerificationCode.id)
+                    .where(models.VerificationCode.expires_at < cutoff)
+                    .order_by(models.VerificationCode.id)
+                    .limit(self.sweep_batch)
+                )
+                deleted = (await db.execute(delete(models.VerificationCode).where(models.VerificationCode.id.in_(batch)))).rowcount
+                await db.commit()
+            total += deleted
+            if deleted < self.sweep_batch:
+                break
+            # Let other requests use the connection between batches
+            await asyncio.sleep(0)
+        self.swept += total
+        return total
+
+    # --- Internals ---
+
+    async def _check_stored_limits(self, db, phone: str, ip: str, now: datetime):
+        for column, key, limits, what in (
+            (models.VerificationCode.phone, phone, self.phone_limiter.limits, "phone number"),
+            (models.VerificationCode.ip, ip, self.ip_limiter.limits, "IP address"),
+        ):
+            for count, window in limits:
+                since = now - timedelta(seconds=window)
+                sent, oldest = (await db.execute(
+                    select(func.count(), func.min(models.VerificationCode.created_at))
+                    .where(column == key, models.VerificationCode.created_at > since)
+                )).one()
+                if sent >= count:
+                    VERIFICATION_SENDS.inc(outcome="limited")
+                    oldest = oldest.replace(tzinfo=timezone.utc) if oldest.tzinfo is None else oldest
+                    raise RateLimited(
+                        f"Too many codes requested for this {what}", max((oldest - since).total_seconds(), 1.0)
+                    )
+
+    async def _discard(self, code_id: int):
+        # Unsent codes still count against the in-memory limits, but can't be used
+        async with self.session_factory() as db:
+            await db.execute(
+                update(models.VerificationCode)
+                .where(models.VerificationCode.id == code_id)
+                .values(expires_at=datetime.now(timezone.utc))
+            )
+            await db.commit()
+
+    async def _sweep_loop(self):
+        while True:
+            try:
+                deleted = await self.sweep()
+                if deleted:
+                    logger.info("Swept %s old verification codes", deleted)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Verification code sweep failed")
+            await asyncio.sleep(self.sweep_interval)
+
+
+verification = VerificationService(
+    ttl=float(os.environ.get("VERIFICATION_CODE_TTL", "300")),
+    max_attempts=int(os.environ.get("VERIFICATION_MAX_ATTEMPTS", "5")),
+    phone_limits=parse_limits(os.environ.get("VERIFICATION_PHONE_LIMITS", "1/60,5/3600")),
+    ip_limits=parse_limits(os.environ.get("VERIFICATION_IP_LIMITS", "10/60,50/3600")),
+    sweep_interval=float(os.environ.get("VERIFICATION_SWEEP_INTERVAL", "60")),
+    sweep_batch=int(os.environ.get("VERIFICATION_SWEEP_BATCH", "1000")),
+)